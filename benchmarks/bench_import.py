@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#
+# Times the pycvm import of every ucvm_plotting script in a fresh
+# interpreter, with the plot modules and graphics libraries loaded lazily,
+# and eagerly as before: every plot module, pyplot, Basemap and, if it is
+# installed, scipy.interpolate imported up front.
+#
+#   python benchmarks/bench_import.py [runs per script]
+#
+# The best of the runs is shown for each script.
+#
+
+import os
+import re
+import sys
+import glob
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+## Imports what the old common.py and plot modules imported at load time.
+EAGER_PRELOAD = """import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot
+from mpl_toolkits import basemap
+try:
+    import scipy.interpolate
+except ImportError:
+    pass
+"""
+
+## Runs the import and prints how long it took.
+TIMER = """import sys, time
+sys.path[0:0] = [%r, %r]
+start = time.time()
+%s%s
+print(time.time() - start)
+"""
+
+def script_import(path):
+    with open(path) as fh:
+        for line in fh:
+            if re.match(r"\s*from pycvm import ", line):
+                return line.strip()
+    return None
+
+def time_import(statement, eager, runs):
+    env = dict(os.environ)
+    preload = ""
+    if eager:
+        env['PYCVM_EAGER_IMPORTS'] = "1"
+        preload = EAGER_PRELOAD
+    code = TIMER % (ROOT, os.path.join(ROOT, "pycvm"), preload, statement)
+    best = None
+    for i in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", code], env=env, universal_newlines=True)
+        seconds = float(output.strip().splitlines()[-1])
+        if best == None or seconds < best:
+            best = seconds
+    return best
+
+def main():
+    runs = 3
+    if len(sys.argv) > 1:
+        runs = int(sys.argv[1])
+
+    print("%-40s %10s %10s %8s" % ("script", "eager", "lazy", "speedup"))
+    for path in sorted(glob.glob(os.path.join(ROOT, "ucvm_plotting", "*.py"))):
+        statement = script_import(path)
+        if statement == None:
+            continue
+        eager = time_import(statement, True, runs)
+        lazy = time_import(statement, False, runs)
+        print("%-40s %9.3fs %9.3fs %7.1fx" % (os.path.basename(path), eager, lazy, eager / max(lazy, 1e-6)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Compares the text and binary ucvm_query transports on a 1M point grid
+# with local fake query programs, so no UCVM install is needed.
+#
+#   python benchmarks/bench_transport.py [number of points]
+#
+# "text" sends 5-decimal text lines and parses 17-column output lines.
+# "binary" sends packed float64 triples to a fake that answers natively
+# with packed records. "adapter" puts utilities/ucvm_query_binary.py in
+# front of the text fake, as for an install without native binary I/O.
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pycvm')))
+
+import numpy as np
+from common import UCVM, PointArray
+
+## Answers text points with ucvm_query style lines, vs = 1000 + z.
+FAKE_TEXT_QUERY = """#!%s
+import sys
+import numpy as np
+print("Using Geo Depth coordinates as default mode.")
+lines = sys.stdin.read().splitlines()
+points = np.loadtxt(lines, ndmin=2) if lines else np.zeros((0, 3))
+vs = 1000.0 + points[:, 2]
+out = np.column_stack((points, np.zeros((len(points), 2)), 1.7 * vs, vs, np.full(len(points), 2000.0)))
+line = "%%.4f %%.4f %%.3f %%.3f %%.3f fake %%.3f %%.3f %%.3f none 0.000 0.000 0.000 crust %%.3f %%.3f %%.3f\\n"
+values = np.column_stack((out, out[:, 5:8]))
+sys.stdout.write((line * len(values)) %% tuple(values.ravel().tolist()))
+""" % sys.executable
+
+## Answers packed float64 points with packed 14-value records, vs = 1000 + z.
+FAKE_BINARY_QUERY = """#!%s
+import sys
+import numpy as np
+stdin = getattr(sys.stdin, "buffer", sys.stdin)
+stdout = getattr(sys.stdout, "buffer", sys.stdout)
+points = np.frombuffer(stdin.read(), dtype="<f8").reshape(-1, 3)
+records = np.zeros((len(points), 14))
+records[:, 0:3] = points
+vs = 1000.0 + points[:, 2]
+for first in (5, 8, 11):
+    records[:, first] = 1.7 * vs
+    records[:, first + 1] = vs
+    records[:, first + 2] = 2000.0
+stdout.write(records.astype("<f8").tobytes())
+""" % sys.executable
+
+def write_program(path, text):
+    with open(path, "w") as fh:
+        fh.write(text)
+    os.chmod(path, 0o755)
+
+def run(install_dir, meta, points):
+    meta = dict(meta)
+    meta.update({"no_cache": "1", "backend": "subprocess"})
+    u = UCVM(install_dir, meta=meta)
+    start = time.time()
+    grid = u.query_columns(points, "cvmfake")
+    elapsed = time.time() - start
+    if not np.allclose(grid.getColumn("vs"), 1000.0 + points.depth):
+        print("ERROR: wrong answer for " + str(meta))
+        exit(1)
+    return elapsed
+
+def main():
+    npoints = 1000000
+    if len(sys.argv) > 1:
+        npoints = int(sys.argv[1])
+    side = int(np.ceil(np.sqrt(npoints)))
+    points = PointArray.grid(-118.0, 34.0, 0.0001, side, side, 100.0)[0:npoints]
+
+    install_dir = tempfile.mkdtemp()
+    try:
+        for name in ["bin", "conf", "lib", "model/ucvm", "model/cvmfake", "utilities"]:
+            os.makedirs(os.path.join(install_dir, name))
+        open(os.path.join(install_dir, "conf", "ucvm.conf"), "w").close()
+        write_program(os.path.join(install_dir, "utilities", "run_ucvm_query.sh"), FAKE_TEXT_QUERY)
+        binary_query = os.path.join(install_dir, "bin", "ucvm_query_binary")
+        write_program(binary_query, FAKE_BINARY_QUERY)
+
+        print("%d points" % len(points))
+        results = [("text", run(install_dir, {"transport": "text"}, points)),
+                   ("binary", run(install_dir, {"transport": "binary", "binary_query": binary_query}, points)),
+                   ("adapter", run(install_dir, {"transport": "binary"}, points))]
+        for name, elapsed in results:
+            print("%-8s %8.2f s %12.0f points/s" % (name, elapsed, len(points) / elapsed))
+    finally:
+        shutil.rmtree(install_dir)
+
+if __name__ == '__main__':
+    main()
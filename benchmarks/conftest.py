@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pycvm')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tests')))
+
+from fake_ucvm import make_fake_install
+
+## Grid shapes (num_y, num_x) by number of points.
+GRID_SHAPES = {10**3 : (25, 40), \
+               10**4 : (100, 100), \
+               10**5 : (250, 400), \
+               10**6 : (1000, 1000), \
+               10**7 : (2500, 4000)}
+
+## Sizes above PYCVM_BENCH_MAX_POINTS, 10^5 by default, are skipped.
+MAX_POINTS = int(float(os.environ.get("PYCVM_BENCH_MAX_POINTS", "1e5")))
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        sizes = sorted(GRID_SHAPES.keys())
+        metafunc.parametrize("size", [pytest.param(size, marks=pytest.mark.skipif(size > MAX_POINTS, \
+                                       reason="set PYCVM_BENCH_MAX_POINTS to run")) for size in sizes], \
+                             ids=["1e%d" % len(str(size)[1:]) for size in sizes])
+
+@pytest.fixture(scope="session")
+def fake_install(tmp_path_factory):
+    return make_fake_install(str(tmp_path_factory.mktemp("ucvm")))
+
+@pytest.fixture
+def shape(size):
+    return GRID_SHAPES[size]
@@ -0,0 +1,150 @@
+#
+# pytest-benchmark cases for the steps of a horizontal slice plot, against
+# the fake UCVM install of tests/fake_ucvm.py, from 10^3 to 10^7 points.
+#
+#   python -m pytest benchmarks [--benchmark-only] [--benchmark-autosave]
+#
+# Sizes above PYCVM_BENCH_MAX_POINTS (10^5 by default) are skipped, e.g.
+# PYCVM_BENCH_MAX_POINTS=1e7 runs them all.
+#
+
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import numpy as np
+from common import UCVM, Point, PointArray, MaterialGrid, TileStore, plt, pycvm_basemap, pycvm_parse_output
+from horizontal_slice import HorizontalSlice
+from fake_ucvm import answer, vs30
+
+## Rounds of the steps that take seconds at the larger sizes.
+ROUNDS = 3
+
+def make_ucvm(install_dir, **meta):
+    meta["no_cache"] = "1"
+    return UCVM(install_dir, meta=meta)
+
+def make_grid(shape):
+    return PointArray.grid(-118.0, 34.0, 0.001, shape[1], shape[0], 500.0)
+
+##  A horizontal slice over the grid of make_grid, holding a query result.
+def make_slice(grid, shape):
+    h = HorizontalSlice(Point(-118.0, 34.0 + (shape[0] - 1) * 0.001, 500.0), \
+                        Point(-118.0 + (shape[1] - 1) * 0.001, 34.0, 500.0), \
+                        {"spacing" : 0.001, "nx" : shape[1], "ny" : shape[0]})
+    h.getgridsize()
+    h.materialproperties = MaterialGrid(shape)
+    h.materialproperties.setProperties(grid)
+    return h
+
+def test_grid(benchmark, shape):
+    points = benchmark(make_grid, shape)
+    assert len(points) == shape[0] * shape[1]
+
+def test_query_text(benchmark, shape):
+    points = make_grid(shape)
+    text = benchmark(points.toText, 3)
+    assert text.count("\n") == len(points)
+
+@pytest.mark.parametrize("transport", ["text", "binary"])
+def test_query(benchmark, fake_install, shape, transport):
+    u = make_ucvm(fake_install, transport=transport)
+    points = make_grid(shape)
+    grid = benchmark.pedantic(u.query_columns, args=(points, "cvmfake"), rounds=ROUNDS, iterations=1)
+    assert len(grid.getColumn("vs")) == len(points)
+
+def test_query_stream(benchmark, fake_install, shape):
+    u = make_ucvm(fake_install, stream="1")
+    points = make_grid(shape)
+    grid = benchmark.pedantic(u.query_columns, args=(points, "cvmfake"), rounds=ROUNDS, iterations=1)
+    assert len(grid.getColumn("vs")) == len(points)
+
+def test_vs30_query(benchmark, fake_install, shape):
+    u = make_ucvm(fake_install)
+    points = make_grid(shape)
+    values = benchmark.pedantic(u.vs30, args=(points, "cvmfake"), rounds=ROUNDS, iterations=1)
+    assert np.all(values > 250.0)
+
+##  Vs30 from the travel time through the queried top 30m, against vs30_query above.
+def test_vs30_columns(benchmark, fake_install, shape):
+    u = make_ucvm(fake_install)
+    points = make_grid(shape)
+    values = benchmark.pedantic(u.vs30_columns, args=(points, "cvmfake"), rounds=ROUNDS, iterations=1)
+    assert np.allclose(values, vs30(points.longitude, points.latitude), rtol=1e-3)
+
+def test_basin_query(benchmark, fake_install, shape):
+    u = make_ucvm(fake_install)
+    points = make_grid(shape)
+    values = benchmark.pedantic(u.basin_depth, args=(points, "cvmfake", 1000), rounds=ROUNDS, iterations=1)
+    assert len(values) == len(points)
+
+def test_parse(benchmark, shape):
+    points = make_grid(shape)
+    xyz = np.column_stack((points.longitude, points.latitude, points.depth))
+    lines = answer("query", [], xyz).splitlines()
+    values = benchmark.pedantic(pycvm_parse_output, args=(lines, (14, 15, 16)), rounds=ROUNDS, iterations=1)
+    assert values.shape == (len(points), 3)
+
+##  HorizontalSlice.getdatapoints, from the query result to the image values.
+@pytest.mark.parametrize("mproperty", ["vs", "poisson"])
+def test_datapoints(benchmark, fake_install, shape, mproperty):
+    u = make_ucvm(fake_install)
+    h = make_slice(u.query_columns(make_grid(shape), "cvmfake"), shape)
+    datapoints, scaled, color_scale = benchmark(h.getdatapoints, u, mproperty, "d")
+    assert scaled.shape == shape and h.counts[0] == 0
+
+def test_render(benchmark, fake_install, shape, tmp_path):
+    u = make_ucvm(fake_install)
+    scaled = make_slice(u.query_columns(make_grid(shape), "cvmfake"), shape).getdatapoints(u, "vs", "d")[1]
+    lons = -118.0 + np.arange(shape[1]) * 0.001
+    lats = 34.0 + np.arange(shape[0]) * 0.001
+    filename = str(tmp_path / "slice.png")
+
+    def render():
+        m = pycvm_basemap({"cache_dir" : str(tmp_path)}, projection='cyl', \
+                          llcrnrlat=lats[0], urcrnrlat=lats[-1], llcrnrlon=lons[0], urcrnrlon=lons[-1], \
+                          resolution=None, anchor='C')
+        plt.figure(figsize=(10, 10), dpi=100)
+        t = m.transform_scalar(scaled, lons, lats, len(lons), len(lats))
+        img = m.imshow(t, cmap="viridis")
+        plt.colorbar(img, orientation='horizontal')
+        plt.savefig(filename)
+        plt.close('all')
+
+    benchmark.pedantic(render, rounds=ROUNDS, iterations=1)
+    assert os.path.getsize(filename) > 0
+
+def test_export(benchmark, fake_install, shape, tmp_path):
+    u = make_ucvm(fake_install)
+    grid = u.query_columns(make_grid(shape), "cvmfake")
+    filename = str(tmp_path / "slice.png")
+    meta = {"num_x" : shape[1], "num_y" : shape[0]}
+
+    def export():
+        datapoints = grid.getColumn("vs").reshape(shape)
+        u.export_metadata(meta, filename)
+        u.export_np_float_array(datapoints, filename)
+        u.export_bands({"vs" : grid.getColumn("vs"), "vp" : grid.getColumn("vp"), \
+                        "density" : grid.getColumn("density")}, filename)
+
+    benchmark.pedantic(export, rounds=ROUNDS, iterations=1)
+    assert os.path.isfile(str(tmp_path / "slice_data.bin"))
+    assert os.path.isfile(str(tmp_path / "slice_data.npz"))
+
+##  A replot of a quarter of the region from the tile store of the whole one.
+def test_read_tiles(benchmark, fake_install, shape, tmp_path):
+    u = make_ucvm(fake_install, tile_size="64")
+    grid = u.query_columns(make_grid(shape), "cvmfake")
+    filename = str(tmp_path / "slice.png")
+    u.export_tiles({"vs" : grid.getColumn("vs").reshape(shape)}, filename, \
+                   {"lon0" : -118.0, "lat0" : 34.0, "spacing" : 0.001})
+    rows = (shape[0] // 4, shape[0] // 4 + shape[0] // 2)
+    cols = (shape[1] // 4, shape[1] // 4 + shape[1] // 2)
+
+    def read():
+        return TileStore(str(tmp_path / "slice_data.tiles")).read(rows, cols)["vs"]
+
+    values = benchmark.pedantic(read, rounds=ROUNDS, iterations=1)
+    assert np.array_equal(values, grid.getColumn("vs").reshape(shape)[rows[0]:rows[1], cols[0]:cols[1]])
@@ -1,19 +1,48 @@
-from .common import Plot, Point, UCVM, MaterialProperties, \
+from .common import Plot, Point, PointArray, UCVM, QueryCache, MaterialProperties, MaterialGrid, \
                    ALL_PROPERTIES, VP, VS, DENSITY, VERSION, \
                    UCVM_CVMS, get_user_opts, \
-                   ask_number, ask_path, ask_file
+                   ask_number, ask_path, ask_file, \
+                   QUERY_OPTS, query_usage
 
-from .elevation_horizontal_slice import ElevationHorizontalSlice
-from .horizontal_slice import HorizontalSlice
-from .cross_section import CrossSection
-from .elevation_cross_section import ElevationCrossSection
-from .vs30_slice import Vs30Slice
-from .elevation_slice import ElevationSlice
-from .vs30_etree_slice import Vs30EtreeSlice
-from .horizontal_difference_slice import HorizontalDifferenceSlice
-from .cross_difference_section import CrossDifferenceSection
-from .map_grid_horizontal_slice import MapGridHorizontalSlice
-from .basin_slice import BasinSlice, Z10Slice, Z25Slice
-from .depth_profile import DepthProfile
-from .elevation_profile import ElevationProfile
-from .difference import Difference
+import importlib
+import os
+import sys
+
+## Where each plot class is defined. The plot modules are only imported
+## when one of their names is first used, so that a script pays for the
+## plots it makes and nothing else.
+PLOT_MODULES = {"ElevationHorizontalSlice" : ".elevation_horizontal_slice", \
+                "HorizontalSlice" : ".horizontal_slice", \
+                "VolumeSlice" : ".volume_slice", \
+                "CrossSection" : ".cross_section", \
+                "ElevationCrossSection" : ".elevation_cross_section", \
+                "Vs30Slice" : ".vs30_slice", \
+                "ElevationSlice" : ".elevation_slice", \
+                "Vs30EtreeSlice" : ".vs30_etree_slice", \
+                "HorizontalDifferenceSlice" : ".horizontal_difference_slice", \
+                "CrossDifferenceSection" : ".cross_difference_section", \
+                "MapGridHorizontalSlice" : ".map_grid_horizontal_slice", \
+                "BasinSlice" : ".basin_slice", \
+                "Z10Slice" : ".basin_slice", \
+                "Z25Slice" : ".basin_slice", \
+                "DepthProfile" : ".depth_profile", \
+                "ElevationProfile" : ".elevation_profile", \
+                "Difference" : ".difference", \
+                "PlotBatch" : ".batch", \
+                "BATCH_PLOTS" : ".batch"}
+
+def __getattr__(name):
+    if name not in PLOT_MODULES:
+        raise AttributeError("module %s has no attribute %s" % (__name__, name))
+    value = getattr(importlib.import_module(PLOT_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(PLOT_MODULES.keys()))
+
+## Module __getattr__ needs Python 3.7, older versions, or PYCVM_EAGER_IMPORTS
+## set, import every plot module up front.
+if sys.version_info < (3, 7) or os.environ.get('PYCVM_EAGER_IMPORTS'):
+    for name in PLOT_MODULES:
+        __getattr__(name)
@@ -11,9 +11,18 @@
 #  inherits from @link horizontal_slice.HorizontalSlice @endlink.
 
 #  Imports
+import os
+
 from horizontal_slice import HorizontalSlice
-from common import Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, np, plt
+from common import Point, PointArray, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, cm, mcolors, np, plt, pycvm_timed
+
+##
+#  Returns the band name of a Vs threshold in a multi-band file, e.g. z1.0
+#  for 1000m/s and z2.5 for 2500m/s.
+def pycvm_basin_band(vs_threshold):
+    return "z%.1f" % (float(vs_threshold) / 1000.0)
+
 ##
 #  @class BasinSlice
 #  @brief Gets a horizontal slice of the basin data.
@@ -34,10 +43,37 @@ class BasinSlice(HorizontalSlice):
         ## The Vs value to check for.
         self.vs_threshold = vs_threshold
 
+        ## Every Vs value to check for in the same pass, from meta 'vs_thresholds',
+        ## e.g. "1000,2500". Each one is plotted and saved as a band of one file.
+        self.vs_thresholds = [float(vs_threshold)]
+        if 'vs_thresholds' in meta :
+            for value in str(meta['vs_thresholds']).split(",") :
+                if float(value) not in self.vs_thresholds :
+                    self.vs_thresholds.append(float(value))
+
+        ## How the depths are found: "query" runs basin_query for the threshold,
+        ## "columns" scans the queried columns, see UCVM.basin_depths. Several
+        ## thresholds are always found from the columns.
+        if 'basin_engine' in meta :
+            self.engine = meta['basin_engine']
+        else:
+            self.engine = os.environ.get('UCVM_BASIN_ENGINE', 'query')
+        if len(self.vs_thresholds) > 1 :
+            self.engine = "columns"
+
+        ## The vertical spacing of the columns, in meters.
+        self.interval = 20.0
+        if 'interval' in meta :
+            self.interval = float(meta['interval'])
+
+        ## The depths by band name, see pycvm_basin_band.
+        self.bands = {}
+
         #  Initializes the base class which is a horizontal slice.
         HorizontalSlice.__init__(self, upperleftpoint, bottomrightpoint, meta)
     ##
     #  Retrieves the values for this basin slice and stores them in the class.
+    @pycvm_timed
     def getplotvals(self, mproperty="vs"):
         
         #  How many y and x values will we need?
@@ -63,11 +99,19 @@ class BasinSlice(HorizontalSlice):
         self.min_val = 0
 
         ## The 2D array of retrieved Vs30 values.
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 ### MEI
-        if (self.datafile != None) :
+        if (self.datafile != None) and self.datafile.endswith(".npz") :
+            ## multi-band file of an earlier run with several thresholds
+            print("\nUsing --> "+self.datafile)
+            self.bands = u.import_bands(self.datafile)
+            if pycvm_basin_band(self.vs_threshold) not in self.bands :
+                print("ERROR: " + self.datafile + " has no " + pycvm_basin_band(self.vs_threshold) + " band.")
+                exit(1)
+            data = self.bands[pycvm_basin_band(self.vs_threshold)]
+        elif (self.datafile != None) :
             data=[]
             if self.datafile.rfind(".binary") != -1 :
                 data = u.import_binary(self.datafile, self.num_x, self.num_y)
@@ -78,38 +122,31 @@ class BasinSlice(HorizontalSlice):
                     data2d = u.import_np_float_array(self.datafile, self.num_x, self.num_y)
                 ## flatten them
                     data1d = data2d.reshape([1, self.num_x * self.num_y])
-                ## turn first one into a list
-                    data=data1d[0].tolist()
+                ## take the first row, still backed by the file
+                    data=data1d[0]
         else:
             #  Generate a list of points to pass to UCVM.
-            ucvmpoints = []
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):
-                    ucvmpoints.append(Point(self.upperleftpoint.longitude + x * self.spacing, \
-                                            self.bottomrightpoint.latitude + y * self.spacing, \
-                                            self.upperleftpoint.depth))
+            ucvmpoints = PointArray.grid(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                         self.spacing, self.num_x, self.num_y, self.upperleftpoint.depth)
 #            print("Total points extracted is ", len(ucvmpoints), "for ", self.num_x, " and ", self.num_y)
-            data = u.basin_depth(ucvmpoints, self.cvm, self.vs_threshold)
-
-        i = 0
-        j = 0
-
-        for matprop in data:
-            self.materialproperties[i][j].vs = matprop
-
-            if matprop > self.max_val:
-                self.max_val = matprop
+            if self.engine == "columns" :
+                depths = u.basin_depths(ucvmpoints, self.cvm, self.vs_thresholds, self.interval)
+                for i, vs_threshold in enumerate(self.vs_thresholds) :
+                    self.bands[pycvm_basin_band(vs_threshold)] = depths[:, i]
+                data = self.bands[pycvm_basin_band(self.vs_threshold)]
+            else:
+                data = u.basin_depth(ucvmpoints, self.cvm, self.vs_threshold)
 
-            j = j + 1
-            if j >= self.num_x:
-                j = 0
-                i = i + 1
+        self.materialproperties.setColumn("vs", data)
+        if np.size(data) > 0:
+            self.max_val = max(self.max_val, float(np.max(data)))
 
     ##
     #  Plots the basin depth data as a horizontal slice. This code is very similar to the
     #  HorizontalSlice routine.
     #
     #  @param horizontal_label The horizontal label of the plot. Optional.
+    @pycvm_timed
     def plot(self, horizontal_label = "Depth (km)") :
 
         if self.upperleftpoint.description == None:
@@ -129,7 +166,33 @@ class BasinSlice(HorizontalSlice):
  
         self.meta['mproperty']="vs"
 
-        HorizontalSlice.plot(self, horizontal_label)
+        if len(self.vs_thresholds) == 1 :
+            HorizontalSlice.plot(self, horizontal_label)
+            return
+
+        ## every threshold comes from the same pass and goes to its own
+        ## image, e.g. image_z2.5.png
+        self.getplotvals("vs")
+        filename = self.filename
+        for vs_threshold in self.vs_thresholds :
+            band = pycvm_basin_band(vs_threshold)
+            if band not in self.bands :
+                continue
+            self.materialproperties.setColumn("vs", self.bands[band])
+            if filename :
+                k = filename.rfind(".")
+                if k == -1 :
+                    k = len(filename)
+                self.filename = filename[:k] + "_" + band + filename[k:]
+            self.plotproperty("vs", self.meta['title'] + " (" + band.upper() + ")", horizontal_label, False)
+            plt.close('all')
+        self.filename = filename
+
+        if self.datafile == None and self.filename :
+            u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
+            self.meta['bands'] = [pycvm_basin_band(vs_threshold) for vs_threshold in self.vs_thresholds]
+            u.export_metadata(self.meta, self.filename)
+            u.export_bands(self.bands, self.filename)
         
 ##
 #  @class Z10Slice
@@ -153,12 +216,14 @@ class Z10Slice(BasinSlice):
     
     ##
     #  Gets the depths for the plot in meters.
+    @pycvm_timed
     def getplotvals(self, mproperty):
         BasinSlice.getplotvals(self, mproperty)
     
     ##
     #  Plots the Z1.0 slice.
     #
+    @pycvm_timed
     def plot(self) :
 
         if self.upperleftpoint.description == None:
@@ -174,7 +239,7 @@ class Z10Slice(BasinSlice):
         
         if 'title' in self.meta :
             self.title = self.meta['title']
-        else:
+        elif len(self.vs_thresholds) == 1 :
             self.title = "%sZ1.0 Map For %s" % (location_text, cvmdesc)
             self.meta['title'] = self.title
   
@@ -202,6 +267,7 @@ class Z25Slice(BasinSlice):
     
     ##
     #  Gets the depths for the plot in meters.
+    @pycvm_timed
     def getplotvals(self, mproperty):
         BasinSlice.getplotvals(self, mproperty)
     
@@ -210,6 +276,7 @@ class Z25Slice(BasinSlice):
     #
     #  @param title The title for the plot. Optional.
     #  @param filename The file to which the plot should be saved. Optional.
+    @pycvm_timed
     def plot(self):
 
         if self.upperleftpoint.description == None:
@@ -223,7 +290,7 @@ class Z25Slice(BasinSlice):
         except: 
             cvmdesc = self.cvm
         
-        if 'title' not in self.meta :
+        if 'title' not in self.meta and len(self.vs_thresholds) == 1 :
             title = "%sZ2.5 Map For %s" % (location_text, cvmdesc)
             self.meta['title'] = title
   
@@ -0,0 +1,250 @@
+##
+#  @file batch.py
+#  @brief Runs a manifest of plot jobs in one go.
+#  @version
+#
+#  Reads a JSON or YAML manifest of plot jobs, groups the jobs by CVM and
+#  region so that they share queries and map backgrounds, runs the groups
+#  in a process pool and reports the status and time of every job.
+
+#  Imports
+import json
+import time
+import traceback
+from multiprocessing import Pool, cpu_count
+
+from common import Point, plt
+from horizontal_slice import HorizontalSlice
+from volume_slice import VolumeSlice
+from elevation_horizontal_slice import ElevationHorizontalSlice
+from cross_section import CrossSection
+from elevation_cross_section import ElevationCrossSection
+from vs30_slice import Vs30Slice
+from vs30_etree_slice import Vs30EtreeSlice
+from elevation_slice import ElevationSlice
+from basin_slice import Z10Slice, Z25Slice
+from depth_profile import DepthProfile
+from elevation_profile import ElevationProfile
+
+## Plots over a lat/lon box: the class, and the job key of its depth or elevation.
+BATCH_BOX_PLOTS = { "horizontal_slice" : (HorizontalSlice, 'depth'), \
+                    "elevation_horizontal_slice" : (ElevationHorizontalSlice, 'elevation'), \
+                    "vs30_map" : (Vs30Slice, None), \
+                    "vs30_etree_map" : (Vs30EtreeSlice, None), \
+                    "elevation_map" : (ElevationSlice, None), \
+                    "z10_map" : (Z10Slice, None), \
+                    "z25_map" : (Z25Slice, None) }
+
+## All the plot types a manifest can hold.
+BATCH_PLOTS = list(BATCH_BOX_PLOTS.keys()) + ["cross_section", "elevation_cross_section", \
+                                             "depth_profile", "elevation_profile"]
+
+## Job keys that decide which jobs share a group.
+BATCH_GROUP_KEYS = ('installdir', 'configfile', 'cvm', 'lat1', 'lon1', 'lat2', 'lon2', 'spacing')
+
+## Job keys that must match, besides the depth, for horizontal slices to share one query.
+BATCH_QUERY_KEYS = ('zrange1', 'zrange2', 'vsfloor', 'vpfloor', 'densityfloor', 'nx', 'ny')
+
+##
+#  Makes the plot of a job the same way its plot_*.py script does. The job
+#  keys are the meta variables of the script options, e.g. lat1, lon1,
+#  spacing, depth, data_type.
+#
+#  @param plot The plot type, a key of BATCH_PLOTS.
+#  @param meta The job, as a dict of strings.
+#  @return The plot object.
+def pycvm_make_plot(plot, meta):
+    def value(key):
+        if key not in meta:
+            raise ValueError("%s needs %s." % (plot, key))
+        return float(meta[key])
+
+    if plot in BATCH_BOX_PLOTS:
+        z = 0
+        if BATCH_BOX_PLOTS[plot][1] != None:
+            z = value(BATCH_BOX_PLOTS[plot][1])
+        if plot == "elevation_horizontal_slice":
+            return ElevationHorizontalSlice(Point(value('lon1'), value('lat2'), elevation=z), \
+                                            Point(value('lon2'), value('lat1'), elevation=z), meta)
+        return BATCH_BOX_PLOTS[plot][0](Point(value('lon1'), value('lat2'), z), \
+                                        Point(value('lon2'), value('lat1'), z), meta)
+    if plot == "cross_section":
+        return CrossSection(Point(value('lon1'), value('lat1'), value('starting_depth')), \
+                            Point(value('lon2'), value('lat2'), value('starting_depth')), meta)
+    if plot == "elevation_cross_section":
+        return ElevationCrossSection(Point(value('lon1'), value('lat1'), elevation=value('starting_elevation')), \
+                                     Point(value('lon2'), value('lat2'), elevation=value('starting_elevation')), meta)
+    if plot == "depth_profile":
+        return DepthProfile(Point(value('lon1'), value('lat1'), value('starting_depth')), meta)
+    if plot == "elevation_profile":
+        return ElevationProfile(Point(value('lon1'), value('lat1'), elevation=value('starting_elevation')), meta)
+    raise ValueError("unknown plot type %s." % plot)
+
+##
+#  Runs one job and returns its report entry.
+#
+#  @param job The job.
+#  @param function Makes the plot, it is given the job and returns nothing.
+#  @return A dict with the job name, status, seconds and an error message.
+def pycvm_run_job(job, function):
+    start = time.time()
+    status = "ok"
+    message = ""
+    try:
+        function(job)
+    except SystemExit:
+        status = "failed"
+        message = "exited"
+    except Exception as err:
+        status = "failed"
+        message = str(err)
+        traceback.print_exc()
+    plt.close('all')
+    return { "name" : job['name'], "plot" : job['plot'], "status" : status, \
+             "seconds" : time.time() - start, "message" : message }
+
+##
+#  Runs a group of jobs in this process. Horizontal slices of the group that
+#  differ only in depth, property, colors or outfile are taken from one
+#  @link volume_slice.VolumeSlice VolumeSlice @endlink query. The other jobs
+#  run one by one, sharing the map backgrounds made for the group's region.
+#
+#  @param jobs The jobs of the group.
+#  @return The list of report entries, one per job and one per shared query.
+def pycvm_run_group(jobs):
+    report = []
+
+    volumes = {}
+    for job in jobs:
+        if job['plot'] == "horizontal_slice" and 'datafile' not in job:
+            key = tuple([job.get(k) for k in BATCH_QUERY_KEYS])
+            volumes.setdefault(key, []).append(job)
+        else:
+            report.append(pycvm_run_job(job, lambda job: pycvm_make_plot(job['plot'], job).plot()))
+
+    for shared in volumes.values():
+        depths = sorted(set([float(job['depth']) for job in shared]))
+        meta = dict(shared[0])
+        for key in ('outfile', 'title', 'depth'):
+            meta.pop(key, None)
+        volume = VolumeSlice(Point(float(meta['lon1']), float(meta['lat2']), depths[0]), \
+                             Point(float(meta['lon2']), float(meta['lat1']), depths[0]), depths, meta)
+
+        query = { "name" : "query %s (%d depths, %d jobs)" % (meta.get('cvm'), len(depths), len(shared)), \
+                  "plot" : "horizontal_slice" }
+        entry = pycvm_run_job(query, lambda job: volume.getplotvals())
+        report.append(entry)
+        for job in shared:
+            if entry['status'] != "ok":
+                report.append(dict(entry, name=job['name'], seconds=0.0, message="query failed"))
+                continue
+            index = depths.index(float(job['depth']))
+            report.append(pycvm_run_job(job, lambda job: volume.slice(index, job).plot()))
+
+    return report
+
+##
+#  @class PlotBatch
+#  @brief A manifest of plot jobs.
+#
+#  The manifest is a JSON, or YAML, file holding a list of jobs or an object
+#  with "defaults", merged into every job, and "jobs". Each job has a "plot"
+#  type, one of BATCH_PLOTS, an optional "name", and the meta variables of
+#  the matching plot_*.py script options:
+#
+#      { "defaults" : { "cvm" : "cvmh", "color" : "d", "spacing" : 0.1,
+#                       "lat1" : 33.5, "lon1" : -118.75, "lat2" : 34.5, "lon2" : -117.5 },
+#        "jobs" : [ { "plot" : "horizontal_slice", "depth" : 500, "data_type" : "vs",
+#                     "outfile" : "horizontal-vs-500.png" },
+#                   { "plot" : "horizontal_slice", "depth" : 1000, "data_type" : "vp",
+#                     "outfile" : "horizontal-vp-1000.png" } ] }
+class PlotBatch:
+
+    ##
+    #  Initializes the batch.
+    #
+    #  @param jobs The list of jobs.
+    #  @param defaults Values given to every job that does not set them. Optional.
+    def __init__(self, jobs, defaults = None):
+        if defaults == None:
+            defaults = {}
+
+        ## The jobs, each a dict of strings like the meta of the plot scripts.
+        self.jobs = []
+        for i, job in enumerate(jobs):
+            meta = dict(defaults)
+            meta.update(job)
+            if meta.get('plot') not in BATCH_PLOTS:
+                raise ValueError("job %d: plot must be one of %s." % (i + 1, ", ".join(sorted(BATCH_PLOTS))))
+            if 'name' not in meta:
+                meta['name'] = "%s-%d" % (meta['plot'], i + 1)
+            if 'outfile' not in meta:
+                meta['outfile'] = meta['name'] + ".png"
+            self.jobs.append(dict((str(k), str(v)) for k, v in meta.items() if v != None))
+
+    ##
+    #  Reads a manifest file, YAML if it ends with .yaml or .yml and JSON otherwise.
+    #
+    #  @param filename The manifest file.
+    #  @param defaults Values given to every job, the manifest defaults win. Optional.
+    #  @return The PlotBatch.
+    @classmethod
+    def load(cls, filename, defaults = None):
+        fh = open(filename, 'r')
+        try:
+            if filename.endswith(".yaml") or filename.endswith(".yml"):
+                try:
+                    import yaml
+                except ImportError:
+                    print("ERROR: reading a YAML manifest needs PyYAML, use a JSON manifest instead.")
+                    exit(1)
+                manifest = yaml.safe_load(fh)
+            else:
+                manifest = json.load(fh)
+        finally:
+            fh.close()
+
+        merged = dict(defaults or {})
+        if isinstance(manifest, dict):
+            merged.update(manifest.get('defaults', {}))
+            manifest = manifest.get('jobs', [])
+        return cls(manifest, merged)
+
+    ##
+    #  Returns the jobs grouped by CVM, region and spacing, in manifest order.
+    def groups(self):
+        groups = []
+        index = {}
+        for job in self.jobs:
+            key = tuple([job.get(k) for k in BATCH_GROUP_KEYS])
+            if key not in index:
+                index[key] = len(groups)
+                groups.append([])
+            groups[index[key]].append(job)
+        return groups
+
+    ##
+    #  Runs every job, the groups at the same time in separate processes.
+    #
+    #  @param processes The number of processes, one per group up to the CPU count if not given.
+    #  @return The report, a list of dicts with name, plot, status, seconds and message.
+    def run(self, processes = None):
+        groups = self.groups()
+        if processes == None:
+            processes = min(len(groups), cpu_count())
+        processes = max(int(processes), 1)
+
+        if processes == 1 or len(groups) == 1:
+            results = [pycvm_run_group(group) for group in groups]
+        else:
+            pool = Pool(processes)
+            try:
+                results = pool.map(pycvm_run_group, groups, 1)
+            finally:
+                pool.close()
+                pool.join()
+
+        report = []
+        for result in results:
+            report.extend(result)
+        return report
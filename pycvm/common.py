@@ -16,7 +16,22 @@ import math
 import struct
 import getopt
 import json
-import pdb
+import importlib
+import atexit
+import threading
+import hashlib
+import tempfile
+import pickle
+import shutil
+import time
+import functools
+import contextlib
+from multiprocessing.pool import ThreadPool
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 #  Numpy is required.
 try:
@@ -25,24 +40,246 @@ except:
     print("ERROR: NumPy must be installed on your system in order to generate these plots.")
     exit(1)
     
-#  Matplotlib is required.
-try:
+##
+#  @class LazyModule
+#  @brief Stands in for a module that is only imported the first time one of
+#         its attributes is used.
+#
+#  Matplotlib and Basemap take a long time to import, Basemap also reads its
+#  map data, and scripts such as make_map_grid.py never draw anything. They
+#  are only imported once a plot is made.
+class LazyModule:
+
+    ##
+    #  Initializes the stand-in.
+    #
+    #  @param names The module to import, followed by submodules to import with it.
+    #  @param message The error printed if the module can not be imported.
+    #  @param setup A function called before the import. Optional.
+    def __init__(self, names, message, setup = None):
+        ## The module, then the submodules to import.
+        self.names = names
+        ## The error printed if the import fails.
+        self.message = message
+        ## Called before the import.
+        self.setup = setup
+        ## The module once imported.
+        self.module = None
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    ##
+    #  Imports the module if it was not yet, and returns it.
+    def load(self):
+        if self.module is None:
+            try:
+                if self.setup != None:
+                    self.setup()
+                for name in self.names:
+                    importlib.import_module(name)
+            except Exception as e:
+                print(self.message)
+                print(e)
+                exit(1)
+            self.module = sys.modules[self.names[0]]
+        return self.module
+
+## Plots are drawn off screen, pyplot is set up for it before its import.
+def pycvm_use_agg():
     import matplotlib
     matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-    import matplotlib.colors as mcolors
-    import matplotlib.cm as cm
-except:
-    print("ERROR: Matplotlib must be installed on your system in order to generate these plots.")
-    exit(1)    
+
+#  Matplotlib is required.
+MATPLOTLIB_ERROR = "ERROR: Matplotlib must be installed on your system in order to generate these plots."
+plt = LazyModule(["matplotlib.pyplot"], MATPLOTLIB_ERROR, pycvm_use_agg)
+mcolors = LazyModule(["matplotlib.colors"], MATPLOTLIB_ERROR)
+cm = LazyModule(["matplotlib.cm"], MATPLOTLIB_ERROR)
 
 #  Basemap is required.
-try:
-    from mpl_toolkits import basemap
-except Exception as e:
-    print("ERROR: Basemap must be installed on your system in order to generate these plots.")
-    print(e)
-    exit(1)
+basemap = LazyModule(["mpl_toolkits.basemap", "mpl_toolkits.basemap.cm"], \
+                     "ERROR: Basemap must be installed on your system in order to generate these plots.", \
+                     pycvm_use_agg)
+
+#  Timings
+
+##
+#  @class PhaseTimer
+#  @brief Adds up the time spent in the named phases of making a plot.
+#
+#  Phases nest, a phase is recorded under the "/" joined names of the
+#  phases it runs in, e.g. "HorizontalSlice.plot/HorizontalSlice.getplotvals/query".
+#  Each thread keeps its own stack of open phases.
+class PhaseTimer:
+
+    ##
+    #  Initializes the timer with no phases recorded.
+    def __init__(self):
+        ## Guards the recorded phases.
+        self.lock = threading.Lock()
+        ## The stack of open phases of each thread.
+        self.local = threading.local()
+        self.reset()
+
+    ##
+    #  Forgets the recorded phases.
+    def reset(self):
+        with self.lock:
+            ## [seconds, calls] by phase path.
+            self.phases = {}
+            ## The phase paths in the order they were first recorded.
+            self.order = []
+
+    ##
+    #  Returns the names of the open phases of the calling thread.
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    ##
+    #  Notes that a phase started, so that phases are listed in the order
+    #  they started.
+    #
+    #  @param path The phase path.
+    def start(self, path):
+        with self.lock:
+            if path not in self.phases:
+                self.phases[path] = [0.0, 0]
+                self.order.append(path)
+
+    ##
+    #  Adds one run of a phase.
+    #
+    #  @param path The phase path.
+    #  @param seconds The time the run took.
+    def add(self, path, seconds):
+        self.start(path)
+        with self.lock:
+            self.phases[path][0] += seconds
+            self.phases[path][1] += 1
+
+    ##
+    #  Returns the recorded phases as a list of dicts with the phase, seconds
+    #  and calls.
+    def timings(self):
+        with self.lock:
+            return [{"phase" : path, "seconds" : round(self.phases[path][0], 6), \
+                     "calls" : self.phases[path][1]} for path in self.order]
+
+    ##
+    #  Prints the recorded phases, indented by how deep they are nested.
+    def report(self):
+        print("Timings:")
+        for timing in self.timings():
+            names = timing["phase"].split("/")
+            print("%-50s %10.3fs %6d" % ("  " * len(names) + names[-1], timing["seconds"], timing["calls"]))
+
+## The timer every phase is recorded into.
+pycvm_timer = PhaseTimer()
+
+##
+#  Records the time spent in the with block as a phase of the
+#  enclosing one.
+#
+#  @param name The name of the phase.
+@contextlib.contextmanager
+def pycvm_span(name):
+    stack = pycvm_timer.stack()
+    stack.append(name)
+    path = "/".join(stack)
+    pycvm_timer.start(path)
+    start = time.time()
+    try:
+        yield
+    finally:
+        pycvm_timer.add(path, time.time() - start)
+        stack.pop()
+
+##
+#  Starts the cProfile, and with Python 3 the tracemalloc, dump asked for by
+#  meta 'profile_dump' or the PYCVM_PROFILE_DUMP environment variable, both
+#  the prefix of the files written.
+#
+#  @param meta The meta of the plot.
+#  @return What @link pycvm_profile_stop pycvm_profile_stop @endlink needs, or None.
+def pycvm_profile_start(meta):
+    prefix = meta.get('profile_dump') or os.environ.get('PYCVM_PROFILE_DUMP')
+    if not prefix:
+        return None
+    import cProfile
+    try:
+        import tracemalloc
+        tracemalloc.start()
+    except ImportError:
+        tracemalloc = None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return (prefix, profiler, tracemalloc)
+
+##
+#  Writes <prefix>.prof, for pstats or snakeviz, and <prefix>_memory.txt
+#  with the lines that allocated the most memory.
+#
+#  @param dump What @link pycvm_profile_start pycvm_profile_start @endlink returned.
+def pycvm_profile_stop(dump):
+    if dump == None:
+        return
+    prefix, profiler, tracemalloc = dump
+    profiler.disable()
+    profiler.dump_stats(prefix + ".prof")
+    print("Profile saved to " + prefix + ".prof")
+    if tracemalloc != None:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(prefix + "_memory.txt", "w") as fh:
+            fh.write("peak %.1f MiB\n" % (peak / 1048576.0))
+            for stat in snapshot.statistics("lineno")[:25]:
+                fh.write(str(stat) + "\n")
+        print("Memory profile saved to " + prefix + "_memory.txt")
+
+##
+#  Adds the recorded phases to the _meta.json of a plot, if it was written.
+#
+#  @param fname The file name of the plot.
+def pycvm_save_timings(fname):
+    if not fname or not fname.endswith(".png"):
+        return
+    metafile = fname.replace(".png", "_meta.json")
+    if not os.path.isfile(metafile):
+        return
+    with open(metafile) as fh:
+        meta = json.load(fh)
+    meta['timings'] = pycvm_timer.timings()
+    with open(metafile, "w") as fh:
+        json.dump(meta, fh, indent=2)
+
+##
+#  Records a method as a phase named after its class. When the outermost
+#  phase ends, the timings are added to the _meta.json of the plot, printed
+#  if meta 'profile' is set, and any profile dump is written.
+def pycvm_timed(method):
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        if len(pycvm_timer.stack()) > 0:
+            with pycvm_span(self.__class__.__name__ + "." + method.__name__):
+                return method(self, *args, **kwargs)
+
+        meta = getattr(self, "meta", None)
+        if not isinstance(meta, dict):
+            meta = {}
+        pycvm_timer.reset()
+        dump = pycvm_profile_start(meta)
+        try:
+            with pycvm_span(self.__class__.__name__ + "." + method.__name__):
+                return method(self, *args, **kwargs)
+        finally:
+            pycvm_profile_stop(dump)
+            pycvm_save_timings(getattr(self, "filename", None))
+            if meta.get('profile'):
+                pycvm_timer.report()
+    return timed
 
 #  Constants
 
@@ -135,11 +372,19 @@ def ask_file(question,target):
 # "u,upperright":"lat2,lon2", \
 # ...
 # "t,title,o":"title", \
+# "N,no-cache,f":"no_cache", \
 # "H,help,o":"" })
 #
+# 'f' marks an optional flag that takes no value, its meta variable is set to "1".
+# more_options is merged into options, e.g. QUERY_OPTS.
+#
 global get_user_opts
-def get_user_opts(options):
-        
+def get_user_opts(options, more_options = None):
+
+    if more_options != None:
+        options = dict(options)
+        options.update(more_options)
+
     short_opt_string = ""
     long_opts = []
     opts_left = []
@@ -150,9 +395,14 @@ def get_user_opts(options):
     for key, value in options.items():
         items=key.split(",")
         short_opt_string = short_opt_string + items[0] 
-        if value != "" :
+        if len(items) > 2 and items[2] == 'f' :
+            long_opts.append(items[1])
+            optional_opts.append(items[0])
+        elif value != "" :
             short_opt_string = short_opt_string + ":"
-        long_opts.append(items[1])
+            long_opts.append(items[1] + "=")
+        else:
+            long_opts.append(items[1])
         opts_left.append(items[0])
         if len(items) > 2 and items[2] != None  and items[2] =='o' :
             optional_opts.append(key.split(",")[0])
@@ -174,7 +424,9 @@ def get_user_opts(options):
         for key, value in options.items():
             if o == "-" + key.split(",")[0] or o == "--" + key.split(",")[1]:
                 opts_left.remove(key.split(",")[0])
-                if "," in value:
+                if len(key.split(",")) > 2 and key.split(",")[2] == 'f':
+                    ret_val[value] = "1"
+                elif "," in value:
                     vlist=value.split(",")
                     alist=a.split(",")
                     sz=len(vlist) 
@@ -194,6 +446,45 @@ def get_user_opts(options):
         return "bad"
 
 
+## Command line options shared by every script that queries UCVM.
+QUERY_OPTS = {"W,workers,o":"workers", \
+              "K,chunksize,o":"chunk_size", \
+              "N,no-cache,f":"no_cache", \
+              "Y,cache-dir,o":"cache_dir", \
+              "B,backend,o":"backend", \
+              "T,transport,o":"transport", \
+              "S,stream,f":"stream", \
+              "P,profile,f":"profile", \
+              "R,checkpoint,o":"checkpoint", \
+              "G,tiles,o":"tile_size", \
+              "Q,persistent,f":"persistent", \
+              "U,persistent-batch,o":"persistent_batch"}
+
+global query_usage
+## Prints the usage of the options in QUERY_OPTS.
+def query_usage():
+    print("\t-W, --workers: optional number of ucvm_query processes to run at the same time")
+    print("\t-K, --chunksize: optional number of points sent to each ucvm_query process")
+    print("\t-N, --no-cache: optional, do not use or update the query result cache")
+    print("\t-Y, --cache-dir: optional query result cache directory, default ~/.cache/ucvm_plotting")
+    print("\t-B, --backend: optional ucvm_query backend, subprocess (default), library (libucvm")
+    print("\t               in-process) or auto (library when it can be loaded)")
+    print("\t-T, --transport: optional ucvm_query transport, text (default) or binary; binary is")
+    print("\t                 experimental and slower unless UCVM_BINARY_QUERY names a native program")
+    print("\t-S, --stream: optional, read ucvm_query results as they come into a float32 array")
+    print("\t-P, --profile: optional, print the time spent in each phase of the plot; set")
+    print("\t               PYCVM_PROFILE_DUMP=prefix to also save cProfile and tracemalloc output")
+    print("\t-R, --checkpoint: optional directory where a long query saves its finished blocks, so")
+    print("\t                  that running the same command again resumes it")
+    print("\t-G, --tiles: optional tile size, also save the plotted values to <outfile>_data.tiles,")
+    print("\t             which --datafile can replot in part, e.g. a smaller region")
+    print("\t-Q, --persistent: optional, keep ucvm_query running between queries so the model is")
+    print("\t                  loaded once")
+    print("\t-U, --persistent-batch: optional number of points a persistent ucvm_query buffers before")
+    print("\t                  it answers, default %d for the stock ucvm_query. Every query is padded" % UCVM_QUERY_BLOCK)
+    print("\t                  to a multiple of it, so small queries cost a whole batch; use 0 for a")
+    print("\t                  query program that answers line by line")
+
 #  Class Definitions
 
 ##
@@ -252,7 +543,8 @@ class Plot:
     #
     #  @param filename The name fo the file to save.
     def savefig(self, filename):
-        plt.savefig(filename)
+        with pycvm_span("savefig"):
+            plt.savefig(filename)
 
 ## MEI ToDO
     def savehtml(self, filename):
@@ -323,6 +615,124 @@ class Point:
         else:
             return "(%.4f, %.4f, %.4f)" % (float(self.longitude), float(self.latitude), float(self.depth))
 
+##
+#  @class PointArray
+#  @brief A set of points held as longitude, latitude and depth NumPy arrays.
+#
+#  Used instead of a list of @link Point Points @endlink for the regular grids
+#  of the slice plots, so that no Python object is made per grid cell and the
+#  query input can be written in one formatting step.
+class PointArray:
+
+    ##
+    #  Initializes the point array. The depth and elevation may be single
+    #  numbers, in which case every point gets the same value.
+    #
+    #  @param longitude Longitudes as a list or NumPy array.
+    #  @param latitude Latitudes as a list or NumPy array.
+    #  @param depth The depths in meters with the surface being 0.
+    #  @param elevation The elevations in meters. Optional.
+    def __init__(self, longitude, latitude, depth = 0, elevation = None):
+        ## Longitudes as a flat float array in WGS84 projection.
+        self.longitude = np.asarray(longitude, dtype=np.float64).reshape(-1)
+        ## Latitudes as a flat float array in WGS84 projection.
+        self.latitude = np.asarray(latitude, dtype=np.float64).reshape(-1)
+        if self.longitude.shape != self.latitude.shape:
+            raise ValueError("Longitude and latitude must have the same number of points.")
+
+        ## Depths in meters below the surface, one per point.
+        self.depth = np.empty(self.longitude.shape)
+        self.depth[:] = np.asarray(depth, dtype=np.float64).reshape(-1)
+        if np.any(self.depth < 0):
+            raise ValueError("Depth must be positive.")
+
+        ## The (rows, columns) of the grid the points make, or None.
+        self.shape = None
+
+        ## Elevations in meters, one per point, or None.
+        self.elevation = None
+        if elevation is not None:
+            self.elevation = np.empty(self.longitude.shape)
+            self.elevation[:] = np.asarray(elevation, dtype=np.float64).reshape(-1)
+
+    ##
+    #  Makes the row-major grid of a horizontal slice, starting at the lower
+    #  left corner and walking east first, then north.
+    #
+    #  @param longitude The longitude of the left edge of the grid.
+    #  @param latitude The latitude of the bottom edge of the grid.
+    #  @param spacing The grid spacing in degrees.
+    #  @param num_x The number of points in the east-west direction.
+    #  @param num_y The number of points in the north-south direction.
+    #  @param depth The depth of the grid in meters.
+    #  @param elevation The elevation of the grid in meters. Optional.
+    #  @return The grid as a PointArray of num_x * num_y points.
+    @classmethod
+    def grid(cls, longitude, latitude, spacing, num_x, num_y, depth = 0, elevation = None):
+        with pycvm_span("points"):
+            lons, lats = np.meshgrid(longitude + np.arange(num_x) * spacing, \
+                                     latitude + np.arange(num_y) * spacing)
+            points = cls(lons, lats, depth, elevation)
+            points.shape = lons.shape
+            return points
+
+    ##
+    #  Returns the points as a PointArray. A list of @link Point Points @endlink
+    #  or a single point is copied into arrays, a PointArray is returned as is.
+    #
+    #  @param points A PointArray, a list of @link Point Points @endlink or a Point.
+    #  @return The points as a PointArray.
+    @classmethod
+    def fromPoints(cls, points):
+        if isinstance(points, PointArray):
+            return points
+        if isinstance(points, Point):
+            points = [points]
+        elevation = None
+        if len(points) > 0 and points[0].elevation != None:
+            elevation = [point.elevation for point in points]
+        return cls([point.longitude for point in points], [point.latitude for point in points], \
+                   [point.depth for point in points], elevation)
+
+    def __len__(self):
+        return self.longitude.size
+
+    ##
+    #  Returns one point as a @link Point Point @endlink, or a slice as a PointArray.
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            elevation = None
+            if self.elevation is not None:
+                elevation = self.elevation[index]
+            return PointArray(self.longitude[index], self.latitude[index], self.depth[index], elevation)
+
+        elevation = None
+        if self.elevation is not None:
+            elevation = float(self.elevation[index])
+        return Point(float(self.longitude[index]), float(self.latitude[index]), \
+                     float(self.depth[index]), elevation)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    ##
+    #  Writes the points as the text the UCVM query programs read, one
+    #  "lon lat" or "lon lat z" line per point.
+    #
+    #  @param columns 2 for longitude and latitude only, 3 to add the depth or elevation.
+    #  @param elevation True to write the elevation instead of the depth. Optional.
+    #  @return The points as a string.
+    def toText(self, columns = 3, elevation = None):
+        if columns == 2:
+            values = np.column_stack((self.longitude, self.latitude))
+        elif elevation:
+            values = np.column_stack((self.longitude, self.latitude, self.elevation))
+        else:
+            values = np.column_stack((self.longitude, self.latitude, self.depth))
+        line = " ".join(["%.5f"] * columns) + "\n"
+        return (line * len(self)) % tuple(values.ravel().tolist())
+
 ##
 #  @class MaterialProperties
 #  @brief Defines the possible material properties that @link UCVM UCVM @endlink can return.
@@ -477,6 +887,1018 @@ class MaterialProperties:
     def __str__(self):
         return "Vp: %.2fm/s, Vs: %.2fm/s, Density: %.2fg/cm^3" % (self.vp, self.vs, self.density)
  
+## The material property columns held by a @link MaterialGrid MaterialGrid @endlink.
+MATERIAL_COLUMNS = ["vp", "vs", "density", "poisson", "qp", "qs"]
+
+## Properties the slice plots can show.
+PLOT_PROPERTIES = ["vs", "vp", "density", "poisson"]
+## The NumPy record type of one @link MaterialGrid MaterialGrid @endlink cell.
+MATERIAL_DTYPE = np.dtype([(name, np.float32) for name in MATERIAL_COLUMNS])
+
+##
+#  @class MaterialPropertiesView
+#  @brief A @link MaterialProperties MaterialProperties @endlink that reads and
+#         writes one cell of a @link MaterialGrid MaterialGrid @endlink.
+#
+#  Returned when a single cell of a grid is indexed so that existing code
+#  using getProperty, setProperty or the vp, vs, ... attributes keeps working.
+class MaterialPropertiesView(MaterialProperties):
+
+    ##
+    #  Initializes the view.
+    #
+    #  @param data The structured NumPy array holding the cell.
+    #  @param index The index of the cell in data.
+    def __init__(self, data, index):
+        self.__dict__['data'] = data
+        self.__dict__['index'] = index
+
+    def __getattr__(self, name):
+        if name in MATERIAL_COLUMNS:
+            return float(self.data[name][self.index])
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name in MATERIAL_COLUMNS:
+            self.data[name][self.index] = value
+        else:
+            self.__dict__[name] = value
+
+##
+#  @class MaterialGrid
+#  @brief Column storage for a grid of material properties.
+#
+#  Holds vp, vs, density, poisson, qp and qs as float32 columns of a NumPy
+#  structured array instead of one @link MaterialProperties MaterialProperties @endlink
+#  object per cell. Indexing it like the old nested lists, grid[y][x], returns
+#  a @link MaterialPropertiesView MaterialPropertiesView @endlink on that cell.
+class MaterialGrid:
+
+    ##
+    #  Initializes the grid with every property set to -1.
+    #
+    #  @param shape The shape of the grid, e.g. (num_y, num_x).
+    #  @param data An existing structured array to wrap instead. Optional.
+    def __init__(self, shape = None, data = None):
+        if data is None:
+            data = np.empty(shape, dtype=MATERIAL_DTYPE)
+            for name in MATERIAL_COLUMNS:
+                data[name] = -1
+        ## The structured array holding the properties.
+        self.data = data
+        ## The shape of the grid.
+        self.shape = data.shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(self.shape[0]):
+            yield self[i]
+
+    def __getitem__(self, index):
+        cell = self.data[index]
+        if cell.shape == ():
+            return MaterialPropertiesView(self.data, index)
+        return MaterialGrid(data=cell)
+
+    def __setitem__(self, index, value):
+        if isinstance(value, MaterialGrid):
+            self.data[index] = value.data
+            return
+        for name in MATERIAL_COLUMNS:
+            self.data[name][index] = value.getProperty(name)
+
+    ##
+    #  Subtracts another grid of the same shape, property by property.
+    def __sub__(own, other):
+        grid = MaterialGrid(own.shape)
+        for name in MATERIAL_COLUMNS:
+            grid.data[name] = own.data[name] - other.data[name]
+        return grid
+
+    ##
+    #  Returns one property for the whole grid.
+    #
+    #  @param property The property name as a string ("vs", "vp", "density", "poisson", "qp", or "qs").
+    #  @return A NumPy array, shaped like the grid, that shares memory with the grid.
+    def getColumn(self, property):
+        if property.lower() not in MATERIAL_COLUMNS:
+            raise ValueError("Parameter property must be a valid material property unit.")
+        return self.data[property.lower()]
+
+    ##
+    #  Sets one property for the grid from a flat, row-major, list of values.
+    #  If fewer values than cells are given, only the first cells are set.
+    #
+    #  @param property The property name as a string ("vs", "vp", "density", "poisson", "qp", or "qs").
+    #  @param values The values, as a list, NumPy array or single number.
+    def setColumn(self, property, values):
+        column = self.getColumn(property)
+        values = np.asarray(values, dtype=np.float32).reshape(-1)
+        count = min(values.size, column.size)
+        column.flat[:count] = values[:count]
+
+    ##
+    #  Sets the grid from a flat, row-major, list of @link MaterialProperties
+    #  MaterialProperties @endlink as returned by @link UCVM::query UCVM.query @endlink,
+    #  or from another grid as returned by @link UCVM::query_columns UCVM.query_columns @endlink.
+    #
+    #  @param properties The material properties, a single one, or a MaterialGrid.
+    def setProperties(self, properties):
+        if isinstance(properties, MaterialGrid):
+            for name in MATERIAL_COLUMNS:
+                self.setColumn(name, properties.data[name])
+            return
+        if isinstance(properties, MaterialProperties):
+            properties = [properties]
+        for name in MATERIAL_COLUMNS:
+            self.setColumn(name, [mp.getProperty(name) for mp in properties])
+
+##
+#  @class UCVMQueryError
+#  @brief A query program failed while answering a chunk of points.
+#
+#  Chunks may run on worker threads, where exit() would only end the thread,
+#  so they raise this instead and @link UCVM::map_chunks map_chunks @endlink
+#  reports it and exits on the calling thread.
+class UCVMQueryError(RuntimeError):
+    pass
+
+##
+#  @class UCVMWorker
+#  @brief A long-lived ucvm_query process that answers batches of points.
+#
+#  The query program is started once and kept running. Every batch of points
+#  is written to its stdin and exactly one result line per point is read back
+#  from its stdout, so the model is only loaded the first time the worker is
+#  used. The stock ucvm_query only answers once it has buffered a fixed
+#  number of points, so batches are padded up to a multiple of flush_size;
+#  a query program that answers line by line can be given 0. A worker that
+#  gives no output for timeout seconds is killed, and the pool starts a new
+#  one the next time it is asked for.
+class UCVMWorker:
+
+    ##
+    #  Starts the query program.
+    #
+    #  @param command The command line, as a list, that runs the query program.
+    #  @param flush_size The number of points the query program buffers before answering. Optional.
+    #  @param timeout The most seconds to wait for output, no limit if None. Optional.
+    def __init__(self, command, flush_size = 0, timeout = None):
+        ## The command line this worker was started with.
+        self.command = command
+        ## Batches are padded to a multiple of this many points.
+        self.flush_size = int(flush_size)
+        ## The most seconds to wait for output.
+        self.timeout = timeout
+        ## Only one batch at a time can go through the process.
+        self.lock = threading.Lock()
+
+        #  Ask for line buffered output when the system can do that for us.
+        stdbuf = pycvm_which("stdbuf")
+        if stdbuf != None:
+            command = [stdbuf, "-oL"] + command
+
+        self.proc = Popen(command, stdout=PIPE, stdin=PIPE, stderr=STDOUT, \
+                          bufsize=1, universal_newlines=True)
+
+        ## Output read from the query program, a chunk at a time, empty at the end.
+        self.chunks = queue.Queue()
+        ## The start of a line not yet complete.
+        self.pending = b""
+        reader = threading.Thread(target=self._read)
+        reader.daemon = True
+        reader.start()
+
+    ##
+    #  Reads the output of the query program into self.chunks. Runs in its own
+    #  thread so that run can stop waiting for output after a timeout.
+    def _read(self):
+        fd = self.proc.stdout.fileno()
+        while True:
+            try:
+                data = os.read(fd, 1 << 20)
+            except OSError:
+                data = b""
+            self.chunks.put(data)
+            if len(data) == 0:
+                return
+
+    ##
+    #  Returns the next complete output lines of the query program.
+    def _lines(self):
+        while True:
+            try:
+                data = self.chunks.get(timeout=self.timeout)
+            except queue.Empty:
+                self.close()
+                raise UCVMQueryError("%s gave no answer for %d seconds. If it buffers a fixed number of points" \
+                                     " before answering, set UCVM_PERSISTENT_BATCH to that number." % \
+                                     (self.command[0], self.timeout))
+            if len(data) == 0:
+                self.chunks.put(data)
+                raise UCVMQueryError(self.command[0] + " exited before all the points were returned.")
+            data = self.pending + data
+            k = data.rfind(b"\n")
+            if k == -1:
+                self.pending = data
+                continue
+            self.pending = data[k + 1:]
+            return data[:k].decode().split("\n")
+    ##
+    #  Returns true if the query program is still running.
+    def alive(self):
+        return self.proc.poll() == None
+
+    ##
+    #  Writes the points to the query program. Runs in its own thread so that
+    #  a large batch can not fill up the output pipe while we are still writing.
+    def _write(self, text_points):
+        try:
+            self.proc.stdin.write(text_points)
+            self.proc.stdin.flush()
+        except IOError:
+            pass
+
+    ##
+    #  Sends a batch of points through the query program.
+    #
+    #  @param text_points The points, one "lon lat z" line per point.
+    #  @param npoints The number of points in text_points.
+    #  @return The result lines, one per point.
+    def run(self, text_points, npoints):
+        with self.lock:
+            padding = 0
+            if self.flush_size > 0 and npoints % self.flush_size != 0:
+                padding = self.flush_size - npoints % self.flush_size
+                last_line = text_points[text_points.rstrip("\n").rfind("\n") + 1:]
+                text_points = text_points + last_line * padding
+
+                ## the padding goes through the model too
+                global pycvm_padding_warned
+                if padding > 10 * npoints and not pycvm_padding_warned:
+                    print("WARNING: padding %d points with %d copies of the last one, the %d points the" % \
+                          (npoints, padding, self.flush_size))
+                    print("         persistent query program buffers before it answers. Set UCVM_PERSISTENT_BATCH")
+                    print("         (-U) to 0 if it answers line by line, or turn persistent queries off.")
+                    pycvm_padding_warned = True
+
+            writer = threading.Thread(target=self._write, args=(text_points,))
+            writer.daemon = True
+            writer.start()
+
+            output = []
+            while len(output) < npoints + padding:
+                for line in self._lines():
+                    if pycvm_is_data_line(line):
+                        output.append(line)
+                    elif ("WARNING" in line) or ("slow performance" in line) or ("Using Geo" in line) or line.strip() == "":
+                        continue
+                    else:
+                        self.close()
+                        raise UCVMQueryError(str(line))
+
+            writer.join()
+            return output[:npoints]
+
+    ##
+    #  Stops the query program.
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except IOError:
+            pass
+        try:
+            self.proc.terminate()
+        except OSError:
+            pass
+        self.proc.wait()
+
+##
+#  @class UCVMWorkerPool
+#  @brief Keeps one warm @link UCVMWorker UCVMWorker @endlink per query configuration.
+#
+#  Workers are keyed by their full command line, which holds the program,
+#  the configuration file, the CVM, the Z-range, the floors and the coordinate
+#  mode. A session that renders many plots from the same model loads it once.
+class UCVMWorkerPool:
+
+    ##
+    #  Initializes an empty pool.
+    def __init__(self):
+        ## The running workers, keyed by command line.
+        self.workers = {}
+        self.lock = threading.Lock()
+
+    ##
+    #  Returns the worker for this command line, starting it if needed.
+    #
+    #  @param command The command line, as a list, that runs the query program.
+    #  @param flush_size See @link UCVMWorker UCVMWorker @endlink. Optional.
+    #  @param slot Separate workers are kept for each slot of the same command line. Optional.
+    #  @param timeout See @link UCVMWorker UCVMWorker @endlink. Optional.
+    #  @return A running @link UCVMWorker UCVMWorker @endlink.
+    def get(self, command, flush_size = 0, slot = 0, timeout = None):
+        key = (tuple(command), slot)
+        with self.lock:
+            worker = self.workers.get(key)
+            if worker == None or not worker.alive():
+                worker = UCVMWorker(command, flush_size, timeout)
+                self.workers[key] = worker
+        return worker
+
+    ##
+    #  Stops every worker in the pool.
+    def shutdown(self):
+        with self.lock:
+            for worker in self.workers.values():
+                worker.close()
+            self.workers = {}
+
+## The worker pool shared by every @link UCVM UCVM @endlink instance.
+ucvm_worker_pool = UCVMWorkerPool()
+atexit.register(ucvm_worker_pool.shutdown)
+
+##
+#  Returns the key for a query, a hash of everything that decides its answer.
+#
+#  @param parts The strings and arrays that identify the query.
+#  @return The key as a hex string.
+def pycvm_query_key(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+##
+#  @class QueryCache
+#  @brief Keeps the parsed results of earlier queries on disk.
+#
+#  Results are stored as compressed NumPy files named after a hash of
+#  everything that decides the answer: the query command line (program, CVM,
+#  coordinate mode, Z-range, floors), the configuration file and the points.
+#  Reading a result marks it as recently used and the least recently used
+#  files are removed once the cache grows past its size limit.
+class QueryCache:
+
+    ##
+    #  Initializes the cache, creating its directory if needed.
+    #
+    #  @param directory The directory holding the cached results.
+    #  @param max_bytes The largest total size of the cached results in bytes.
+    def __init__(self, directory, max_bytes):
+        ## The directory holding the cached results.
+        self.directory = directory
+        ## The largest total size of the cached results in bytes.
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    ##
+    #  Returns the key for a query.
+    #
+    #  @param parts The strings and arrays that identify the query.
+    #  @return The key as a hex string.
+    def key(self, *parts):
+        return pycvm_query_key(*parts)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    ##
+    #  Returns the cached result for a key, or None if there is none.
+    #
+    #  @param key The key from @link QueryCache::key key @endlink.
+    #  @return The cached array or None.
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                values = np.load(fh)["values"]
+            os.utime(path, None)
+        except Exception:
+            return None
+        return values
+
+    ##
+    #  Stores a result and removes the least recently used results if the
+    #  cache is now too big.
+    #
+    #  @param key The key from @link QueryCache::key key @endlink.
+    #  @param values The result as a NumPy array.
+    def put(self, key, values):
+        tmpname = None
+        try:
+            fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "wb") as fh:
+                np.savez_compressed(fh, values=values)
+            os.rename(tmpname, self._path(key))
+        except (IOError, OSError) as err:
+            print("WARNING: could not write to the query cache, " + str(err))
+            if tmpname != None and os.path.exists(tmpname):
+                os.remove(tmpname)
+            return
+        self.evict()
+
+    ##
+    #  Removes the least recently used results until the cache fits its size limit.
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+            total = total + info.st_size
+
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total = total - size
+
+##
+#  @class QueryCheckpoint
+#  @brief Keeps the finished blocks of a long query so that a rerun resumes it.
+#
+#  A query is split into blocks of whole grid rows. Each finished block is
+#  saved as block_<n>.npy in a scratch directory named after the query key,
+#  then its number is added to journal.txt. The first line of the journal
+#  describes the split; a journal for another split is started over.
+class QueryCheckpoint:
+
+    ##
+    #  Opens the checkpoint of a query, creating its directory if needed.
+    #
+    #  @param directory The directory holding the checkpoints.
+    #  @param key The key of the query, see @link pycvm_query_key pycvm_query_key @endlink.
+    #  @param npoints The number of points of the query.
+    #  @param block The number of points in a block.
+    def __init__(self, directory, key, npoints, block):
+        ## The scratch directory of this query.
+        self.directory = os.path.join(directory, key)
+        ## The number of points of the query.
+        self.npoints = npoints
+        ## The number of points in a block.
+        self.block = block
+        ## The number of blocks.
+        self.nblocks = (npoints + block - 1) // block
+        ## The progress journal.
+        self.journal = os.path.join(self.directory, "journal.txt")
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _path(self, index):
+        return os.path.join(self.directory, "block_%06d.npy" % index)
+
+    def _header(self):
+        return json.dumps({"points" : self.npoints, "block" : self.block, "blocks" : self.nblocks})
+
+    ##
+    #  Returns the set of blocks finished by earlier runs, and starts the
+    #  journal over if there is none for this split.
+    def done(self):
+        finished = set()
+        try:
+            with open(self.journal) as fh:
+                lines = fh.read().split("\n")
+        except (IOError, OSError):
+            lines = []
+        if len(lines) > 0 and lines[0] == self._header():
+            for line in lines[1:]:
+                if line.strip().isdigit() and os.path.isfile(self._path(int(line))):
+                    finished.add(int(line))
+            return finished
+
+        with open(self.journal, "w") as fh:
+            fh.write(self._header() + "\n")
+        return finished
+
+    ##
+    #  Returns the start and stop point of a block.
+    def bounds(self, index):
+        return index * self.block, min((index + 1) * self.block, self.npoints)
+
+    ##
+    #  Saves a finished block, then records it in the journal.
+    #
+    #  @param index The block number.
+    #  @param values The results of the block.
+    def save(self, index, values):
+        fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "wb") as fh:
+            np.save(fh, values)
+        os.rename(tmpname, self._path(index))
+        with open(self.journal, "a") as fh:
+            fh.write("%d\n" % index)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    ##
+    #  Returns the results of a finished block.
+    def load(self, index):
+        return np.load(self._path(index))
+
+    ##
+    #  Removes the scratch directory once the query is complete.
+    def remove(self):
+        shutil.rmtree(self.directory, True)
+
+##
+#  Packs (n, 2) integer grid positions into one int64 key per position.
+#
+#  @param positions The positions as an (n, 2) integer array, each value below 2^31 in size.
+#  @return The keys as an int64 array.
+def pycvm_column_keys(positions):
+    positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+    return positions[:, 0] * 4294967296 + (positions[:, 1] + 2147483648)
+
+##
+#  @class ColumnStore
+#  @brief Keeps vertical columns of vp, vs and density for reuse by later plots.
+#
+#  Cross sections, depth profiles and basin depth maps of the same area ask
+#  for the same columns over and over. A store holds the columns of one
+#  query setup, the query command line, model configuration and vertical
+#  spacing. Columns are keyed by their position snapped to a grid, see
+#  @link UCVM::query_profiles query_profiles @endlink.
+#
+#  Each batch of columns added is one block, all of its columns covering the
+#  same levels, saved once as <prefix>_<id>.npz in the query cache directory.
+#  The cache counts the blocks towards its size limit and removes the least
+#  recently used ones like its other files. Only the positions of a block are
+#  read up front; its values are read when a lookup first needs them, and the
+#  least recently used values are dropped from memory past max_bytes.
+class ColumnStore:
+
+    ##
+    #  Initializes the store with the blocks saved earlier, if any.
+    #
+    #  @param directory The directory the blocks are saved to, or None to keep them in memory only.
+    #  @param prefix The start of the file names of the blocks of this store.
+    #  @param max_bytes The most bytes of column values held in memory. Optional.
+    def __init__(self, directory = None, prefix = "columns", max_bytes = None):
+        ## The directory the blocks are saved to.
+        self.directory = directory
+        ## The start of the file names of the blocks.
+        self.prefix = prefix
+        ## The most bytes of column values held in memory, no limit if None.
+        self.max_bytes = max_bytes
+        ## Guards the blocks.
+        self.lock = threading.Lock()
+        ## The blocks, least recently used first. Each is a dict of its file,
+        ## sorted position keys, their rows, first level, number of levels and
+        ## the (columns, levels, 3) float32 values once read.
+        self.blocks = []
+        ## The bytes of column values held in memory.
+        self.held = 0
+        if directory == None or not os.path.isdir(directory):
+            return
+
+        names = [name for name in os.listdir(directory) \
+                 if name.startswith(prefix + "_") and name.endswith(".npz")]
+        paths = [os.path.join(directory, name) for name in names]
+        for mtime, path in sorted((os.path.getmtime(path), path) for path in paths if os.path.isfile(path)):
+            try:
+                with open(path, "rb") as fh:
+                    saved = np.load(fh)
+                    positions = saved["positions"]
+                    start, length = saved["levels"].tolist()
+            except Exception:
+                continue
+            self._append(path, positions, start, length, None)
+
+    def _append(self, path, positions, start, length, values):
+        keys = pycvm_column_keys(positions)
+        order = np.argsort(keys, kind="mergesort")
+        block = {"path" : path, "keys" : keys[order], "rows" : order, "start" : int(start), \
+                 "length" : int(length), "values" : values}
+        self.blocks.append(block)
+        if values is not None:
+            self.held = self.held + values.nbytes
+            self._trim(block)
+
+    ##
+    #  Removes a block from the list. Blocks are dicts holding arrays, so they
+    #  are matched by identity rather than with list.remove.
+    def _remove(self, block):
+        for i in range(len(self.blocks)):
+            if self.blocks[i] is block:
+                del self.blocks[i]
+                return
+
+    ##
+    #  Drops the values of the least recently used blocks from memory until the
+    #  store fits max_bytes again. Blocks without a file can not be read back
+    #  and are dropped whole.
+    def _trim(self, keep):
+        if self.max_bytes == None:
+            return
+        for block in list(self.blocks):
+            if self.held <= self.max_bytes:
+                return
+            if block is keep or block["values"] is None:
+                continue
+            self.held = self.held - block["values"].nbytes
+            block["values"] = None
+            if block["path"] == None:
+                self._remove(block)
+
+    ##
+    #  Returns the values of a block, reading them from its file if needed,
+    #  or None if the file is gone.
+    def _values(self, block):
+        if block["values"] is None:
+            try:
+                with open(block["path"], "rb") as fh:
+                    block["values"] = np.load(fh)["values"]
+            except Exception:
+                self._remove(block)
+                return None
+            self.held = self.held + block["values"].nbytes
+            self._trim(block)
+        return block["values"]
+
+    ##
+    #  Fills in the columns that are held for a range of levels. A column can
+    #  come from several blocks that together cover the range.
+    #
+    #  @param positions The snapped positions as an (n, 2) integer array.
+    #  @param level The first level wanted.
+    #  @param values A (n, levels, 3) array to fill in.
+    #  @return A boolean array, true for the columns that were not held.
+    def lookup(self, positions, level, values):
+        count = values.shape[1]
+        keys = pycvm_column_keys(positions)
+        filled = np.zeros((len(keys), count), dtype=bool)
+        with self.lock:
+            for block in list(reversed(self.blocks)):
+                first = max(level, block["start"])
+                last = min(level + count, block["start"] + block["length"])
+                if first >= last or len(block["keys"]) == 0:
+                    continue
+                found = np.minimum(np.searchsorted(block["keys"], keys), len(block["keys"]) - 1)
+                hits = np.nonzero((block["keys"][found] == keys) & \
+                                  ~filled[:, first - level:last - level].all(axis=1))[0]
+                if len(hits) == 0:
+                    continue
+                column = self._values(block)
+                if column is None:
+                    continue
+                values[hits, first - level:last - level] = \
+                    column[block["rows"][found[hits]], first - block["start"]:last - block["start"]]
+                filled[hits, first - level:last - level] = True
+
+                ## most recently used last, and its file too for the cache
+                self._remove(block)
+                self.blocks.append(block)
+                if block["path"] != None:
+                    try:
+                        os.utime(block["path"], None)
+                    except OSError:
+                        pass
+        return ~filled.all(axis=1)
+
+    ##
+    #  Adds a block of columns and saves it, if the store has a directory.
+    #
+    #  @param positions The snapped positions as an (n, 2) integer array.
+    #  @param level The first level of the values.
+    #  @param values A (n, levels, 3) array.
+    def add(self, positions, level, values):
+        values = np.asarray(values, dtype=np.float32)
+        path = None
+        if self.directory != None:
+            tmpname = None
+            try:
+                fd, tmpname = tempfile.mkstemp(prefix=self.prefix + "_", suffix=".tmp", dir=self.directory)
+                with os.fdopen(fd, "wb") as fh:
+                    np.savez(fh, positions=np.asarray(positions, dtype=np.int64), \
+                             levels=np.array([level, values.shape[1]], dtype=np.int64), values=values)
+                path = tmpname[:-len(".tmp")] + ".npz"
+                os.rename(tmpname, path)
+            except (IOError, OSError) as err:
+                print("WARNING: could not save to the column store, " + str(err))
+                if tmpname != None and os.path.exists(tmpname):
+                    os.remove(tmpname)
+                path = None
+        with self.lock:
+            self._append(path, positions, level, values.shape[1], values)
+
+    ##
+    #  Forgets the blocks whose files the query cache has removed.
+    def prune(self):
+        with self.lock:
+            for block in list(self.blocks):
+                if block["path"] != None and not os.path.isfile(block["path"]):
+                    if block["values"] is not None:
+                        self.held = self.held - block["values"].nbytes
+                    self._remove(block)
+
+## The column stores of this process, by key.
+pycvm_column_stores = {}
+pycvm_column_stores_lock = threading.Lock()
+
+##
+#  @class TileStore
+#  @brief Keeps the plotted values of a map, cross section or volume in tiles
+#         so that part of it can be read back without loading the rest.
+#
+#  A store is a directory, e.g. image_data.tiles, holding index.json and one
+#  compressed NumPy file per tile, tile_<row>_<column>.npz. Each band is an
+#  array of shape (..., num_y, num_x) and is cut into tiles over its last two
+#  axes; every band of a store has the same num_y and num_x. The index holds
+#  the grid size, the tile size, the leading shape of each band and the
+#  attributes that place the grid, e.g. its first longitude and spacing.
+class TileStore:
+
+    ##
+    #  Opens a store, reading its index if it has one.
+    #
+    #  @param directory The directory of the store.
+    def __init__(self, directory):
+        ## The directory of the store.
+        self.directory = directory
+        ## The index of the store, empty until it is written.
+        self.index = {}
+        ## The number of tiles read so far.
+        self.tiles_read = 0
+        path = os.path.join(directory, "index.json")
+        if os.path.isfile(path):
+            with open(path) as fh:
+                self.index = json.load(fh)
+
+    def _path(self, row, col):
+        return os.path.join(self.directory, "tile_%04d_%04d.npz" % (row, col))
+
+    ##
+    #  The attributes saved with the values.
+    def attrs(self):
+        return self.index.get("attrs", {})
+
+    ##
+    #  The (num_y, num_x) size of the grid.
+    def shape(self):
+        return tuple(self.index["shape"])
+
+    ##
+    #  Writes the bands, replacing what the store held. The index is written
+    #  last, so a store is only readable once all its tiles are.
+    #
+    #  @param bands The arrays to save, by name, each of shape (..., num_y, num_x).
+    #  @param tile The number of rows and columns in a tile.
+    #  @param attrs The attributes to save with the values. Optional.
+    def write(self, bands, tile, attrs = None):
+        bands = dict((name, np.asarray(values)) for name, values in bands.items())
+        shape = list(bands.values())[0].shape[-2:]
+        for name in bands:
+            if bands[name].ndim < 2 or bands[name].shape[-2:] != shape:
+                print("ERROR: band %s is not a %d x %d grid." % (name, shape[1], shape[0]))
+                exit(1)
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        for fname in os.listdir(self.directory):
+            if fname == "index.json" or (fname.startswith("tile_") and fname.endswith(".npz")):
+                os.remove(os.path.join(self.directory, fname))
+
+        for row in range(0, shape[0], tile):
+            for col in range(0, shape[1], tile):
+                with open(self._path(row // tile, col // tile), "wb") as fh:
+                    np.savez_compressed(fh, **dict((name, bands[name][..., row:row + tile, col:col + tile]) \
+                                                   for name in bands))
+
+        self.index = {"shape" : list(shape), "tile" : tile, \
+                      "bands" : dict((name, list(bands[name].shape[:-2])) for name in bands), \
+                      "attrs" : attrs or {}}
+        fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "w") as fh:
+            json.dump(self.index, fh, indent=2)
+        os.rename(tmpname, os.path.join(self.directory, "index.json"))
+
+    ##
+    #  Reads a window of the bands, loading only the tiles it overlaps.
+    #
+    #  @param rows The (first, last + 1) rows, all of them if not given.
+    #  @param cols The (first, last + 1) columns, all of them if not given.
+    #  @return The bands, by name, each of shape (..., rows, columns).
+    def read(self, rows = None, cols = None):
+        ny, nx = self.shape()
+        tile = self.index["tile"]
+        r0, r1 = rows if rows != None else (0, ny)
+        c0, c1 = cols if cols != None else (0, nx)
+
+        bands = {}
+        for row in range(r0 // tile, (r1 + tile - 1) // tile):
+            for col in range(c0 // tile, (c1 + tile - 1) // tile):
+                with open(self._path(row, col), "rb") as fh:
+                    saved = np.load(fh)
+                    ## the part of the tile inside the window, in tile and window coordinates
+                    y0, y1 = max(r0, row * tile), min(r1, (row + 1) * tile)
+                    x0, x1 = max(c0, col * tile), min(c1, (col + 1) * tile)
+                    for name in saved.files:
+                        values = saved[name]
+                        if name not in bands:
+                            bands[name] = np.empty(tuple(self.index["bands"][name]) + (r1 - r0, c1 - c0), \
+                                                   dtype=values.dtype)
+                        bands[name][..., y0 - r0:y1 - r0, x0 - c0:x1 - c0] = \
+                            values[..., y0 - row * tile:y1 - row * tile, x0 - col * tile:x1 - col * tile]
+                self.tiles_read = self.tiles_read + 1
+        return bands
+
+    ##
+    #  Returns the rows and columns of a map grid within the grid of the store,
+    #  which must have been written with the lon0, lat0 and spacing attributes.
+    #
+    #  @param longitude The longitude of the first column.
+    #  @param latitude The latitude of the first row.
+    #  @param spacing The spacing of the grid in degrees.
+    #  @param num_x The number of columns.
+    #  @param num_y The number of rows.
+    #  @return The (first, last + 1) rows and columns, for @link TileStore::read read @endlink.
+    def window(self, longitude, latitude, spacing, num_x, num_y):
+        attrs = self.attrs()
+        if 'spacing' not in attrs or abs(float(attrs['spacing']) - spacing) > 1e-9:
+            print("ERROR: %s does not have a grid spacing of %g." % (self.directory, spacing))
+            exit(1)
+        col = (longitude - float(attrs['lon0'])) / spacing
+        row = (latitude - float(attrs['lat0'])) / spacing
+        if abs(col - round(col)) > 1e-3 or abs(row - round(row)) > 1e-3:
+            print("ERROR: (%g, %g) is not on the grid of %s." % (longitude, latitude, self.directory))
+            exit(1)
+        col = int(round(col))
+        row = int(round(row))
+        ny, nx = self.shape()
+        if row < 0 or col < 0 or row + num_y > ny or col + num_x > nx:
+            print("ERROR: the region is not inside the grid of %s." % self.directory)
+            exit(1)
+        return (row, row + num_y), (col, col + num_x)
+
+##
+#  Layout of the ucvm_point_t, ucvm_prop_t and ucvm_data_t structures of
+#  libucvm (ucvm_dtypes.h) as NumPy record types, so that whole arrays can be
+#  handed to ucvm_query without copying point by point.
+UCVM_POINT_DTYPE = np.dtype([("coord", np.float64, (3,))], align=True)
+UCVM_PROP_DTYPE = np.dtype([("source", np.int32), ("vp", np.float64), \
+                            ("vs", np.float64), ("rho", np.float64)], align=True)
+UCVM_DATA_DTYPE = np.dtype([("surf", np.float64), ("vs30", np.float64), ("depth", np.float64), \
+                            ("domain", np.int32), ("shift_cr", np.float64), ("shift_gtl", np.float64), \
+                            ("crust", UCVM_PROP_DTYPE), ("gtl", UCVM_PROP_DTYPE), \
+                            ("cmb", UCVM_PROP_DTYPE)], align=True)
+
+## ucvm_param_t and ucvm_ctype_t values from ucvm_dtypes.h.
+UCVM_PARAM_QUERY_MODE = 0
+UCVM_PARAM_IFUNC_ZRANGE = 1
+UCVM_COORD_GEO_DEPTH = 0
+UCVM_COORD_GEO_ELEV = 1
+
+## Where the ucvm_query output columns are found in ucvm_data_t.
+UCVM_DATA_COLUMNS = {3: ("surf",), 4: ("vs30",), \
+                     14: ("cmb", "vp"), 15: ("cmb", "vs"), 16: ("cmb", "rho")}
+
+## Number of points written, and result lines parsed, at a time by a streaming query.
+UCVM_STREAM_BLOCK = 65536
+
+## True once the warning about the binary query adapter has been printed.
+pycvm_adapter_warned = False
+
+## True once the warning about padding persistent batches has been printed.
+pycvm_padding_warned = False
+
+## Default number of points in a block of a checkpointed query.
+UCVM_CHECKPOINT_BLOCK = 250000
+
+## Number of points the stock ucvm_query reads before it answers, the
+## default padding of the batches of a persistent query program.
+UCVM_QUERY_BLOCK = 250000
+
+## Default seconds a persistent query program may go without answering.
+UCVM_QUERY_TIMEOUT = 600
+
+## Number of float64 values in a record of the binary query protocol, see
+## utilities/ucvm_query_binary.py.
+UCVM_BINARY_RECORD = 14
+
+## Where the ucvm_query output columns are found in a binary record.
+UCVM_BINARY_COLUMNS = {0: 0, 1: 1, 2: 2, 3: 3, 4: 4, 6: 5, 7: 6, 8: 7, \
+                       10: 8, 11: 9, 12: 10, 14: 11, 15: 12, 16: 13}
+
+##
+#  @class UCVMLibrary
+#  @brief Queries UCVM in-process through the libucvm shared library.
+#
+#  The points are passed to ucvm_query as one contiguous array and the
+#  results are written straight into a preallocated array, so nothing is
+#  formatted or parsed as text. libucvm keeps global state, so there is one
+#  instance per library file and it is set up again whenever the
+#  configuration file, the models or the Z-range change.
+class UCVMLibrary:
+
+    ##
+    #  Loads the shared library.
+    #
+    #  @param path The location of libucvm.so.
+    def __init__(self, path):
+        import ctypes
+        ## The loaded shared library.
+        self.lib = ctypes.CDLL(path)
+        self.lib.ucvm_init.argtypes = [ctypes.c_char_p]
+        self.lib.ucvm_init.restype = ctypes.c_int
+        self.lib.ucvm_add_model_list.argtypes = [ctypes.c_char_p]
+        self.lib.ucvm_add_model_list.restype = ctypes.c_int
+        self.lib.ucvm_setparam.restype = ctypes.c_int
+        self.lib.ucvm_query.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p]
+        self.lib.ucvm_query.restype = ctypes.c_int
+        self.lib.ucvm_finalize.restype = ctypes.c_int
+        self.ctypes = ctypes
+        ## Only one thread may use the library at a time.
+        self.lock = threading.Lock()
+        ## The configuration, models and Z-range the library is set up for.
+        self.state = None
+        self.mode = None
+
+    ##
+    #  Sets up the library for a query, if it is not already.
+    #
+    #  @param config The UCVM configuration file.
+    #  @param models The CVM, or comma separated list of models, to query.
+    #  @param mode UCVM_COORD_GEO_DEPTH or UCVM_COORD_GEO_ELEV.
+    #  @param z_range The Z-range for elygtl:ely, as "z1,z2", or None.
+    def setup(self, config, models, mode, z_range):
+        state = (config, models, z_range)
+        if state != self.state:
+            if self.state != None:
+                self.lib.ucvm_finalize()
+                self.state = None
+            if self.lib.ucvm_init(config.encode("utf-8")) != 0:
+                raise RuntimeError("ucvm_init failed for " + config)
+            if self.lib.ucvm_add_model_list(models.encode("utf-8")) != 0:
+                raise RuntimeError("ucvm_add_model_list failed for " + models)
+            if z_range != None:
+                z1, z2 = [float(z) for z in z_range.split(",")]
+                if self.lib.ucvm_setparam(UCVM_PARAM_IFUNC_ZRANGE, self.ctypes.c_double(z1), \
+                                          self.ctypes.c_double(z2)) != 0:
+                    raise RuntimeError("ucvm_setparam failed for z range " + z_range)
+            self.state = state
+            self.mode = None
+
+        if mode != self.mode:
+            if self.lib.ucvm_setparam(UCVM_PARAM_QUERY_MODE, self.ctypes.c_int(mode)) != 0:
+                raise RuntimeError("ucvm_setparam failed for the query mode")
+            self.mode = mode
+
+    ##
+    #  Queries the points.
+    #
+    #  @param longitude Longitudes as a NumPy array.
+    #  @param latitude Latitudes as a NumPy array.
+    #  @param z Depths or elevations as a NumPy array.
+    #  @return A NumPy array of UCVM_DATA_DTYPE records, one per point.
+    def query(self, longitude, latitude, z):
+        points = np.empty(len(longitude), dtype=UCVM_POINT_DTYPE)
+        points["coord"][:, 0] = longitude
+        points["coord"][:, 1] = latitude
+        points["coord"][:, 2] = z
+        data = np.zeros(len(longitude), dtype=UCVM_DATA_DTYPE)
+        if len(points) > 0 and self.lib.ucvm_query(len(points), points.ctypes.data, data.ctypes.data) != 0:
+            raise RuntimeError("ucvm_query failed")
+        return data
+
+## The loaded UCVM libraries, or None for the ones that failed to load, keyed by path.
+ucvm_libraries = {}
+ucvm_libraries_lock = threading.Lock()
+
+##
+#  Returns the @link UCVMLibrary UCVMLibrary @endlink for a library file,
+#  loading it the first time, or None if it does not exist or cannot be loaded.
+#
+#  @param path The location of libucvm.so.
+def pycvm_load_library(path):
+    with ucvm_libraries_lock:
+        if path not in ucvm_libraries:
+            library = None
+            if os.path.isfile(path):
+                try:
+                    library = UCVMLibrary(path)
+                except (OSError, AttributeError) as err:
+                    print("WARNING: could not load " + path + ", " + str(err))
+            ucvm_libraries[path] = library
+        return ucvm_libraries[path]
+
 ##
 #  @class UCVM
 #  @brief Python functions to interact with the underlying C code.
@@ -492,18 +1914,24 @@ class UCVM:
     #  
     #  @param install_dir The base installation directory of UCVM.
     #  @param config_file The location of the UCVM configuration file.
-    def __init__(self, install_dir = None, config_file = None, z_range = None, floors = None):
+    #  @param z_range The Z-range for elygtl:ely, as "z1,z2". Optional.
+    #  @param floors The vs/vp/density floors, as "vs,vp,density". Optional.
+    #  @param meta The metadata of the calling plot, holding the query settings. Optional.
+    def __init__(self, install_dir = None, config_file = None, z_range = None, floors = None, meta = None):
         if install_dir != None:
             ## Location of the UCVM binary directory.
             self.binary_dir = install_dir + "/bin"
             self.utility_dir = install_dir + "/utilities"
+            self.library_dir = install_dir + "/lib"
         elif 'UCVM_INSTALL_PATH' in os.environ:
             mypath=os.environ.get('UCVM_INSTALL_PATH')
             self.binary_dir = mypath+"/bin"
             self.utility_dir = mypath+"/utilities"
+            self.library_dir = mypath+"/lib"
         else:
             self.binary_dir = "../bin"
             self.utility_dir = "../utilities"
+            self.library_dir = "../lib"
         
         if config_file != None:
             ## Location of the UCVM configuration file.
@@ -517,17 +1945,146 @@ class UCVM:
             else:
                self.config = "../conf/ucvm.conf"
 
-        if z_range != None:
-            self.z_range = z_range
+        if z_range != None:
+            self.z_range = z_range
+        else:
+            self.z_range= None
+
+        if floors != None:
+            self.floors = floors
+        else:
+            self.floors= None
+
+        if meta == None:
+            meta = {}
+
+        ## Keep the query programs running between calls, see @link UCVMWorkerPool UCVMWorkerPool @endlink.
+        if 'persistent' in meta:
+            self.persistent = pycvm_flag(meta['persistent'])
+        else:
+            self.persistent = pycvm_flag(os.environ.get('UCVM_PERSISTENT_QUERY'))
+
+        ## Number of points the persistent query programs buffer before answering,
+        ## 0 for a program that answers line by line. Every batch is padded to a
+        ## multiple of it, which costs more than reloading the model for small queries.
+        if 'persistent_batch' in meta:
+            self.persistent_batch = int(meta['persistent_batch'])
+        else:
+            self.persistent_batch = int(os.environ.get('UCVM_PERSISTENT_BATCH', UCVM_QUERY_BLOCK))
+
+        ## Seconds a persistent query program may go without answering before it is killed.
+        if 'query_timeout' in meta:
+            self.query_timeout = float(meta['query_timeout'])
+        else:
+            self.query_timeout = float(os.environ.get('UCVM_QUERY_TIMEOUT', UCVM_QUERY_TIMEOUT))
+
+        ## Number of query programs to run at the same time on one point list.
+        if 'workers' in meta:
+            self.workers = int(meta['workers'])
+        else:
+            self.workers = 1
+
+        ## Number of points sent to each query program. Defaults to an even split between the workers.
+        if 'chunk_size' in meta:
+            self.chunk_size = int(meta['chunk_size'])
+        else:
+            self.chunk_size = None
+
+        ## The on-disk @link QueryCache QueryCache @endlink for query results, or None if it is off.
+        self.cache = None
+        if meta.get('no_cache') in (None, '', '0', 0, False) and \
+           os.environ.get('UCVM_NO_CACHE', '0') in ('', '0'):
+            cache_dir = pycvm_cache_dir(meta)
+            ## The cache size limit is given in megabytes.
+            if 'cache_size' in meta:
+                cache_size = float(meta['cache_size'])
+            else:
+                cache_size = float(os.environ.get('UCVM_CACHE_SIZE', '1024'))
+            try:
+                self.cache = QueryCache(cache_dir, int(cache_size * 1024 * 1024))
+            except OSError as err:
+                print("WARNING: query cache disabled, " + str(err))
+        self.config_signature = None
+
+        ## How ucvm_query is run: "subprocess", the default, "library" for libucvm
+        ## in-process, or "auto" to use the library when it can be loaded.
+        if meta.get('backend') != None:
+            self.backend = meta['backend']
+        else:
+            self.backend = os.environ.get('UCVM_BACKEND', 'subprocess')
+        if self.backend not in ("auto", "library", "subprocess"):
+            print("ERROR: backend must be auto, library or subprocess.")
+            exit(1)
+
+        ## How points and results are passed to ucvm_query: "text", the default, or
+        ## the experimental "binary" for packed float64 values. Without a native
+        ## binary query program, see binary_query, it goes through the
+        ## utilities/ucvm_query_binary.py adapter, which is slower than text.
+        if meta.get('transport') != None:
+            self.transport = meta['transport']
+        else:
+            self.transport = os.environ.get('UCVM_TRANSPORT', 'text')
+        if self.transport not in ("text", "binary"):
+            print("ERROR: transport must be text or binary.")
+            exit(1)
+
+        ## If true, text query results are read as they come and parsed block by block
+        ## straight into a float32 array instead of being buffered whole.
+        if meta.get('stream') != None:
+            self.stream = pycvm_flag(meta['stream'])
+        else:
+            self.stream = pycvm_flag(os.environ.get('UCVM_STREAM'))
+
+        ## Directory where long queries keep their finished blocks, so that a rerun
+        ## resumes them, see QueryCheckpoint. None to query all or nothing.
+        if meta.get('checkpoint') != None:
+            self.checkpoint = meta['checkpoint']
+        else:
+            self.checkpoint = os.environ.get('UCVM_CHECKPOINT')
+
+        ## About how many points are in a checkpointed block, rounded down to whole grid rows.
+        if meta.get('checkpoint_block') != None:
+            self.checkpoint_block = int(float(meta['checkpoint_block']))
+        else:
+            self.checkpoint_block = int(float(os.environ.get('UCVM_CHECKPOINT_BLOCK', UCVM_CHECKPOINT_BLOCK)))
+
+        ## The last non-zero exit status of a query program, 0 while they all succeed.
+        ## checkpoint_values uses it to tell a finished block from a cut short one.
+        self.query_status = 0
+
+        ## query_profiles snaps column positions to a grid of this many degrees;
+        ## columns that snap to the same node are taken to be the same one.
+        if meta.get('column_tolerance') != None:
+            self.column_tolerance = float(meta['column_tolerance'])
         else:
-            self.z_range= None
+            self.column_tolerance = float(os.environ.get('UCVM_COLUMN_TOLERANCE', '1e-5'))
 
-        if floors != None:
-            self.floors = floors
+        ## If set, plots also save their values in a TileStore with tiles of this
+        ## many rows and columns, so that a replot can read just part of them.
+        if meta.get('tile_size') != None:
+            self.tile_size = int(meta['tile_size'])
         else:
-            self.floors= None
-        
-        
+            self.tile_size = os.environ.get('UCVM_TILE_SIZE')
+            if self.tile_size != None:
+                self.tile_size = int(self.tile_size)
+        if self.tile_size != None and self.tile_size < 1:
+            print("ERROR: tile size must be at least 1.")
+            exit(1)
+
+        ## A query program that reads and writes the binary protocol itself. It takes
+        ## the same arguments as run_ucvm_query.sh. If not given, the adapter is used.
+        if meta.get('binary_query') != None:
+            self.binary_query = meta['binary_query']
+        else:
+            self.binary_query = os.environ.get('UCVM_BINARY_QUERY')
+
+        ## Location of the libucvm shared library for the in-process backend.
+        if meta.get('library') != None:
+            self.library_path = meta['library']
+        else:
+            self.library_path = os.environ.get('UCVM_LIBRARY', self.library_dir + "/libucvm.so")
+
+
         if install_dir != None:
             ## List of all the installed CVMs.
             self.models = [x for x in os.listdir(install_dir + "/model")]
@@ -555,77 +2112,585 @@ class UCVM:
             try :
                 f=float(p)
             except :
-                print("ERROR: "+str(line))
-                exit(1)
+                raise UCVMQueryError(str(line))
            
         return output
 
+    ##
+    #  Builds the command line for run_ucvm_query.sh.
+    #
+    #  @param cvm The CVM to query.
+    #  @param mode The coordinate mode, "gd" for depth or "ge" for elevation. Optional.
+    #  @return The command line as a list.
+    def query_command(self, cvm, mode = None):
+        command = [self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm]
+        if mode == None:
+            return command
+
+        command = command + ["-c", mode]
+        if self.z_range != None:
+            command = command + ["-z", self.z_range]
+        ## floors are only passed on for depth queries when a z range is given
+        if self.floors != None and (mode == "ge" or self.z_range != None):
+            command = command + ["-L", self.floors]
+        return command
+
+    ##
+    #  Runs one of the UCVM query programs over a set of points and returns its
+    #  output lines. The program is run once per call, or through the shared
+    #  @link UCVMWorkerPool worker pool @endlink when persistent queries are on.
+    #
+    #  When more than one worker is asked for, or a chunk size is given, the
+    #  points are split into contiguous chunks that are queried at the same
+    #  time by separate query programs and the output is put back in order.
+    #
+    #  @param command The command line, as a list, of the query program.
+    #  @param text_points The points, one per line.
+    #  @param npoints The number of points in text_points.
+    #  @param idx The number of leading lines the program prints before its results.
+    #  @return The output lines of the query program.
+    def run_query(self, command, text_points, npoints, idx):
+        lines = None
+        if self.chunk_count(npoints) > 1:
+            lines = text_points.splitlines(True)
+
+        def run(start, stop, slot):
+            if lines == None:
+                return self.run_chunk(command, text_points, npoints, idx)
+            return self.run_chunk(command, "".join(lines[start:stop]), stop - start, idx, slot)
+
+        output = []
+        for chunk_output in self.map_chunks(npoints, run):
+            output.extend(chunk_output)
+        return output
+
+    ##
+    #  Returns how many chunks a query of npoints is split into, from the
+    #  number of workers and the chunk size.
+    #
+    #  @param npoints The number of points.
+    #  @return The number of chunks.
+    def chunk_count(self, npoints):
+        return len(self.chunk_bounds(npoints))
+
+    ##
+    #  Returns the (start, stop) point index of each chunk of a query.
+    def chunk_bounds(self, npoints):
+        chunk_size = self.chunk_size
+        if chunk_size == None:
+            chunk_size = int(math.ceil(float(npoints) / max(self.workers, 1)))
+
+        if chunk_size <= 0 or npoints <= chunk_size:
+            return [(0, npoints)]
+        return [(start, min(start + chunk_size, npoints)) for start in range(0, npoints, chunk_size)]
+
+    ##
+    #  Calls function(start, stop, slot) for each chunk of a query, running the
+    #  chunks at the same time on up to self.workers threads, and returns the
+    #  results in chunk order. slot tells apart the chunks running together.
+    #  A @link UCVMQueryError UCVMQueryError @endlink raised by any chunk stops
+    #  the others and is reported here, on the calling thread.
+    #
+    #  @param npoints The number of points.
+    #  @param function The function to run on each chunk.
+    #  @return The list of results.
+    def map_chunks(self, npoints, function):
+        bounds = self.chunk_bounds(npoints)
+        if len(bounds) == 1:
+            try:
+                return [function(0, npoints, 0)]
+            except UCVMQueryError as err:
+                print("ERROR: " + str(err))
+                exit(1)
+
+        workers = max(self.workers, 1)
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(lambda i: function(bounds[i][0], bounds[i][1], i % workers), range(len(bounds)))
+        except UCVMQueryError as err:
+            pool.terminate()
+            pool.join()
+            print("ERROR: " + str(err))
+            exit(1)
+        pool.close()
+        pool.join()
+        return results
+
+    ##
+    #  Runs one query program over one contiguous chunk of points.
+    #
+    #  @param command The command line, as a list, of the query program.
+    #  @param text_points The points, one per line.
+    #  @param npoints The number of points in text_points.
+    #  @param idx The number of leading lines the program prints before its results.
+    #  @param slot Which persistent worker to use for this chunk. Optional.
+    #  @return The output lines of the query program.
+    def run_chunk(self, command, text_points, npoints, idx, slot = 0):
+        if self.persistent:
+            return ucvm_worker_pool.get(command, self.persistent_batch, slot, self.query_timeout).run(text_points, npoints)
+
+        proc = Popen(command, stdout=PIPE, stdin=PIPE, stderr=STDOUT, universal_newlines=True)
+        output = proc.communicate(input=text_points)[0]
+        if proc.returncode != 0:
+            self.query_status = proc.returncode
+        return self.checkUCVMoutput(idx, output)
+
+    ##
+    #  Returns what identifies the configuration file in a cache key, its
+    #  path, modification time and contents.
+    def get_config_signature(self):
+        if self.config_signature == None:
+            try:
+                with open(self.config, "rb") as fh:
+                    contents = fh.read()
+                self.config_signature = (self.config, os.path.getmtime(self.config), \
+                                         hashlib.sha1(contents).hexdigest())
+            except (IOError, OSError):
+                self.config_signature = (self.config,)
+        return self.config_signature
+
+    ##
+    #  Runs one of the UCVM query programs over a set of points and returns
+    #  the wanted columns of its output, see @link pycvm_parse_output
+    #  pycvm_parse_output @endlink. Results are looked up in and saved to the
+    #  query cache when it is on.
+    #
+    #  @param command The command line, as a list, of the query program.
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink.
+    #  @param ncolumns 2 to send longitude and latitude only, 3 to add the depth or elevation.
+    #  @param elevation True to send the elevation instead of the depth.
+    #  @param idx The number of leading lines the program prints before its results.
+    #  @param columns The indexes of the output columns to keep, as a tuple.
+    #  @param strict If true, a malformed result line is an error.
+    #  @param cvm The CVM, given when libucvm can answer this query in-process. Optional.
+    #  @return A NumPy array of shape (points, len(columns)).
+    def query_values(self, command, point_list, ncolumns, elevation, idx, columns, strict, cvm = None):
+        point_list = PointArray.fromPoints(point_list)
+
+        key = None
+        if self.cache != None:
+            if ncolumns == 2:
+                z = None
+            elif elevation:
+                z = point_list.elevation
+            else:
+                z = point_list.depth
+            with pycvm_span("cache lookup"):
+                key = self.cache.key(command, self.get_config_signature(), columns, \
+                                     point_list.longitude, point_list.latitude, z)
+                values = self.cache.get(key)
+            if values is not None and len(values) == len(point_list):
+                return values
+
+        if self.checkpoint and len(point_list) > self.checkpoint_block:
+            values = self.checkpoint_values(command, point_list, ncolumns, elevation, idx, columns, strict, cvm)
+        else:
+            values = self.fetch_values(command, point_list, ncolumns, elevation, idx, columns, strict, cvm)
+
+        ## only complete answers are kept
+        if key != None and len(values) == len(point_list):
+            with pycvm_span("cache store"):
+                self.cache.put(key, values)
+        return values
+
+    ##
+    #  Queries a set of points through the library, binary, streaming or text
+    #  path, whichever applies first.
+    #
+    #  Takes the same parameters as @link UCVM::query_values query_values @endlink.
+    def fetch_values(self, command, point_list, ncolumns, elevation, idx, columns, strict, cvm = None):
+        values = None
+        if cvm != None:
+            values = self.library_values(point_list, cvm, elevation, columns)
+        if values is None and cvm != None and self.transport == "binary":
+            values = self.binary_values(command, point_list, elevation, columns)
+        if values is None and self.stream and not self.persistent:
+            with pycvm_span("query (stream)"):
+                values = self.stream_values(command, point_list, ncolumns, elevation, idx, columns, strict)
+        if values is None:
+            with pycvm_span("format points"):
+                text_points = point_list.toText(ncolumns, elevation)
+            with pycvm_span("query (text)"):
+                output = self.run_query(command, text_points, len(point_list), idx)
+            with pycvm_span("parse"):
+                try:
+                    values = pycvm_parse_output(output, columns, strict)
+                except UCVMQueryError as err:
+                    print("ERROR: " + str(err))
+                    exit(1)
+        return values
+
+    ##
+    #  Queries a large set of points block by block, see @link QueryCheckpoint
+    #  QueryCheckpoint @endlink. Blocks finished by an earlier run that was
+    #  stopped are read back instead of being queried again. A block that comes
+    #  back short, or from a query program that failed, stops the query with
+    #  the finished blocks kept for the rerun.
+    #
+    #  Takes the same parameters as @link UCVM::query_values query_values @endlink.
+    def checkpoint_values(self, command, point_list, ncolumns, elevation, idx, columns, strict, cvm = None):
+        if ncolumns == 2:
+            z = None
+        elif elevation:
+            z = point_list.elevation
+        else:
+            z = point_list.depth
+        key = pycvm_query_key(command, self.get_config_signature(), columns, \
+                              point_list.longitude, point_list.latitude, z)
+
+        block = self.checkpoint_block
+        if point_list.shape != None:
+            row = point_list.shape[-1]
+            block = max(1, block // row) * row
+        checkpoint = QueryCheckpoint(self.checkpoint, key, len(point_list), block)
+        done = checkpoint.done()
+        if len(done) > 0:
+            print("Resuming the query, %d of %d blocks are done." % (len(done), checkpoint.nblocks))
+
+        for index in range(checkpoint.nblocks):
+            if index in done:
+                continue
+            start, stop = checkpoint.bounds(index)
+            self.query_status = 0
+            values = self.fetch_values(command, point_list[start:stop], ncolumns, elevation, \
+                                       idx, columns, strict, cvm)
+            ## a block cut short is not journaled, the rerun queries it again
+            if len(values) != stop - start or self.query_status != 0:
+                print("ERROR: the query stopped with %d of the %d points of block %d of %d answered." % \
+                      (len(values), stop - start, index + 1, checkpoint.nblocks))
+                print("Run the same command again to resume it from " + checkpoint.directory)
+                exit(1)
+            with pycvm_span("checkpoint"):
+                checkpoint.save(index, values)
+
+        with pycvm_span("checkpoint"):
+            values = np.concatenate([checkpoint.load(index) for index in range(checkpoint.nblocks)])
+        checkpoint.remove()
+        return values
+
+    ##
+    #  Runs one of the UCVM query programs over a set of points, reading its
+    #  output as it comes. Result lines are parsed in blocks of
+    #  UCVM_STREAM_BLOCK straight into a float32 array made up front for all
+    #  the points, so the whole output is never held in memory at once.
+    #
+    #  Takes the same parameters as @link UCVM::query_values query_values @endlink.
+    #  @return A float32 NumPy array of shape (points, len(columns)).
+    def stream_values(self, command, point_list, ncolumns, elevation, idx, columns, strict):
+        values = np.empty((len(point_list), len(columns)), dtype=np.float32)
+        counts = self.map_chunks(len(point_list), \
+                                 lambda start, stop, slot: self.run_stream_chunk(command, point_list[start:stop], \
+                                                 ncolumns, elevation, idx, columns, strict, values[start:stop]))
+
+        if sum(counts) == len(point_list):
+            return values
+
+        ## some lines were skipped, close up the gaps
+        bounds = self.chunk_bounds(len(point_list))
+        return np.concatenate([values[bounds[i][0]:bounds[i][0] + counts[i]] for i in range(len(counts))])
+
+    ##
+    #  Runs one query program over one contiguous chunk of points and parses
+    #  its results into out as they are read.
+    #
+    #  @param out The float32 array, of shape (points, len(columns)), to fill in.
+    #  @return The number of result rows written to out.
+    def run_stream_chunk(self, command, points, ncolumns, elevation, idx, columns, strict, out):
+        proc = Popen(command, stdout=PIPE, stdin=PIPE, stderr=STDOUT, universal_newlines=True)
+
+        def write_points():
+            try:
+                for start in range(0, len(points), UCVM_STREAM_BLOCK):
+                    proc.stdin.write(points[start:start + UCVM_STREAM_BLOCK].toText(ncolumns, elevation))
+                proc.stdin.close()
+            except (IOError, OSError, ValueError):
+                pass
+
+        writer = threading.Thread(target=write_points)
+        writer.daemon = True
+        writer.start()
+
+        count = 0
+        block = []
+        for line in proc.stdout:
+            if idx > 0:
+                idx = idx - 1
+                continue
+            if not pycvm_is_data_line(line):
+                if count == 0 and len(block) == 0 and line.strip() != "" and not \
+                   (("WARNING" in line) or ("slow performance" in line) or ("Using Geo" in line)):
+                    proc.kill()
+                    proc.wait()
+                    raise UCVMQueryError(line.rstrip())
+                continue
+            block.append(line)
+            if len(block) == UCVM_STREAM_BLOCK:
+                count = count + self.store_block(block, columns, strict, out, count)
+                block = []
+        if len(block) > 0:
+            count = count + self.store_block(block, columns, strict, out, count)
+
+        proc.stdout.close()
+        if proc.wait() != 0:
+            self.query_status = proc.returncode
+        writer.join()
+        return count
+
+    ##
+    #  Parses a block of result lines into out, starting at row pos.
+    #
+    #  @return The number of rows written.
+    def store_block(self, block, columns, strict, out, pos):
+        rows = pycvm_parse_output(block, columns, strict)
+        if pos + len(rows) > len(out):
+            raise UCVMQueryError("ucvm_query returned more results than points sent.")
+        out[pos:pos + len(rows)] = rows
+        return len(rows)
+
+    ##
+    #  Returns the command line that runs a ucvm_query command with the
+    #  binary protocol: the native binary query program if there is one,
+    #  otherwise the ucvm_query_binary.py adapter in front of the text one.
+    #  The adapter only re-parses the text output in another process, so a
+    #  warning is printed, once, when it is used.
+    #
+    #  @param command The run_ucvm_query.sh command line, as a list.
+    #  @return The command line as a list.
+    def binary_command(self, command):
+        if self.binary_query != None:
+            return [self.binary_query] + command[1:]
+
+        global pycvm_adapter_warned
+        if not pycvm_adapter_warned:
+            print("WARNING: the binary transport is experimental; without a native binary query program")
+            print("         (UCVM_BINARY_QUERY) it goes through ucvm_query_binary.py and is slower than text.")
+            pycvm_adapter_warned = True
+
+        adapter = pycvm_which("ucvm_query_binary.py")
+        if adapter == None:
+            adapter = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+                                   "..", "utilities", "ucvm_query_binary.py")
+        return [sys.executable, adapter] + command
+
+    ##
+    #  Queries the points through ucvm_query with the binary protocol. The
+    #  points are split into chunks between the workers, see
+    #  @link UCVM::map_chunks map_chunks @endlink.
+    #
+    #  @param command The run_ucvm_query.sh command line, as a list.
+    #  @param point_list A @link PointArray PointArray @endlink.
+    #  @param elevation True if the points are given by elevation instead of depth.
+    #  @param columns The ucvm_query output columns wanted, keys of UCVM_BINARY_COLUMNS.
+    #  @return A NumPy array of shape (points, len(columns)), or None if a column
+    #          is not part of the binary record.
+    def binary_values(self, command, point_list, elevation, columns):
+        for column in columns:
+            if column not in UCVM_BINARY_COLUMNS:
+                return None
+
+        if elevation:
+            z = point_list.elevation
+        else:
+            z = point_list.depth
+        points = np.empty((len(point_list), 3), dtype="<f8")
+        points[:, 0] = point_list.longitude
+        points[:, 1] = point_list.latitude
+        points[:, 2] = z
+
+        command = self.binary_command(command)
+        with pycvm_span("query (binary)"):
+            records = np.concatenate(self.map_chunks(len(points), \
+                                     lambda start, stop, slot: self.run_binary_chunk(command, points[start:stop])))
+
+        return records[:, [UCVM_BINARY_COLUMNS[column] for column in columns]]
+
+    ##
+    #  Runs one binary query program over one contiguous chunk of points.
+    #
+    #  @param command The binary query command line, as a list.
+    #  @param points The points as an (n, 3) float64 array.
+    #  @return The results as an (n, UCVM_BINARY_RECORD) float64 array.
+    def run_binary_chunk(self, command, points):
+        proc = Popen(command, stdout=PIPE, stdin=PIPE)
+        output = proc.communicate(input=points.tobytes())[0]
+        records = np.frombuffer(output, dtype="<f8")
+        if proc.returncode != 0 or records.size != len(points) * UCVM_BINARY_RECORD:
+            raise UCVMQueryError("binary query returned %d bytes for %d points." % (len(output), len(points)))
+        return records.reshape(len(points), UCVM_BINARY_RECORD)
+
+    ##
+    #  Queries the points in-process through libucvm, see @link UCVMLibrary
+    #  UCVMLibrary @endlink. Returns None when the subprocess backend has to be
+    #  used instead: it was asked for, the library is missing, or floors are set,
+    #  which only the ucvm_query program applies.
+    #
+    #  @param point_list A @link PointArray PointArray @endlink.
+    #  @param cvm The CVM to query.
+    #  @param elevation True if the points are given by elevation instead of depth.
+    #  @param columns The ucvm_query output columns wanted, keys of UCVM_DATA_COLUMNS.
+    #  @return A NumPy array of shape (points, len(columns)), or None.
+    def library_values(self, point_list, cvm, elevation, columns):
+        if self.backend == "subprocess" or self.floors != None:
+            return None
+
+        library = pycvm_load_library(self.library_path)
+        if library == None:
+            if self.backend == "library":
+                print("ERROR: UCVM library " + self.library_path + " could not be loaded.")
+                exit(1)
+            return None
+
+        if elevation:
+            mode = UCVM_COORD_GEO_ELEV
+            z = point_list.elevation
+        else:
+            mode = UCVM_COORD_GEO_DEPTH
+            z = point_list.depth
+
+        with pycvm_span("query (library)"), library.lock:
+            try:
+                library.setup(self.config, cvm, mode, self.z_range)
+                data = library.query(point_list.longitude, point_list.latitude, z)
+            except RuntimeError as err:
+                print("ERROR: " + str(err))
+                exit(1)
+
+        values = np.empty((len(data), len(columns)))
+        for i, column in enumerate(columns):
+            field = data
+            for name in UCVM_DATA_COLUMNS[column]:
+                field = field[name]
+            values[:, i] = field
+        return values
+
     ##
     #  Queries UCVM given a set of points and a CVM to query. If the CVM does not exist,
-    #  this function will throw an error. The set of points must be an array of the 
-    #  @link Point Point @endlink class. This function returns an array of @link MaterialProperties
-    #  MaterialProperties @endlink.
+    #  this function will throw an error. The set of points must be an array of the
+    #  @link Point Point @endlink class. The output is parsed in one pass into a
+    #  one dimensional @link MaterialGrid MaterialGrid @endlink, one cell per point.
     #
-    #  @param point_list An array of @link Point Points @endlink for which UCVM should query.
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink for which UCVM should query.
     #  @param cvm The CVM from which this data should be retrieved.
-    #  @return An array of @link MaterialProperties @endlink.
-    def query(self, point_list, cvm, elevation = None):
-        shared_object = "../model/" + cvm + "/lib/lib" + cvm + ".so"
-        properties = []
-        
-        # Can we load this library dynamically and bypass the C code entirely?
-        if os.path.isfile(shared_object):
-            import ctypes
-            #obj = ctypes.cdll.LoadLibrary(shared_object)
-            #print(obj)
-        
-#        print("CVM", cvm)
+    #  @param elevation True if the points are given by elevation instead of depth. Optional.
+    #  @return A @link MaterialGrid MaterialGrid @endlink holding vp, vs and density.
+    def query_columns(self, point_list, cvm, elevation = None):
         if( elevation ) :
-            if self.z_range != None :
-                if self.floors != None:
-                  proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm, "-c", "ge", "-z", self.z_range, "-L", self.floors], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-                else:
-                  proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm, "-c", "ge", "-z", self.z_range], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-            else :
-                if self.floors != None:  ## z range is using default
-                  proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm, "-c", "ge", "-L", self.floors], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-                else:
-                  proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm, "-c", "ge"], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
+            command = self.query_command(cvm, "ge")
         else :
-            if self.z_range != None :
-                if self.floors != None :
-                  proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm, "-c", "gd", "-z", self.z_range, "-L", self.floors], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-                else:
-                  proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm, "-c", "gd", "-z", self.z_range], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-            else:
-                proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm, "-c", "gd" ], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
+            command = self.query_command(cvm, "gd")
         
-        text_points = ""
-        
-        if isinstance(point_list, Point):
-            point_list = [point_list]
-         
-        for point in point_list:
-            if( elevation ) :
-              text_points += "%.5f %.5f %.5f\n" % (point.longitude, point.latitude, point.elevation)
-            else:
-              text_points += "%.5f %.5f %.5f\n" % (point.longitude, point.latitude, point.depth)
+        # vp, vs and density are the last three items of a ucvm_query line.
+        values = self.query_values(command, point_list, 3, elevation, 1, (14, 15, 16), False, cvm)
+        with pycvm_span("construct"):
+            grid = MaterialGrid((len(values),))
+            grid.setColumn("vp", values[:, 0])
+            grid.setColumn("vs", values[:, 1])
+            grid.setColumn("density", values[:, 2])
+        return grid
 
-#       fp = open("input_points", 'w') 
-#       fp.write(text_points);
-#       fp.close()
+    ##
+    #  Returns the @link ColumnStore ColumnStore @endlink for columns queried
+    #  with a command at a vertical spacing, or None when the query cache is off.
+    #
+    #  @param command The command line of the query program.
+    #  @param start The depth or elevation of a level of the columns.
+    #  @param spacing The vertical spacing of the columns.
+    def column_store(self, command, start, spacing):
+        if self.cache == None:
+            return None
+        key = pycvm_query_key(command, self.get_config_signature(), float(spacing), \
+                              round(start % spacing, 6), self.column_tolerance)
+        with pycvm_column_stores_lock:
+            if key not in pycvm_column_stores:
+                pycvm_column_stores[key] = ColumnStore(self.cache.directory, "columns_" + key, self.cache.max_bytes)
+            return pycvm_column_stores[key]
 
-        output = proc.communicate(input=text_points)[0]
-        output = self.checkUCVMoutput(1,output)
+    ##
+    #  Queries vertical columns of vp, vs and density. Columns that earlier
+    #  queries already fetched for the same model, configuration and vertical
+    #  spacing are taken from the @link ColumnStore column store @endlink
+    #  instead of ucvm_query. Positions are snapped to a grid of
+    #  column_tolerance degrees and a stored column is reused for any position
+    #  that snaps to the same node. This is not a distance test: two positions
+    #  closer than the tolerance but on either side of a cell edge do not match.
+    #
+    #  @param longitude The longitudes of the columns.
+    #  @param latitude The latitudes of the columns.
+    #  @param start The depth, or elevation, of the first level.
+    #  @param spacing The distance from one level to the next, negative going up.
+    #  @param count The number of levels.
+    #  @param cvm The CVM from which these material properties should be retrieved.
+    #  @param elevation True if the levels are elevations instead of depths. Optional.
+    #  @return A one dimensional @link MaterialGrid MaterialGrid @endlink, level by
+    #          level, each level holding every column.
+    def query_profiles(self, longitude, latitude, start, spacing, count, cvm, elevation = None):
+        longitude = np.asarray(longitude, dtype=np.float64).reshape(-1)
+        latitude = np.asarray(latitude, dtype=np.float64).reshape(-1)
+        if spacing == 0:
+            spacing = 1.0
+        if elevation:
+            command = self.query_command(cvm, "ge")
+        else:
+            command = self.query_command(cvm, "gd")
+
+        values = np.empty((len(longitude), count, 3), dtype=np.float32)
+        missing = np.ones(len(longitude), dtype=bool)
+        store = self.column_store(command, start, spacing)
+        if store != None:
+            positions = np.column_stack((np.round(longitude / self.column_tolerance), \
+                                         np.round(latitude / self.column_tolerance))).astype(np.int64)
+            level = int(round((start - start % spacing) / spacing))
+            with pycvm_span("column lookup"):
+                missing = store.lookup(positions, level, values)
+
+        nmissing = int(np.count_nonzero(missing))
+        if nmissing > 0:
+            levels = start + spacing * np.arange(count)
+            lons = np.tile(longitude[missing], count)
+            lats = np.tile(latitude[missing], count)
+            if elevation:
+                points = PointArray(lons, lats, 0, np.repeat(levels, nmissing))
+            else:
+                points = PointArray(lons, lats, np.repeat(levels, nmissing))
+            points.shape = (count, nmissing)
+            grid = self.query_columns(points, cvm, elevation)
+            complete = len(grid) == len(points)
+            if not complete:
+                partial = grid
+                grid = MaterialGrid((len(points),))
+                grid.setProperties(partial)
+
+            fetched = np.empty((nmissing, count, 3), dtype=np.float32)
+            for i, name in enumerate(["vp", "vs", "density"]):
+                fetched[:, :, i] = grid.getColumn(name).reshape(count, nmissing).T
+            values[missing] = fetched
+            ## only complete answers are kept
+            if store != None and complete:
+                with pycvm_span("column store"):
+                    store.add(positions[missing], level, fetched)
+                    self.cache.evict()
+                    store.prune()
+
+        grid = MaterialGrid((count * len(longitude),))
+        for i, name in enumerate(["vp", "vs", "density"]):
+            grid.setColumn(name, values[:, :, i].T)
+        return grid
 
-        for line in output:
-# it is material properties.. line
-            try :
-              mp = MaterialProperties.fromUCVMOutput(line)
-              properties.append(mp)
-            except :
-              pass
+    ##
+    #  Queries UCVM given a set of points and a CVM to query. If the CVM does not exist,
+    #  this function will throw an error. The set of points must be an array of the
+    #  @link Point Point @endlink class. This function returns an array of @link MaterialProperties
+    #  MaterialProperties @endlink.
+    #
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink for which UCVM should query.
+    #  @param cvm The CVM from which this data should be retrieved.
+    #  @return An array of @link MaterialProperties @endlink.
+    def query(self, point_list, cvm, elevation = None):
+        grid = self.query_columns(point_list, cvm, elevation)
 
+        properties = []
+        for vp, vs, density in zip(grid.getColumn("vp"), grid.getColumn("vs"), grid.getColumn("density")):
+            properties.append(MaterialProperties(vp, vs, density))
 
         if len(properties) == 1:
             return properties[0]
@@ -646,6 +2711,20 @@ class UCVM:
 
        return vp/vs
 
+    ##
+    #  Gets the Poisson values for whole arrays of Vs and Vp, the same as
+    #  calling @link UCVM::poisson poisson @endlink on every pair.
+    #  @param vs Vs values as a NumPy array
+    #  @param vp Vp values as a NumPy array
+    #  @return The Poisson values as a float32 NumPy array of the same shape
+    def poissonArray(self, vs, vp) :
+       vs = np.asarray(vs, dtype=np.float32)
+       vp = np.asarray(vp, dtype=np.float32)
+       valid = (vs != 0) & (vp != 0)
+       values = np.zeros(vs.shape, dtype=np.float32)
+       np.divide(vp, vs, out=values, where=valid)
+       return values
+
     ##
     #  Gets the Poisson value for a given set of Vs, Vp pair base on
     #  https://www.glossary.oilfield.slb.com/en/Terms/p/poissons_ratio.aspx
@@ -671,35 +2750,15 @@ class UCVM:
     #  points is an array of @link Point Points @endlink. The function returns
     #  the Vs30 values as floats.
     #
-    #  @param point_list An array of @link Point Points @endlink to query.
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink to query.
     #  @param cvm The CVM from which the Vs30 data should be retrieved.
     #  @return An array of floats which correspond to the points provided.
     def vs30(self, point_list, cvm):
 
-        proc = Popen([self.binary_dir + "/vs30_query", "-f", self.config, "-m", cvm], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-        
-        text_points = ""
-        floats = []
+        command = [self.binary_dir + "/vs30_query", "-f", self.config, "-m", cvm]
         
-        if isinstance(point_list, Point):
-            point_list = [point_list]
-        
-        for point in point_list:
-            text_points += "%.5f %.5f\n" % (point.longitude, point.latitude)
-            
-        output = proc.communicate(input=text_points)[0]
-        output = self.checkUCVMoutput(0,output)
-        
-        for line in output:
-            if ("WARNING" in line) or ("slow performance" in line) or ("Using Geo Depth coordinates as default mode" in line):
-                 print("skipping text :"+line)
-            else:
-                 try :
-                     p=float(line.split()[2])
-                 except :
-                     print("ERROR: should be a float.")
-                     exit(1)
-                 floats.append(p)
+        # Position 2 returned by vs30_query is the Vs30 value.
+        floats = self.query_values(command, point_list, 2, None, 0, (2,), True)[:, 0]
         
         if len(floats) == 1:
             return floats[0]
@@ -707,91 +2766,118 @@ class UCVM:
         return floats
 
 
+    ##
+    #  Gets the Vs30 values for a given set of points without vs30_query. The
+    #  top 30m of the column under every point is queried at once through
+    #  @link UCVM::query_profiles query_profiles @endlink, sampled at the middle
+    #  of each interval, and Vs30 = 30 / sum(interval / vs) is worked out for
+    #  all the points with NumPy. This sends 30 / interval points to ucvm_query
+    #  for every one vs30_query gets, so it is only quicker than
+    #  @link UCVM::vs30 vs30 @endlink when the columns are in the column store.
+    #
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink to query.
+    #  @param cvm The CVM from which the Vs30 data should be retrieved.
+    #  @param interval The thickness of the sampled layers in meters. Optional.
+    #  @return An array of floats which correspond to the points provided, 0 where
+    #          the top 30m hold water and -1 where the model has no data.
+    def vs30_columns(self, point_list, cvm, interval = 1.0):
+        point_list = PointArray.fromPoints(point_list)
+        count = max(1, int(round(30.0 / interval)))
+        dz = 30.0 / count
+        grid = self.query_profiles(point_list.longitude, point_list.latitude, dz / 2.0, dz, count, cvm)
+        vs = grid.getColumn("vs").reshape(count, len(point_list)).astype(np.float64)
+
+        with pycvm_span("travel time"):
+            with np.errstate(divide='ignore'):
+                floats = 30.0 / np.sum(dz / vs, axis=0)
+            floats[np.any(vs < 0, axis=0)] = -1
+
+        if len(floats) == 1:
+            return floats[0]
+
+        return floats
+
     ##
     #  Gets the basin depths for a given set of points, CVM, and desired Vs.
     #  If the CVM does not exist, an error is given. The set of points is an
     #  array of @link Point Points @endlink. The function returns the depths
     #  as floats.
     # 
-    #  @param point_list An array of @link Point Points @endlink to query.
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink to query.
     #  @param cvm The CVM from which the depths should come.
     #  @param vs_threshold The Vs threshold to check for (e.g. Z1.0 = 1000).
     #  @return An array of floats which correspond to the depths.
     def basin_depth(self, point_list, cvm, vs_threshold):
 
-        proc = Popen([self.binary_dir + "/basin_query", "-f", self.config, "-m", \
-                      cvm, "-v", "%.0f" % vs_threshold], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
+        command = [self.binary_dir + "/basin_query", "-f", self.config, "-m", \
+                   cvm, "-v", "%.0f" % vs_threshold]
 
-        text_points = ""
-        floats = []
-
-        if isinstance(point_list, Point):
-            point_list = [point_list]
-
-        for point in point_list:
-            text_points += "%.5f %.5f\n" % (point.longitude, point.latitude)
-
-        output = proc.communicate(input=text_points)[0]
-        output = self.checkUCVMoutput(0,output)
-
-        for line in output:
-            try :
-                p=float(line.split()[2])
-            except :
-                print("ERROR: should be a float.")
-                exit(1)
-            floats.append(p)
+        # Position 2 returned by basin_query is the depth.
+        floats = self.query_values(command, point_list, 2, None, 0, (2,), True)[:, 0]
 
         if len(floats) == 1:
             return floats[0]
 
         return floats
 
+    ##
+    #  Gets the basin depths for several Vs thresholds in one pass, e.g. Z1.0
+    #  and Z2.5 together. Instead of running basin_query once per threshold,
+    #  the columns under the points are queried through @link UCVM::query_profiles
+    #  query_profiles @endlink, batch levels at a time from the surface down,
+    #  and the first level at which Vs reaches each threshold is found with
+    #  NumPy. Columns stop being queried once every threshold is reached, and
+    #  the queried columns are kept for later plots of the same area.
+    #
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink to query.
+    #  @param cvm The CVM from which the depths should come.
+    #  @param vs_thresholds The Vs thresholds, e.g. [1000, 2500].
+    #  @param interval The vertical spacing of the columns in meters. Optional.
+    #  @param max_depth The deepest level looked at in meters. Optional.
+    #  @param batch The number of levels queried at a time. Optional.
+    #  @return An array of shape (points, thresholds) of depths in meters, -1 where
+    #          Vs does not reach the threshold above max_depth.
+    def basin_depths(self, point_list, cvm, vs_thresholds, interval = 20.0, max_depth = 15000.0, batch = 64):
+        point_list = PointArray.fromPoints(point_list)
+        thresholds = np.asarray(vs_thresholds, dtype=np.float64).reshape(-1)
+        depths = np.empty((len(point_list), len(thresholds)))
+        depths[:] = np.nan
+
+        nlevels = int(max_depth // interval) + 1
+        active = np.ones(len(point_list), dtype=bool)
+        for first in range(0, nlevels, batch):
+            idx = np.nonzero(active)[0]
+            if len(idx) == 0:
+                break
+            count = min(batch, nlevels - first)
+            grid = self.query_profiles(point_list.longitude[idx], point_list.latitude[idx], \
+                                       first * interval, interval, count, cvm)
+            vs = grid.getColumn("vs").reshape(count, len(idx))
+            with pycvm_span("threshold crossing"):
+                for t, threshold in enumerate(thresholds):
+                    crossed = vs >= threshold
+                    found = crossed.any(axis=0) & np.isnan(depths[idx, t])
+                    depths[idx[found], t] = (first + crossed.argmax(axis=0)[found]) * interval
+                active[idx] = np.isnan(depths[idx]).any(axis=1)
+
+        depths[np.isnan(depths)] = -1
+        return depths
+
     ##
     #  Queries UCVM given a set of points and a CVM to query. If the CVM does not exist,
     #  this function will throw an error. The set of points must be an array of the 
     #  @link Point Point @endlink class. This function returns an array of @link MaterialProperties
     #  MaterialProperties @endlink.
     #
-    #  @param point_list An array of @link Point Points @endlink for which UCVM should query.
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink for which UCVM should query.
     #  @param cvm The CVM from which this data should be retrieved.
     #  @return An array of @link MaterialProperties @endlink.
     def elevation_etree(self, point_list, cvm):
         
-        properties = []
-        
-        # shared_object = "../model/" + cvm + "/lib/lib" + cvm + ".so"
-        # Can we load this library dynamically and bypass the C code entirely?
-        #if os.path.isfile(shared_object):
-            #import ctypes
-            #obj = ctypes.cdll.LoadLibrary(shared_object)
-            #print(obj)
+        command = self.query_command(cvm)
         
-        proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-        
-        text_points = ""
-        
-        if isinstance(point_list, Point):
-            point_list = [point_list]
-         
-        for point in point_list:
-            text_points += "%.5f %.5f %.5f\n" % (point.longitude, point.latitude, point.depth)
-            # print("%.5f %.5f %.5f" % (point.longitude, point.latitude, point.depth))
-        
-        output = proc.communicate(input=text_points)[0]
-        output = self.checkUCVMoutput(1,output)
-
-        for line in output:
-            if ("WARNING" in line) or ("slow performance" in line) or ("Using Geo Depth coordinates as default mode" in line):
-                print("skipping text :"+line)
-            else:
-                # Position 3 returned by ucvm_query is a elevation in the etree. Return this value
-                try:
-                    p=float(line.split()[3])
-                except:
-                    print("ERROR: should be a float value.")
-                    exit(1)
-                properties.append(p)
+        # Position 3 returned by ucvm_query is a elevation in the etree. Return this value
+        properties = self.query_values(command, point_list, 3, None, 1, (3,), True, cvm)[:, 0]
 
         if len(properties) == 1:
             return properties[0]
@@ -804,32 +2890,18 @@ class UCVM:
     #  @link Point Point @endlink class. This function returns an array of @link MaterialProperties
     #  MaterialProperties @endlink.
     #
-    #  @param point_list An array of @link Point Points @endlink for which UCVM should query.
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink for which UCVM should query.
     #  @param cvm The CVM from which this data should be retrieved.
     #  @return An array of @link MaterialProperties @endlink.
     def map_grid(self, point_list, cvm):
         properties = []
         
-        #shared_object = "../model/" + cvm + "/lib/lib" + cvm + ".so"
-        # Can we load this library dynamically and bypass the C code entirely?
-        #if os.path.isfile(shared_object):
-        #import ctypes
-        #obj = ctypes.cdll.LoadLibrary(shared_object)
-        #print(obj)
-        
-        proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-        
-        text_points = ""
+        command = self.query_command(cvm)
         
-        if isinstance(point_list, Point):
-            point_list = [point_list]
-         
-        for point in point_list:
-            text_points += "%.5f %.5f %.5f\n" % (point.longitude, point.latitude, point.depth)
-            #  print("%.5f %.5f %.5f" % (point.longitude, point.latitude, point.depth))
+        point_list = PointArray.fromPoints(point_list)
+        text_points = point_list.toText(3)
         
-        output = proc.communicate(input=text_points)[0]
-        output = self.checkUCVMoutput(1,output)
+        output = self.run_query(command, text_points, len(point_list), 1)
 
         for line in output:
             if ("WARNING" in line) or ("slow performance" in line) or ("Using Geo Depth coordinates as default mode" in line):
@@ -850,38 +2922,15 @@ class UCVM:
     #  @link Point Point @endlink class. This function returns an array of @link MaterialProperties
     #  MaterialProperties @endlink.
     #
-    #  @param point_list An array of @link Point Points @endlink for which UCVM should query.
+    #  @param point_list An array of @link Point Points @endlink or a @link PointArray PointArray @endlink for which UCVM should query.
     #  @param cvm The CVM from which this data should be retrieved.
     #  @return An array of @link MaterialProperties @endlink.
     def vs30_etree(self, point_list, cvm):
-        properties = []
-        
-        proc = Popen([self.utility_dir + "/run_ucvm_query.sh", "-f", self.config, "-m", cvm], stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-        
-        text_points = ""
         
-        if isinstance(point_list, Point):
-            point_list = [point_list]
-         
-        for point in point_list:
-            text_points += "%.5f %.5f %.5f\n" % (point.longitude, point.latitude, point.depth)
-            # print("%.5f %.5f %.5f" % (point.longitude, point.latitude, point.depth))
+        command = self.query_command(cvm)
         
-        output = proc.communicate(input=text_points)[0]
-        output = self.checkUCVMoutput(1,output)
-
-        for line in output:
-            if ("WARNING" in line) or ("slow performance" in line) or ("Using Geo Depth coordinates as default mode" in line):
-                print("skipping text :"+line)
-            else:
-                #print("line :"+line)
-                # return position 4 from ucvm_query is the etree vs30 value. return that
-                try :
-                   p=float(line.split()[4])
-                except :
-                   print("ERROR: should be a float.")
-                   exit(1)
-                properties.append(p)
+        # return position 4 from ucvm_query is the etree vs30 value. return that
+        properties = self.query_values(command, point_list, 3, None, 1, (4,), True, cvm)[:, 0]
 
         if len(properties) == 1:
             return properties[0]
@@ -895,16 +2944,12 @@ class UCVM:
         k = rawfile.rfind(".png")
         if( k != -1) : 
             rawfile = rawfile[:k] + "_data.raw"
-        try :
-            fh = open(rawfile, 'rb') 
-        except:
+        if not os.path.isfile(rawfile) :
             print("ERROR: binary np float array data does not exist.")
             exit(1)
-            
-        floats=[]
-        sz = (num_x * num_y)
-        floats = np.load(fh)
-        fh.close()
+
+## memory mapped, only the pages that are used get read
+        floats = pycvm_load_npy(rawfile)
         return floats
     
 # import raw floats data from the external file 
@@ -916,19 +2961,11 @@ class UCVM:
         k = rawfile.rfind(".png")
         if( k != -1) : 
             rawfile = rawfile[:k] + "_data.raw"
-        try :
-            fh = open(rawfile, 'rb') 
-        except:
+        if not os.path.isfile(rawfile) :
             print("ERROR: binary data does not exist.")
             exit(1)
-            
-        floats=[]
-        sz = (num_x * num_y)
-        dlines = fh.readlines()
-        for oline in dlines :
-          parts = oline.split()
-          floats.append(float(parts[0]))
-        fh.close()
+
+        floats = np.loadtxt(rawfile, usecols=(0,), ndmin=1)
         return floats
 
 
@@ -961,26 +2998,24 @@ class UCVM:
         k = rawfile.rfind(".png")
         if( k != -1) : 
             rawfile = rawfile[:k] + "_data.bin"
-        try :
-            fh = open(rawfile, 'rb') 
-        except:
+        if not os.path.isfile(rawfile) :
             print("ERROR: binary data does not exist.")
             exit(1)
-            
-        floats = np.fromfile(fh, dtype=np.float32)
 
-## special case, when floats are written out as float64 instead of float32
-        if len(floats) == 2 * (num_x * num_y) :
-          fh.seek(0,0)
-          floats = np.fromfile(fh, dtype=np.float)
-        fh.close()
+        num_x, num_y = self.import_data_shape(rawfile, num_x, num_y)
 
-## maybe it is a np array
-        if len(floats) != (num_x * num_y) :
-          ffh = open(rawfile, 'rb') 
-          ffloats = np.load(ffh)
-          ffh.close()
-          floats=ffloats.reshape([num_x * num_y]);
+## the data is memory mapped, only the pages that are used get read
+        fh = open(rawfile, 'rb')
+        magic = fh.read(6)
+        fh.close()
+        if magic == b"\x93NUMPY" :
+## it is a np array
+          floats = pycvm_load_npy(rawfile).reshape([-1])
+        elif os.path.getsize(rawfile) == 8 * (num_x * num_y) :
+## special case, when floats are written out as float64 instead of float32
+          floats = np.memmap(rawfile, dtype=np.float64, mode='r')
+        else :
+          floats = np.memmap(rawfile, dtype=np.float32, mode='r')
 
         print("TOTAL number of binary data read:"+str(len(floats))+"\n")
 
@@ -1015,6 +3050,59 @@ class UCVM:
 
    
 
+#  export several float arrays, keyed by property name, into one
+#  multi-band NumPy file, image.png goes to image_data.npz
+    def export_bands(self, bands, fname):
+        rawfile = fname
+        if rawfile is None :
+            rawfile="data.npz"
+        k = rawfile.rfind(".png")
+        if( k != -1) : 
+            rawfile = rawfile[:k] + "_data.npz"
+        try :
+            fh = open(rawfile, 'wb+') 
+        except:
+            print("ERROR: can not write out binary data.")
+            exit(1)
+
+        np.savez(fh, **bands)
+        fh.close()
+
+#  import the bands of a multi-band file written by export_bands,
+#  as a dict of property name to float array
+    def import_bands(self, fname):
+        try :
+            data = np.load(fname)
+        except IOError :
+            print("ERROR: can not read " + fname)
+            exit(1)
+        return dict((name, data[name]) for name in data.files)
+
+#  export several arrays, keyed by name, each of shape (..., num_y, num_x),
+#  into a tile store, image.png goes to image_data.tiles
+    def export_tiles(self, bands, fname, attrs):
+        tiledir = fname
+        if tiledir is None :
+            tiledir="data.tiles"
+        k = tiledir.rfind(".png")
+        if( k != -1) :
+            tiledir = tiledir[:k] + "_data.tiles"
+        elif not tiledir.endswith(".tiles") :
+            tiledir = tiledir + "_data.tiles"
+        try :
+            TileStore(tiledir).write(bands, self.tile_size, attrs)
+        except (IOError, OSError) :
+            print("ERROR: can not write out tile data.")
+            exit(1)
+
+#  open a tile store written by export_tiles
+    def import_tiles(self, fname):
+        store = TileStore(fname)
+        if len(store.index) == 0 :
+            print("ERROR: can not read " + fname)
+            exit(1)
+        return store
+
 #  export raw floats nxy ndarray  to an external file 
     def export_binary(self, floats, fname):
         print("calling export_binary -",len(floats))
@@ -1034,6 +3122,47 @@ class UCVM:
         print("export_binary(), size=" + str(floats.size))
         fh.close()
 
+#  get the path of the _meta.json sidecar of a data file, image_data.bin
+#  goes with image_meta.json. None is returned when there is no sidecar.
+    def data_meta_file(self, fname):
+        k = fname.rfind("_data.")
+        if( k == -1) :
+            k = fname.rfind(".")
+        if( k == -1) :
+            return None
+        metafile = fname[:k] + "_meta.json"
+        if not os.path.isfile(metafile) :
+            return None
+        return metafile
+
+#  get the _meta.json sidecar of a data file, see data_meta_file.
+#  An empty dict is returned when there is no sidecar.
+    def import_data_meta(self, fname):
+        metafile = self.data_meta_file(fname)
+        if metafile is None :
+            return {}
+
+        try :
+            fh = open(metafile, 'r')
+            meta = json.load(fh)
+            fh.close()
+        except ValueError :
+            print("WARNING: can not read " + metafile)
+            return {}
+        return meta
+
+#  get the grid size of a data file from its _meta.json sidecar.
+#  The given num_x and num_y are returned when there is no sidecar
+#  or it has no grid size.
+    def import_data_shape(self, fname, num_x, num_y):
+        meta = self.import_data_meta(fname)
+        if 'num_x' in meta and 'num_y' in meta :
+            if (int(meta['num_x']), int(meta['num_y'])) != (num_x, num_y) :
+                print("Using grid size %d x %d from %s" % (int(meta['num_x']), int(meta['num_y']), \
+                                                            self.data_meta_file(fname)))
+            return int(meta['num_x']), int(meta['num_y'])
+        return num_x, num_y
+
 #  { 'num_x' : xval, 'num_y' : yval, 'total' : total }
 #  import ascii meta jsoin data from an external file 
     def import_metadata(self, fname):
@@ -1212,7 +3341,153 @@ def pycvm_is_num(value):
         return True
     except Exception:
         return False
-    
+
+##
+#  Returns true if the line is a result line from one of the UCVM query
+#  programs, that is, its first item is a number.
+#
+#  @param line The output line to test.
+#  @return True if it is a result line, false if not.
+def pycvm_is_data_line(line):
+    items = line.split(None, 1)
+    if len(items) == 0:
+        return False
+    return pycvm_is_num(items[0])
+
+## Basemap instances already made in this process, keyed by their arguments.
+pycvm_basemaps = {}
+
+##
+#  Returns the directory for cached data, UCVM_CACHE_DIR or ~/.cache/ucvm_plotting.
+#
+#  @param meta The metadata of the calling plot, its 'cache_dir' wins if set. Optional.
+#  @return The directory path.
+def pycvm_cache_dir(meta = None):
+    if meta != None and meta.get('cache_dir') != None:
+        return meta['cache_dir']
+    return os.environ.get('UCVM_CACHE_DIR', \
+                          os.path.join(os.path.expanduser("~"), ".cache", "ucvm_plotting"))
+
+##
+#  Returns a basemap.Basemap for the given arguments. Setting up a map parses
+#  the coastline, state and country boundaries for the region, which takes
+#  seconds at full resolution, so maps are kept in memory for the rest of the
+#  process and pickled to the basemap directory of the cache for later runs.
+#  The disk copy is skipped when caching is turned off.
+#
+#  @param meta The metadata of the calling plot, for 'no_cache' and 'cache_dir'. Optional.
+#  @param kwargs The arguments to basemap.Basemap.
+#  @return The Basemap.
+def pycvm_basemap(meta = None, **kwargs):
+    key = repr((getattr(basemap, "__version__", ""), sorted(kwargs.items())))
+    if key in pycvm_basemaps:
+        return pycvm_basemaps[key]
+
+    use_disk = os.environ.get('UCVM_NO_CACHE', '0') in ('', '0') and \
+               (meta == None or meta.get('no_cache') in (None, '', '0', 0, False))
+    path = os.path.join(pycvm_cache_dir(meta), "basemap", \
+                        hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle")
+
+    m = None
+    if use_disk and os.path.isfile(path):
+        try:
+            with pycvm_span("basemap (cached)"):
+                with open(path, "rb") as fh:
+                    m = pickle.load(fh)
+        except Exception:
+            m = None
+
+    if m == None:
+        with pycvm_span("basemap"):
+            m = basemap.Basemap(**kwargs)
+        if use_disk:
+            tmpname = None
+            try:
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+                with os.fdopen(fd, "wb") as fh:
+                    pickle.dump(m, fh, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmpname, path)
+            except (IOError, OSError, pickle.PicklingError) as err:
+                print("WARNING: could not cache the map, " + str(err))
+                if tmpname != None and os.path.exists(tmpname):
+                    os.remove(tmpname)
+
+    pycvm_basemaps[key] = m
+    return m
+
+##
+#  Loads a NumPy .npy file memory mapped, so that only the parts that are
+#  used are read from disk. Arrays that can not be mapped are read in full.
+#
+#  @param fname The .npy file.
+#  @return The array.
+def pycvm_load_npy(fname):
+    try:
+        return np.load(fname, mmap_mode='r')
+    except ValueError:
+        return np.load(fname)
+
+##
+#  Returns true if a flag from the metadata or the environment is on. Flags
+#  set by get_user_opts are "1"; None, "", "0", "false" and "no" are off.
+#
+#  @param value The value of the flag.
+#  @return True or False.
+def pycvm_flag(value):
+    if value in (None, False, 0):
+        return False
+    return str(value).strip().lower() not in ("", "0", "false", "no", "off")
+
+##
+#  Returns the full path of a program found on the PATH, or None.
+#
+#  @param program The name of the program to look for.
+#  @return The full path to the program or None if it was not found.
+def pycvm_which(program):
+    for path in os.environ.get("PATH", "").split(os.pathsep):
+        candidate = os.path.join(path, program)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+## Characters a result line from the UCVM query programs can start with.
+PYCVM_DATA_LINE_START = frozenset("-+.0123456789")
+
+##
+#  Parses the output lines of one of the UCVM query programs into a float
+#  array with one row per result line. Banner and warning lines are dropped
+#  and the wanted columns are converted in a single call to NumPy, instead of
+#  splitting and converting every line in Python.
+#
+#  @param lines The output lines of the query program.
+#  @param columns The indexes of the columns to keep, as a tuple.
+#  @param strict If true, a malformed result line raises a @link UCVMQueryError UCVMQueryError @endlink
+#                instead of being skipped.
+#  @return A NumPy array of shape (result lines, len(columns)).
+def pycvm_parse_output(lines, columns, strict = False):
+    data = [line for line in lines if line.lstrip()[:1] in PYCVM_DATA_LINE_START]
+    if len(data) == 0:
+        return np.zeros((0, len(columns)))
+
+    try:
+        return np.loadtxt(data, usecols=columns, ndmin=2)
+    except (ValueError, IndexError):
+        pass
+
+    ## Some line did not parse, fall back to going through them one by one.
+    rows = []
+    for line in data:
+        items = line.split()
+        try:
+            rows.append([float(items[c]) for c in columns])
+        except (ValueError, IndexError):
+            if strict:
+                raise UCVMQueryError("should be a float. "+line)
+            print("skipping text :"+line)
+    return np.array(rows, dtype=np.float64).reshape(-1, len(columns))
+
 ##
 #  Returns the discrete colormap.
 #
@@ -6,8 +6,8 @@
 #
 #  Imports
 from cross_section import CrossSection
-from common import Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Point, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt, pycvm_timed
 
 ##
 #  @class CrossDifferencSection
@@ -42,6 +42,7 @@ class CrossDifferenceSection(CrossSection):
     
     ##
     #  Retrieves the values for this cross section and stores them in the class.
+    @pycvm_timed
     def getplotvals(self, property="vs") :
         
         #  How many y and x values will we need?
@@ -62,9 +63,9 @@ class CrossDifferenceSection(CrossSection):
            self.num_y = int(math.ceil(self.plot_height / self.spacing)) + 1
         
         ## The 2D array of retrieved values.
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
         ### should be 2 datafiles
         if (self.datafile1 == None or self.datafile2 == None) :
@@ -83,8 +84,8 @@ class CrossDifferenceSection(CrossSection):
                     dataA2d = u.import_np_float_array(self.datafile1, self.num_x, self.num_y)
                        ## flatten them
                     dataA1d = dataA2d.reshape([1, self.num_x * self.num_y])
-                       ## turn first one into a list
-                    dataA=dataA1d[0].tolist()
+                       ## take the first row, still backed by the file
+                    dataA=dataA1d[0]
 
             print("\nUsing --> "+self.datafile2)
             dataB=[]
@@ -97,18 +98,10 @@ class CrossDifferenceSection(CrossSection):
                     dataB2d = u.import_np_float_array(self.datafile2, self.num_x, self.num_y)
                        ## flatten them
                     dataB1d = dataB2d.reshape([1, self.num_x * self.num_y])
-                       ## turn first one into a list
-                    dataB=dataB1d[0].tolist()
+                       ## take the first row, still backed by the file
+                    dataB=dataB1d[0]
 
-        i = 0
-        j = 0
-
-        for idx in range(len(dataA)) :
-            self.materialproperties[i][j].vs = dataA[idx]-dataB[idx]
-            j = j + 1
-            if j >= self.num_x:
-                j = 0
-                i = i + 1
+        self.materialproperties.setColumn("vs", np.asarray(dataA) - np.asarray(dataB))
 
     ##
     #  Plots the Difference data as a cross section. This code is very similar to the
@@ -117,6 +110,7 @@ class CrossDifferenceSection(CrossSection):
     #  @param filename The location to which the plot should be saved. Optional.
     #  @param title The title of the plot to use. Optional.
     #  @param color_scale The color scale to use for the plot. Optional.
+    @pycvm_timed
     def plot(self) :
  
         if self.upperleftpoint.description == None:
@@ -8,12 +8,9 @@
 
 #  Imports
 
-from mpl_toolkits import basemap
-#XXX from mpl_toolkits.basemap import cm
-from matplotlib import cm
-
-from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, np, plt
+from common import Plot, Point, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, pycvm_basemap, cm, mcolors, basemap, np, plt, \
+                   pycvm_timed, pycvm_span
 
 import random
 import string
@@ -24,6 +21,44 @@ except Exception:
     print("ERROR: PyProj must be installed for this script to work.")
     exit(1)
 
+##
+#  Returns the UTM zone of the midpoint of a transect, and whether it is
+#  south of the equator.
+#
+#  @param startingpoint The @link common.Point starting point @endlink of the transect.
+#  @param endingpoint The @link common.Point ending point @endlink of the transect.
+#  @return The zone number and True for the southern hemisphere.
+def pycvm_utm_zone(startingpoint, endingpoint):
+    lon = (startingpoint.longitude + endingpoint.longitude) / 2.0
+    lat = (startingpoint.latitude + endingpoint.latitude) / 2.0
+    return int(math.floor((lon + 180.0) / 6.0)) % 60 + 1, lat < 0
+
+##
+#  Returns the longitudes and latitudes of the points of a transect, spaced
+#  evenly in the UTM zone of the transect and projected back in one call.
+#
+#  @param startingpoint The @link common.Point starting point @endlink of the transect.
+#  @param endingpoint The @link common.Point ending point @endlink of the transect.
+#  @param hspacing The distance between the points in meters.
+#  @return The longitudes and latitudes as NumPy arrays.
+def pycvm_transect(startingpoint, endingpoint, hspacing):
+    zone, south = pycvm_utm_zone(startingpoint, endingpoint)
+    if south:
+        proj = pyproj.Proj(proj='utm', zone=zone, south=True, ellps='WGS84')
+    else:
+        proj = pyproj.Proj(proj='utm', zone=zone, ellps='WGS84')
+
+    x1, y1 = proj(startingpoint.longitude, startingpoint.latitude)
+    x2, y2 = proj(endingpoint.longitude, endingpoint.latitude)
+
+    num_prof = int(math.sqrt((x2-x1)*(x2-x1) + \
+                             (y2-y1)*(y2-y1))/hspacing)
+
+    steps = np.arange(num_prof + 1)
+    lons, lats = proj(x1 + steps*(x2-x1)/float(num_prof), \
+                      y1 + steps*(y2-y1)/float(num_prof), inverse=True)
+    return np.asarray(lons), np.asarray(lats)
+
 ##
 #  @class CrossSection
 #  @brief Plots a cross section between two @link common.Point Points @endlink.
@@ -114,46 +149,19 @@ class CrossSection:
 
     ## 
     #  Generates the depth profile in a format that is ready to plot.
+    @pycvm_timed
     def getplotvals(self, mproperty='vs'):
 
-        point_list = []
-        lon_list = []
-        lat_list = []
-        depth_list = []
-
-        proj = pyproj.Proj(proj='utm', zone=11, ellps='WGS84')
+        lons, lats = pycvm_transect(self.startingpoint, self.endingpoint, self.hspacing)
+        num_prof = len(lons) - 1
 
-        x1, y1 = proj(self.startingpoint.longitude, self.startingpoint.latitude)
-        x2, y2 = proj(self.endingpoint.longitude, self.endingpoint.latitude)
+        depth_list = [round(j,3) for j in range(int(self.startingdepth), int(self.todepth) + 1, int(self.vspacing))]
 
-        num_prof = int(math.sqrt((x2-x1)*(x2-x1) + \
-                                 (y2-y1)*(y2-y1))/self.hspacing)
-        
-#        cnt=0
-        jstart = self.startingdepth
-        for j in range(int(self.startingdepth), int(self.todepth) + 1, int(self.vspacing)):
-            depth_list.append( round(j,3))
-            for i in range(0, num_prof + 1):
-                x = x1 + i*(x2-x1)/float(num_prof)
-                y = y1 + i*(y2-y1)/float(num_prof)
-                lon, lat = proj(x, y, inverse=True)
-                point_list.append(Point(lon, lat, j))
-                if ( j == jstart) :
-                  lon_list.append( round(lon,5))
-                  lat_list.append( round(lat,5))
-#                if(cnt < 10) :
-#                   print("point.. lon "+str(lon)+" lat "+str(lat)+" j "+str(j))
-#                   cnt += 1
-                
-        self.lon_list=lon_list
-        self.lat_list=lat_list
+        self.lon_list=[round(lon,5) for lon in lons.tolist()]
+        self.lat_list=[round(lat,5) for lat in lats.tolist()]
         self.depth_list=depth_list
-#        print("total points generated.."+str(len(point_list)))
-#        print("total lon.."+ str(len(lon_list)))
-#        print("total lat.."+ str(len(lat_list)))
-#        print("total lat.."+ str(len(depth_list)))
 
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors, meta=self.meta)
 ### MEI -- TODO, need to have separate routine that generates cross section datafile
         if (self.datafile != None) :
             ## Private number of x points.
@@ -163,6 +171,10 @@ class CrossSection:
             print("\nUsing -->"+self.datafile)
 ##            print("expecting x "+str(self.num_x)+" y "+str(self.num_y))
 
+            if self.datafile.endswith(".tiles") :
+                self.materialproperties = MaterialGrid((self.num_y, self.num_x))
+                self.gettiles(u)
+                return
 
             if self.datafile.rfind(".binary") != -1 :
                 data = u.import_binary(self.datafile, self.num_x, self.num_y)
@@ -174,24 +186,14 @@ class CrossSection:
 
 ## this set of data is only for --datatype: either 'vs', 'vp', 'rho', or 'poisson'
         ## The 2D array of retrieved material properties.
-            self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
-            datapoints = data.reshape(self.num_y, self.num_x)
-
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):   
-                    tmp=datapoints[y][x]
-                    if(mproperty == 'vp'):
-                      self.materialproperties[y][x].setProperty('Vp',tmp)
-                    if(mproperty == 'density'):
-                      self.materialproperties[y][x].setProperty('Density',tmp)
-                    if(mproperty == 'poisson'):
-                      self.materialproperties[y][x].setProperty('Poisson',tmp)
-                    if(mproperty == 'vs'):
-                      self.materialproperties[y][x].setProperty('Vs',tmp)
+            self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
+            if mproperty in ['vp', 'density', 'poisson', 'vs']:
+                self.materialproperties.setColumn(mproperty, data)
 
             print("\nUsing --> "+self.datafile) 
         else:
-            data = u.query(point_list, self.cvm)
+            ## every depth level reuses the same columns, which later plots may share
+            data = u.query_profiles(lons, lats, int(self.startingdepth), int(self.vspacing), len(depth_list), self.cvm)
 
 
             ## Private number of x points.
@@ -200,15 +202,49 @@ class CrossSection:
             self.num_y = (int(self.todepth) - int(self.startingdepth)) / int(self.vspacing) + 1
         
         ## The 2D array of retrieved material properties.
-            self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+            self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
 
         
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):   
-                    self.materialproperties[y][x] = data[y * self.num_x + x]     
+            self.materialproperties.setProperties(data)
+
+    ##
+    #  Reads the depths of this cross section from a tile store written by an
+    #  earlier plot of the same transect, loading only the tiles they fall in.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to read with.
+    def gettiles(self, u):
+        store = u.import_tiles(self.datafile)
+        attrs = store.attrs()
+        ny, nx = store.shape()
+        row = (int(self.startingdepth) - int(attrs['depth0'])) / float(attrs['vspacing'])
+        if nx != self.num_x or int(self.vspacing) != int(attrs['vspacing']) or row != int(row) \
+           or row < 0 or int(row) + self.num_y > ny:
+            print("ERROR: %s does not hold the depths of this cross section." % self.datafile)
+            exit(1)
+        bands = store.read((int(row), int(row) + self.num_y), None)
+        for name in bands :
+            self.materialproperties.setColumn(name, bands[name])
+        self.materialproperties.setColumn("poisson", u.poissonArray(bands["vs"], bands["vp"]))
+        print("Read %d of the tiles" % store.tiles_read)
+
+    ##
+    #  Saves vp, vs and density into the tile store <outfile>_data.tiles, if
+    #  a tile size is set, with the depth of the first row and the spacing.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to export with.
+    #  @param fname The file name of the plot.
+    def exporttiles(self, u, fname):
+        if u.tile_size == None :
+            return
+        bands = {}
+        for name in ["vs", "vp", "density"] :
+            bands[name] = self.materialproperties.getColumn(name)
+        u.export_tiles(bands, fname, {"depth0" : int(self.startingdepth), "vspacing" : int(self.vspacing)})
+
     ## 
     #  Plots the horizontal slice either to an image or a file name.
     # 
+    @pycvm_timed
     def plot(self) :
 
         self.installdir = None
@@ -272,9 +308,9 @@ class CrossSection:
         ll_lon = ll_lon + 0.015 * ll_lon
     
         # Plot map up top.
-        m = basemap.Basemap(projection='cyl', llcrnrlat=ll_lat, urcrnrlat=ur_lat, \
-                            llcrnrlon=ll_lon, urcrnrlon=ur_lon, \
-                            resolution='f', anchor='C')
+        m = pycvm_basemap(self.meta, projection='cyl', llcrnrlat=ll_lat, urcrnrlat=ur_lat, \
+                          llcrnrlon=ll_lon, urcrnrlon=ur_lon, \
+                          resolution='f', anchor='C')
     
         lat_ticks = np.arange(ll_lat, ur_lat + 0.1, (ur_lat - ll_lat))
         lon_ticks = np.arange(ll_lon, ur_lon + 0.1, (ur_lon - ll_lon))
@@ -306,20 +342,12 @@ class CrossSection:
     
         plt.axes([0.05,0.18,0.9,0.54])
     
-        datapoints = np.arange(self.num_x * self.num_y,dtype=np.float32).reshape(self.num_y, self.num_x)
-            
-
-        for y in range(0, self.num_y):
-            for x in range(0, self.num_x):
-                if self.datafile != None : 
-                    datapoints[y][x] = self.materialproperties[y][x].getProperty(mproperty)
-                elif mproperty != "poisson" :
-                    datapoints[y][x] = self.materialproperties[y][x].getProperty(mproperty)
-                else:
-                    datapoints[y][x] = u.poisson(self.materialproperties[y][x].getProperty("vs"), self.materialproperties[y][x].getProperty("vp")) 
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
-
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        if self.datafile != None or mproperty != "poisson" :
+            datapoints = np.array(self.materialproperties.getColumn(mproperty), dtype=np.float32)
+        else:
+            datapoints = u.poissonArray(self.materialproperties.getColumn("vs"), self.materialproperties.getColumn("vp"))
 
         myInt=1000
         if mproperty == "poisson": ## no need to reduce.. should also be using sd or dd
@@ -414,12 +442,14 @@ class CrossSection:
           if self.filename:
               u.export_metadata(self.meta,self.filename)
               u.export_np_float_array(datapoints,self.filename)
+              self.exporttiles(u,self.filename)
           else:
 #https://stackoverflow.com/questions/2257441/random-string-generation-with-upper-case-letters-and-digits-in-python
               rnd=''.join(random.SystemRandom().choice(string.ascii_uppercase + string.digits) for _ in range(6))
               f = "cross_section"+rnd
               u.export_metadata(self.meta,f)
               u.export_np_float_array(datapoints,f)
+              self.exporttiles(u,f)
 
 
         img = plt.imshow(newdatapoints, cmap=colormap, norm=norm)
@@ -446,6 +476,7 @@ class CrossSection:
             cbar.set_label("Poisson(Vs,Vp)")
        
         if self.filename:
-            plt.savefig(self.filename)
+            with pycvm_span("savefig"):
+                plt.savefig(self.filename)
         else:
             plt.show() 
@@ -8,10 +8,7 @@
 #  arguments, or through Python code in the class DepthProfile.
 
 #  Imports
-from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, plt
-from scipy.interpolate import spline, splprep, splev
-from scipy.interpolate import Rbf, InterpolatedUnivariateSpline
-import scipy.interpolate as interpolate
+from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, plt, pycvm_timed, pycvm_span
 import numpy as np
 import json
 
@@ -47,7 +44,7 @@ class DepthProfile:
         self.metadata = None
         if 'metadata' in self.meta :
             f = self.meta['metadata']
-            u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+            u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
             self.metadata = u.import_metadata(f)
 
         if not isinstance(startingpoint, Point):
@@ -124,18 +121,16 @@ class DepthProfile:
     
     ## 
     #  Generates the depth profile in a format that is ready to plot.
+    @pycvm_timed
     def getplotvals(self):
         
-        point_list = []
-
-        # Generate the list of points.
+        # Generate the list of depths.
         # for i in range(int(self.startingpoint.depth), int(self.todepth + 1), int(self.spacing)):
         self.meta['depth'] = []
         for i in np.arange(self.startingpoint.depth, self.todepth + 1, self.spacing):
-            point_list.append(Point(self.startingpoint.longitude, self.startingpoint.latitude, i))
             self.meta['depth'].append(i)
             
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors, meta=self.meta)
 
         if (self.datafile != None) :
             print("\nUsing --> "+self.datafile)
@@ -144,7 +139,8 @@ class DepthProfile:
                 print("ERROR: no matprops plot data.")
                 exit(1)
         else:
-            data = u.query(point_list, self.cvm)
+            data = u.query_profiles([self.startingpoint.longitude], [self.startingpoint.latitude], \
+                                    self.startingpoint.depth, self.spacing, len(self.meta['depth']), self.cvm)
 #        print("NUMBER of data found ", len(data))
         
         tmp = []
@@ -230,6 +226,7 @@ class DepthProfile:
             plot.addsubplot().plot(newvslist, yvals, "-", color=vscolor, label=vslabel)
 
 ## attempted to draw a smoothed line, not good
+##            from scipy.interpolate import splprep, splev
 ##            xs=np.array(self.vslist)
 ##            ys=np.array(yvals)
 ##            # spline parameters
@@ -268,6 +265,7 @@ class DepthProfile:
     #
     #  @param properties An array of material properties. Can be one or more of vp, vs, and/or density.
     #  @param filename If this is set, the plot will not be shown but rather saved to this location.
+    @pycvm_timed
     def plot(self):
 
         if self.startingpoint.description == None:
@@ -295,4 +293,5 @@ class DepthProfile:
         if self.filename == None:
             plt.show()
         else:
-            plt.savefig(self.filename)
+            with pycvm_span("savefig"):
+                plt.savefig(self.filename)
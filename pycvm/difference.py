@@ -8,9 +8,8 @@
 #  and can either save or plot the difference.
 
 #  Imports
-from mpl_toolkits import basemap
-from mpl_toolkits.basemap import cm
-from common import MaterialProperties, Plot, cm, np, basemap, plt
+from common import MaterialProperties, MaterialGrid, Plot, cm, np, basemap, plt, pycvm_basemap, \
+                   pycvm_timed, pycvm_span
 
 ##
 #  @class Difference
@@ -63,13 +62,8 @@ class Difference:
         if firstplot.num_y != secondplot.num_y:
             raise TypeError("Number of Y points is not the same in each plot.")   
         
-        ##  Initialize the difference holder.
-        self.difference_values = [[MaterialProperties(-1, -1, -1) for x in range(firstplot.num_x)] for x in range(firstplot.num_y)]
-        
-        #  Get the difference and save it.
-        for y in range(0, firstplot.num_y):
-            for x in range(0, firstplot.num_x):
-                 self.difference_values[y][x] = firstplot.materialproperties[y][x] - secondplot.materialproperties[y][x]
+        ##  The difference, a MaterialGrid of firstplot minus secondplot.
+        self.difference_values = firstplot.materialproperties - secondplot.materialproperties
         
     ##
     #  Plots the difference. Can save the plot to disk if the user specifies a file name.
@@ -77,6 +71,7 @@ class Difference:
     #  @param property The property that should be plotted.
     #  @param filename The location to which the plot should be saved. Optional.
     #  @param title A more descriptive title for the plot. Optional.
+    @pycvm_timed
     def plot(self, property, filename = None, title = None):
         
         if self.plot_type == "HorizontalSlice":
@@ -89,11 +84,11 @@ class Difference:
             
             colormap = basemap.cm.GMT_seis
         
-            m = basemap.Basemap(projection='cyl', llcrnrlat=self.plot_specs.bottomrightpoint.latitude, \
-                                urcrnrlat=self.plot_specs.upperleftpoint.latitude, \
-                                llcrnrlon=self.plot_specs.upperleftpoint.longitude, \
-                                urcrnrlon=self.plot_specs.bottomrightpoint.longitude, \
-                                resolution='f', anchor='C')
+            m = pycvm_basemap(getattr(self.plot_specs, "meta", None), projection='cyl', llcrnrlat=self.plot_specs.bottomrightpoint.latitude, \
+                              urcrnrlat=self.plot_specs.upperleftpoint.latitude, \
+                              llcrnrlon=self.plot_specs.upperleftpoint.longitude, \
+                              urcrnrlon=self.plot_specs.bottomrightpoint.longitude, \
+                              resolution='f', anchor='C')
         
             lat_ticks = np.arange(self.plot_specs.bottomrightpoint.latitude, \
                                   self.plot_specs.upperleftpoint.latitude + 0.1, \
@@ -115,14 +110,10 @@ class Difference:
                              self.plot_specs.spacing)
     
             # Get the properties.
-            datapoints = np.arange(self.plot_specs.num_x * self.plot_specs.num_y, \
-                                   dtype=np.float32).reshape(self.plot_specs.num_y, self.plot_specs.num_x)
-        
-            for i in range(0, self.plot_specs.num_y):
-                for j in range(0, self.plot_specs.num_x):
-                    datapoints[i][j] = self.difference_values[i][j].getProperty(property) / 1000.0
+            datapoints = (self.difference_values.getColumn(property) / 1000.0).astype(np.float32)
                     
-            t = m.transform_scalar(datapoints, lons, lats, len(lons), len(lats))
+            with pycvm_span("transform"):
+                t = m.transform_scalar(datapoints, lons, lats, len(lons), len(lats))
             img = m.imshow(t, cmap=colormap)
     
             m.drawcoastlines()
@@ -156,9 +147,9 @@ class Difference:
             ll_lon = ll_lon + 0.015 * ll_lon
     
             # Plot map up top.
-            m = basemap.Basemap(projection='cyl', llcrnrlat=ll_lat, urcrnrlat=ur_lat, \
-                                llcrnrlon=ll_lon, urcrnrlon=ur_lon, \
-                                resolution='f', anchor='C')
+            m = pycvm_basemap(getattr(self.plot_specs, "meta", None), projection='cyl', llcrnrlat=ll_lat, urcrnrlat=ur_lat, \
+                              llcrnrlon=ll_lon, urcrnrlon=ur_lon, \
+                              resolution='f', anchor='C')
     
             lat_ticks = np.arange(ll_lat, ur_lat + 0.1, (ur_lat - ll_lat))
             lon_ticks = np.arange(ll_lon, ur_lon + 0.1, (ur_lon - ll_lon))
@@ -191,11 +182,7 @@ class Difference:
     
             plt.axes([0.05,0.18,0.9,0.54])
     
-            datapoints = np.arange(self.plot_specs.num_x * self.plot_specs.num_y,dtype=np.float32).reshape(self.plot_specs.num_y, self.plot_specs.num_x)
-            
-            for i in range(0, self.plot_specs.num_y):
-                for j in range(0, self.plot_specs.num_x):   
-                    datapoints[i][j] = self.difference_values[i][j].getProperty(property) / 1000          
+            datapoints = (self.difference_values.getColumn(property) / 1000.0).astype(np.float32)
     
             img = plt.imshow(datapoints, cmap=colormap)
             
@@ -219,6 +206,7 @@ class Difference:
             cbar.set_label(property.title() + " (km/s)")  
         
         if filename:
-            plt.savefig(filename)
+            with pycvm_span("savefig"):
+                plt.savefig(filename)
         else:
             plt.show()
@@ -7,20 +7,14 @@
 #  Allows for generation of a elevation cross section between two points.
 
 #  Imports
-from mpl_toolkits import basemap
-from mpl_toolkits.basemap import cm
-from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Plot, Point, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, pycvm_basemap, cm, mcolors, basemap, np, plt, \
+                   pycvm_timed, pycvm_span
+from cross_section import pycvm_transect
 
 import random
 import string
 
-try:
-    import pyproj
-except Exception:
-    print("ERROR: PyProj must be installed for this script to work.")
-    exit(1)
-
 ##
 #  @class ElevationCrossSection
 #  @brief Plots a elevation cross section between two @link common.Point Points @endlink.
@@ -104,22 +98,11 @@ class ElevationCrossSection:
 
     ## 
     #  Generates the elevation profile in a format that is ready to plot.
+    @pycvm_timed
     def getplotvals(self, mproperty='vs') :
 
-        point_list = []
-        lon_list = []
-        lat_list = []
-        elevation_list = []
-
-        proj = pyproj.Proj(proj='utm', zone=11, ellps='WGS84')
-
-        x1, y1 = proj(self.startingpoint.longitude, self.startingpoint.latitude)
-        x2, y2 = proj(self.endingpoint.longitude, self.endingpoint.latitude)
-
-        num_prof = int(math.sqrt((x2-x1)*(x2-x1) + \
-                                 (y2-y1)*(y2-y1))/self.hspacing)
-        
-        jstart = self.startelevation
+        lons, lats = pycvm_transect(self.startingpoint, self.endingpoint, self.hspacing)
+        num_prof = len(lons) - 1
 
         toto=int(self.toelevation)
         if(toto <=0 ):
@@ -127,22 +110,13 @@ class ElevationCrossSection:
         else:
           toto = toto+1
 
-        for j in range(int(self.startelevation), toto, int(self.vspacing)):
-            elevation_list.append( round(j,3))
-            for i in range(0, num_prof + 1):
-                x = x1 + i*(x2-x1)/float(num_prof)
-                y = y1 + i*(y2-y1)/float(num_prof)
-                lon, lat = proj(x, y, inverse=True)
-                point_list.append(Point(lon, lat, elevation=j))
-                if ( j == jstart) :
-                  lon_list.append( round(lon,5))
-                  lat_list.append( round(lat,5))
-                
-        self.lon_list=lon_list
-        self.lat_list=lat_list
+        elevation_list = [round(j,3) for j in range(int(self.startelevation), toto, int(self.vspacing))]
+
+        self.lon_list=[round(lon,5) for lon in lons.tolist()]
+        self.lat_list=[round(lat,5) for lat in lats.tolist()]
         self.elevation_list=elevation_list
 
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors, meta=self.meta)
 
 ### MEI -- TODO, need to have separate routine that generates cross section datafile
         if (self.datafile != None) :
@@ -160,22 +134,13 @@ class ElevationCrossSection:
 
 ## this set of data is only for --datatype: either 'vs', 'vp', 'rho', or 'poisson'
         ## The 2D array of retrieved material properties.
-            self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
-            datapoints = data.reshape(self.num_y, self.num_x)
-
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):   
-                    tmp=datapoints[y][x]
-                    if(mproperty == 'vp'):
-                      self.materialproperties[y][x].setProperty('Vp',tmp)
-                    if(mproperty == 'density'):
-                      self.materialproperties[y][x].setProperty('Density',tmp)
-                    if(mproperty == 'poisson'):
-                      self.materialproperties[y][x].setProperty('Poisson',tmp)
-                    if(mproperty == 'vs'):
-                      self.materialproperties[y][x].setProperty('Vs',tmp)
+            self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
+            if mproperty in ['vp', 'density', 'poisson', 'vs']:
+                self.materialproperties.setColumn(mproperty, data)
         else:
-            data = u.query(point_list, self.cvm, elevation=1)
+            ## every elevation level reuses the same columns, which later plots may share
+            data = u.query_profiles(lons, lats, int(self.startelevation), int(self.vspacing), len(elevation_list), \
+                                    self.cvm, elevation=1)
 
 
             ## Private number of x points.
@@ -185,17 +150,16 @@ class ElevationCrossSection:
 
         
         ## The 2D array of retrieved material properties.
-            self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+            self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
 
         
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):   
-                    self.materialproperties[y][x] = data[y * self.num_x + x]     
+            self.materialproperties.setProperties(data)
 #            print("outputting num_x "+str(self.num_x)+" num_y "+str(self.num_y))
 
     ## 
     #  Plots the horizontal slice either to an image or a file name.
     # 
+    @pycvm_timed
     def plot(self) :
 
         self.installdir = None
@@ -259,9 +223,9 @@ class ElevationCrossSection:
         ll_lon = ll_lon + 0.015 * ll_lon
     
         # Plot map up top.
-        m = basemap.Basemap(projection='cyl', llcrnrlat=ll_lat, urcrnrlat=ur_lat, \
-                            llcrnrlon=ll_lon, urcrnrlon=ur_lon, \
-                            resolution='f', anchor='C')
+        m = pycvm_basemap(self.meta, projection='cyl', llcrnrlat=ll_lat, urcrnrlat=ur_lat, \
+                          llcrnrlon=ll_lon, urcrnrlon=ur_lon, \
+                          resolution='f', anchor='C')
     
         lat_ticks = np.arange(ll_lat, ur_lat + 0.1, (ur_lat - ll_lat))
         lon_ticks = np.arange(ll_lon, ur_lon + 0.1, (ur_lon - ll_lon))
@@ -293,18 +257,12 @@ class ElevationCrossSection:
     
         plt.axes([0.05,0.18,0.9,0.54])
     
-        datapoints = np.arange(self.num_x * self.num_y,dtype=np.float32).reshape(self.num_y, self.num_x)
-            
-        for y in range(0, self.num_y):
-            for x in range(0, self.num_x):
-                if self.datafile != None :
-                    datapoints[y][x] = self.materialproperties[y][x].getProperty(mproperty)
-                elif mproperty != "poisson" :
-                    datapoints[y][x] = self.materialproperties[y][x].getProperty(mproperty)
-                else:
-                    datapoints[y][x] = u.poisson(self.materialproperties[y][x].getProperty("vs"), self.materialproperties[y][x].getProperty("vp"))    
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        if self.datafile != None or mproperty != "poisson" :
+            datapoints = np.array(self.materialproperties.getColumn(mproperty), dtype=np.float32)
+        else:
+            datapoints = u.poissonArray(self.materialproperties.getColumn("vs"), self.materialproperties.getColumn("vp"))
 
         myInt=1000
         if mproperty == "poisson": ## no need to reduce.. should also be using sd or dd
@@ -417,6 +375,7 @@ class ElevationCrossSection:
             cbar.set_label("Poisson(Vs,Vp)")
        
         if self.filename:
-            plt.savefig(self.filename)
+            with pycvm_span("savefig"):
+                plt.savefig(self.filename)
         else:
             plt.show() 
@@ -8,10 +8,9 @@
 #  arguments, or through Python code in the class HorizontalSlice.
 
 #  Imports
-from mpl_toolkits import basemap
-from mpl_toolkits.basemap import cm
-from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Plot, Point, PointArray, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, pycvm_basemap, cm, mcolors, basemap, np, plt, \
+                   pycvm_timed, pycvm_span
 
 ##
 #  @class ElevationHorizontalSlice
@@ -114,6 +113,7 @@ class ElevationHorizontalSlice:
     
     ##
     #  Retrieves the values for this horizontal slice and stores them in the class.
+    @pycvm_timed
     def getplotvals(self, mproperty="vs"):
         
         #  How many y and x values will we need?
@@ -135,9 +135,9 @@ class ElevationHorizontalSlice:
            self.num_y = int(math.ceil(self.plot_height / self.spacing)) + 1
         
         ## The 2D array of retrieved material properties.
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in xrange(self.num_x)] for x in xrange(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors, meta=self.meta)
 
 ### MEI
         if (self.datafile != None) :
@@ -147,41 +147,25 @@ class ElevationHorizontalSlice:
                 data2d = u.import_np_float_array(self.datafile, self.num_x, self.num_y)
                 ## flatten them
                 data1d = data2d.reshape([1, self.num_x * self.num_y])
-                ## turn first one into a list
-                data=data1d[0].tolist()
+                ## take the first row, still backed by the file
+                data=data1d[0]
             print("\nUsing --> "+self.datafile) 
  
         else: 
             #  Generate a list of points to pass to UCVM.
-            ucvmpoints = []
-            for y in xrange(0, self.num_y):
-                for x in xrange(0, self.num_x):
-                    ucvmpoints.append(Point(self.upperleftpoint.longitude + x * self.spacing, \
-                                            self.bottomrightpoint.latitude + y * self.spacing, \
-                                            elevation=self.upperleftpoint.elevation))
-            data = u.query(ucvmpoints, self.cvm, elevation=1)
-
-        i = 0
-        j = 0
-        isfloat = 0
+            ucvmpoints = PointArray.grid(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                         self.spacing, self.num_x, self.num_y, elevation=self.upperleftpoint.elevation)
+            data = u.query_columns(ucvmpoints, self.cvm, elevation=1)
+
         if (self.datafile != None) :
-            isfloat = 1
-        for matprop in data:
-            if isfloat:
-                self.materialproperties[i][j].setProperty(mproperty,matprop)
-#                float_string = "%.5f\n" % matprop
-#                fp.write(float_string)
-            else:
-                self.materialproperties[i][j]=matprop
-            j = j + 1
-            if j >= self.num_x:
-                j = 0
-                i = i + 1
-#        fp.close()
+            self.materialproperties.setColumn(mproperty, data)
+        else:
+            self.materialproperties.setProperties(data)
 
     ## 
     #  Plots the horizontal slice either to an image or a file name.
     # 
+    @pycvm_timed
     def plot(self, horizontal_label = None):
 
         if self.upperleftpoint.description == None:
@@ -221,16 +205,16 @@ class ElevationHorizontalSlice:
         # Call the plot object.
         p = Plot(title, "", "", None, 10, 10)
 
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
         BOUNDS = u.makebounds()
         TICKS = u.maketicks()
        
-        m = basemap.Basemap(projection='cyl', llcrnrlat=self.bottomrightpoint.latitude, \
-                            urcrnrlat=self.upperleftpoint.latitude, \
-                            llcrnrlon=self.upperleftpoint.longitude, \
-                            urcrnrlon=self.bottomrightpoint.longitude, \
-                            resolution='f', anchor='C')
+        m = pycvm_basemap(self.meta, projection='cyl', llcrnrlat=self.bottomrightpoint.latitude, \
+                          urcrnrlat=self.upperleftpoint.latitude, \
+                          llcrnrlon=self.upperleftpoint.longitude, \
+                          urcrnrlon=self.bottomrightpoint.longitude, \
+                          resolution='f', anchor='C')
         
         lat_ticks = np.arange(self.bottomrightpoint.latitude, self.upperleftpoint.latitude + 0.1, self.plot_height / 2)
         lon_ticks = np.arange(self.upperleftpoint.longitude, self.bottomrightpoint.longitude + 0.1, self.plot_width / 2)
@@ -246,43 +230,13 @@ class ElevationHorizontalSlice:
         lats = np.linspace(self.bottomrightpoint.latitude, self.upperleftpoint.latitude - self.spacing, self.num_y-1)
     
         # Get the properties.
-        datapoints = np.arange(self.num_x * self.num_y,dtype=np.float32).reshape(self.num_y, self.num_x)
-
-        nancnt=0
-        zerocnt=0
-        negcnt=0
-##        print("total cnt is %d"%(self.num_x * self.num_y))
-        for i in xrange(0, self.num_y):
-            for j in xrange(0, self.num_x):
-                if (self.datafile != None) :
-                    datapoints[i][j] = self.materialproperties[i][j].getProperty(mproperty)
-                elif mproperty != "poisson":
-                    if color_scale == "sd" or color_scale == "sd_r":
-                        datapoints[i][j] = self.materialproperties[i][j].getProperty(mproperty)
-                        if(datapoints[i][j] == -1 ) :
-                            datapoints[i][j]=np.nan
-                            nancnt=nancnt+1
-##to have blank background
-##                        if (datapoints[i][j] == 0) :
-##                            datapoints[i][j]=np.nan
-##                            zerocnt=zerocnt+1
-##
-                    else:
-                        datapoints[i][j] = self.materialproperties[i][j].getProperty(mproperty)
-                        if (datapoints[i][j] == 0) :
-# KEEP 0 as 0                           datapoints[i][j]=np.nan
-                           zerocnt=zerocnt+1
-                        if (datapoints[i][j] < 0) :
-                           negcnt=negcnt+1
-                        if(datapoints[i][j] == -1 ) :
-                           datapoints[i][j]=np.nan
-                           nancnt=nancnt+1
-                else :
-                    datapoints[i][j] = u.poisson(self.materialproperties[i][j].vs, self.materialproperties[i][j].vp) 
-
-#        print(" total number of nancnt is "+str(nancnt))
-#        print(" total number of zerocnt is "+str(zerocnt))
-#        print(" total number of negcnt is "+str(negcnt))
+        if (self.datafile != None) :
+            datapoints = np.array(self.materialproperties.getColumn(mproperty), dtype=np.float32)
+        elif mproperty != "poisson":
+            datapoints = np.array(self.materialproperties.getColumn(mproperty), dtype=np.float32)
+            datapoints[datapoints == -1] = np.nan
+        else :
+            datapoints = u.poissonArray(self.materialproperties.getColumn("vs"), self.materialproperties.getColumn("vp"))
 
         myInt=1000
         if mproperty == "poisson": ## no need to reduce.. should also be using sd or dd
@@ -354,7 +308,8 @@ class ElevationHorizontalSlice:
 
         ## reduce the datapoints before passing in..
 
-        t = m.transform_scalar(newdatapoints, lons, lats, len(lons), len(lats))
+        with pycvm_span("transform"):
+            t = m.transform_scalar(newdatapoints, lons, lats, len(lons), len(lats))
         img = m.imshow(t, cmap=colormap, norm=norm)
 
        
@@ -380,7 +335,8 @@ class ElevationHorizontalSlice:
             cbar.set_label("Poisson(Vs,Vp)")
             
         if self.filename:
-            plt.savefig(self.filename)
+            with pycvm_span("savefig"):
+                plt.savefig(self.filename)
 ## MEI, TODO p.savehtml("show.html")
         else:
             plt.show()
@@ -8,10 +8,7 @@
 #  arguments, or through Python code in the class ElevationProfile.
 
 #  Imports
-from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, plt
-from scipy.interpolate import spline, splprep, splev
-from scipy.interpolate import Rbf, InterpolatedUnivariateSpline
-import scipy.interpolate as interpolate
+from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, plt, pycvm_timed, pycvm_span
 import numpy as np
 import json
 
@@ -112,10 +109,10 @@ class ElevationProfile:
     
     ## 
     #  Generates the elevation profile in a format that is ready to plot.
+    @pycvm_timed
     def getplotvals(self) :
         
-        point_list = []
-        # Generate the list of points.
+        # Generate the list of elevations.
  
         toto=self.toelevation
         if(toto <=0 ):
@@ -125,10 +122,9 @@ class ElevationProfile:
 
         self.meta['elevation'] = []
         for i in np.arange(self.startelevation, toto, self.spacing):
-            point_list.append(Point(self.startingpoint.longitude, self.startingpoint.latitude, elevation=i))
             self.meta['elevation'].append(i)
             
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range,floors=self.floors)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range,floors=self.floors, meta=self.meta)
 
 ###MEI
         if (self.datafile != None) :
@@ -138,7 +134,8 @@ class ElevationProfile:
                 print("ERROR: no matprops plot data.")
                 exit(1)
         else:
-            data = u.query(point_list, self.cvm, elevation=1)
+            data = u.query_profiles([self.startingpoint.longitude], [self.startingpoint.latitude], \
+                                    self.startelevation, self.spacing, len(self.meta['elevation']), self.cvm, elevation=1)
         
         tmp = []
         for matprop in data:
@@ -228,6 +225,7 @@ class ElevationProfile:
             plot.addsubplot().plot(newvslist, yvals, "-", color=vscolor, label=vslabel)
 
 ## attempted to draw a smoothed line, not good
+##            from scipy.interpolate import splprep, splev
 ##            xs=np.array(self.vslist)
 ##            ys=np.array(yvals)
 ##            # spline parameters
@@ -264,6 +262,7 @@ class ElevationProfile:
     ##
     #  Plots a new elevation profile using all the default plotting options.
     #
+    @pycvm_timed
     def plot(self) :
 
         if self.startingpoint.description == None:
@@ -291,4 +290,5 @@ class ElevationProfile:
         if self.filename == None:
             plt.show()
         else:
-            plt.savefig(self.filename)
+            with pycvm_span("savefig"):
+                plt.savefig(self.filename)
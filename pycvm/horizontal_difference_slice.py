@@ -6,8 +6,8 @@
 #
 #  Imports
 from horizontal_slice import HorizontalSlice
-from common import Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Point, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt, pycvm_timed
 
 ##
 #  @class HorizontalDifferencSlice
@@ -47,6 +47,7 @@ class HorizontalDifferenceSlice(HorizontalSlice):
     
     ##
     #  Retrieves the values for this horizontal slice and stores them in the class.
+    @pycvm_timed
     def getplotvals(self, property="vs") :
         
         #  How many y and x values will we need?
@@ -67,9 +68,9 @@ class HorizontalDifferenceSlice(HorizontalSlice):
            self.num_y = int(math.ceil(self.plot_height / self.spacing)) + 1
         
         ## The 2D array of retrieved values.
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
         ### should be 2 datafiles
         if (self.datafile1 == None or self.datafile2 == None) :
@@ -88,8 +89,8 @@ class HorizontalDifferenceSlice(HorizontalSlice):
                     dataA2d = u.import_np_float_array(self.datafile1, self.num_x, self.num_y)
                        ## flatten them
                     dataA1d = dataA2d.reshape([1, self.num_x * self.num_y])
-                       ## turn first one into a list
-                    dataA=dataA1d[0].tolist()
+                       ## take the first row, still backed by the file
+                    dataA=dataA1d[0]
 
             print("\nUsing --> "+self.datafile2)
             dataB=[]
@@ -102,62 +103,37 @@ class HorizontalDifferenceSlice(HorizontalSlice):
                     dataB2d = u.import_np_float_array(self.datafile2, self.num_x, self.num_y)
                        ## flatten them
                     dataB1d = dataB2d.reshape([1, self.num_x * self.num_y])
-                       ## turn first one into a list
-                    dataB=dataB1d[0].tolist()
+                       ## take the first row, still backed by the file
+                    dataB=dataB1d[0]
 
-        i = 0
-        j = 0
+        ## subtract in double precision whatever the datafiles hold
+        dataA = np.asarray(dataA, dtype=np.float64)
+        dataB = np.asarray(dataB, dtype=np.float64)
+        diff = dataA - dataB
+        self.materialproperties.setColumn("vs", diff)
 
-        collect_text=""
-        collect_points=""
-        collect_cnt=0
-        collect_less=0
-        max_less = 0.0
-        max_less_i=0
-        max_less_j=0
-        collect_more=0
-        collect_zero=0
-
-        i_list=""
-        j_list=""
-        A_list=""
-        B_list=""
-        diff_list=""
+        less = diff < 0.0
+        collect_less = int(np.count_nonzero(less))
+        collect_more = int(np.count_nonzero(diff > 0.0))
+        collect_zero = diff.size - collect_less - collect_more
 
-        for idx in range(len(dataA)) :
-            tmp = dataA[idx]-dataB[idx]
-            self.materialproperties[i][j].vs = tmp
-
-            if(tmp < 0.0) :
-               collect_less += 1
-               if(tmp < max_less):
-                 max_less = tmp
-                 max_less_i = i
-                 max_less_j = j
-               if( collect_cnt == 0 ) : 
-                 i_list += "%d" %i
-                 j_list += "%d" %j
-                 A_list += "%0.4f" %dataA[idx] 
-                 B_list += "%0.4f" %dataB[idx] 
-                 diff_list += "%0.4f" %tmp
-               else:
-                 i_list += ",%d" %i
-                 j_list += ",%d" %j
-                 A_list += ",%0.4f" %dataA[idx] 
-                 B_list += ",%0.4f" %dataB[idx] 
-                 diff_list += ",%0.4f" %tmp
-               collect_cnt += 1 
-            elif ( tmp > 0.0 ) :
-               collect_more += 1
-            else :
-               collect_zero += 1
-
-            j = j + 1
-            if j >= self.num_x:
-                j = 0
-                i = i + 1
+        max_less = 0.0
+        max_less_i = 0
+        max_less_j = 0
+        if collect_less > 0 :
+            idx = int(np.argmin(np.where(less, diff, 0.0)))
+            max_less = diff[idx]
+            max_less_i = idx // self.num_x
+            max_less_j = idx % self.num_x
 
         if(self.debug != None) :
+          less_idx = np.flatnonzero(less)
+          i_list = ",".join(["%d"] * len(less_idx)) % tuple((less_idx // self.num_x).tolist())
+          j_list = ",".join(["%d"] * len(less_idx)) % tuple((less_idx % self.num_x).tolist())
+          A_list = ",".join(["%0.4f"] * len(less_idx)) % tuple(dataA[less_idx].tolist())
+          B_list = ",".join(["%0.4f"] * len(less_idx)) % tuple(dataB[less_idx].tolist())
+          diff_list = ",".join(["%0.4f"] * len(less_idx)) % tuple(diff[less_idx].tolist())
+
           collect_text= "{ \"max_j\": %d, \"max_i\": %d, \"max_less\":%0.5f, \"max_less_i\":%d, \"max_less_j\":%d, \"less\":%d, \"more\":%d, \"zero\":%d,\n" % (self.num_x, self.num_y, max_less, max_less_i, max_less_j, collect_less, collect_more, collect_zero)
           collect_text += " \"A\":[ %s ], \"B\": [ %s ], \"D\": [ %s ], \n" % (A_list,B_list, diff_list)
           collect_text += " \"i\":[ %s ], \"j\": [ %s ] }\n" % (i_list,j_list)
@@ -172,6 +148,7 @@ class HorizontalDifferenceSlice(HorizontalSlice):
     #  @param filename The location to which the plot should be saved. Optional.
     #  @param title The title of the plot to use. Optional.
     #  @param color_scale The color scale to use for the plot. Optional.
+    @pycvm_timed
     def plot(self) :
  
         if self.upperleftpoint.description == None:
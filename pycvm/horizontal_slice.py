@@ -8,10 +8,9 @@
 #  arguments, or through Python code in the class HorizontalSlice.
 
 #  Imports
-from mpl_toolkits import basemap
-from mpl_toolkits.basemap import cm
-from common import Plot, Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Plot, Point, PointArray, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   PLOT_PROPERTIES, math, pycvm_cmapDiscretize, pycvm_basemap, cm, mcolors, basemap, np, plt, \
+                   pycvm_timed, pycvm_span
 
 ##
 #  @class HorizontalSlice
@@ -121,10 +120,8 @@ class HorizontalSlice:
            self.title = None;
     
     ##
-    #  Retrieves the values for this horizontal slice and stores them in the class.
-    def getplotvals(self, mproperty="vs"):
-        
-        #  How many y and x values will we need?
+    #  Works out the size of the plot and how many x and y values it needs.
+    def getgridsize(self):
         
         ## The plot width - needs to be stored as property for the plot function to work.
         self.plot_width  = self.bottomrightpoint.longitude - self.upperleftpoint.longitude
@@ -141,13 +138,40 @@ class HorizontalSlice:
            self.num_y = int(self.ysteps)
         else :
            self.num_y = int(math.ceil(self.plot_height / self.spacing)) + 1
+
+    ##
+    #  Retrieves the values for this horizontal slice and stores them in the class.
+    @pycvm_timed
+    def getplotvals(self, mproperty="vs"):
+        
+        #  How many y and x values will we need?
+        self.getgridsize()
         
         ## The 2D array of retrieved material properties.
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors, meta=self.meta)
+
+        ## The properties the datafile provides, None when they are queried.
+        self.databands = None
 
 ### MEI
+        if (self.datafile != None) and self.datafile.endswith(".tiles") :
+            ## tile store, only the tiles under this plot's region are loaded
+            print("\nUsing --> "+self.datafile)
+            store = u.import_tiles(self.datafile)
+            rows, cols = store.window(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                      self.spacing, self.num_x, self.num_y)
+            self.setbands(u, store.read(rows, cols))
+            print("Read %d of the tiles" % store.tiles_read)
+            return
+
+        if (self.datafile != None) and self.datafile.endswith(".npz") :
+            ## multi-band file, every property it holds is loaded
+            print("\nUsing --> "+self.datafile)
+            self.setbands(u, u.import_bands(self.datafile))
+            return
+
         if (self.datafile != None) :
             data=[]
             if self.datafile.rfind(".binary") != -1 :
@@ -159,42 +183,141 @@ class HorizontalSlice:
                     data2d = u.import_np_float_array(self.datafile, self.num_x, self.num_y)
                 ## flatten them
                     data1d = data2d.reshape([1, self.num_x * self.num_y])
-                ## turn first one into a list
-                    data=data1d[0].tolist()
+                ## take the first row, still backed by the file
+                    data=data1d[0]
 
             print("\nUsing --> "+self.datafile) 
         else: 
             #  Generate a list of points to pass to UCVM.
-            ucvmpoints = []
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):
-                    ucvmpoints.append(Point(self.upperleftpoint.longitude + x * self.spacing, \
-                                            self.bottomrightpoint.latitude + y * self.spacing, \
-                                            self.upperleftpoint.depth))
-            data = u.query(ucvmpoints, self.cvm)
-
-        i = 0
-        j = 0
-        isfloat = 0
-#        fp=open("raw_data","w")
+            ucvmpoints = PointArray.grid(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                         self.spacing, self.num_x, self.num_y, self.upperleftpoint.depth)
+            data = u.query_columns(ucvmpoints, self.cvm)
+
         if (self.datafile != None) :
-            isfloat = 1
-        for matprop in data:
-            if isfloat:
-                self.materialproperties[i][j].setProperty(mproperty,matprop)
-#                float_string = "%.5f\n" % matprop
-#                fp.write(float_string)
-            else:
-                self.materialproperties[i][j]=matprop
-            j = j + 1
-            if j >= self.num_x:
-                j = 0
-                i = i + 1
-#        fp.close()
+            self.materialproperties.setColumn(mproperty, data)
+            self.databands = [mproperty]
+        else:
+            self.materialproperties.setProperties(data)
+
+    ##
+    #  Sets the grid from the bands of a multi-band datafile. Poisson is worked
+    #  out from vs and vp when the file does not hold it.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to work out poisson with.
+    #  @param bands The arrays read, by property name.
+    def setbands(self, u, bands):
+        for name in bands :
+            self.materialproperties.setColumn(name, bands[name])
+        self.databands = list(bands)
+        if "poisson" not in bands and "vs" in bands and "vp" in bands :
+            self.materialproperties.setColumn("poisson", u.poissonArray(bands["vs"], bands["vp"]))
+            self.databands.append("poisson")
+
+    ##
+    #  Records the grid and the range of the plotted values in the metadata.
+    #
+    #  @param datapoints The plotted values.
+    #  @param lons The longitudes of the plot.
+    #  @param lats The latitudes of the plot.
+    #  @param mproperty The property plotted, when several are. The range is then
+    #                   recorded by property, e.g. meta['max']['vp']. Optional.
+    def recordgrid(self, datapoints, lons, lats, mproperty = None):
+        self.meta['num_x'] = self.num_x
+        self.meta['num_y'] = self.num_y
+        self.meta['datapoints'] = datapoints.size
+        if mproperty == None :
+            self.meta['max'] = float(self.max_val)
+            self.meta['min'] = float(self.min_val)
+            self.meta['mean'] = float(self.mean_val)
+        else :
+            for key, value in [('max', self.max_val), ('min', self.min_val), ('mean', self.mean_val)] :
+                if not isinstance(self.meta.get(key), dict) :
+                    self.meta[key] = {}
+                self.meta[key][mproperty] = float(value)
+        ### lons and lats are off by one from earlier composition for drawing within edges, 
+        ### so need to add in the last lon2 and lat2
+        self.meta['lon_list']=lons.tolist()
+        self.meta['lon_list'].append(self.meta['lon2'])
+        self.meta['lat_list']=lats.tolist()
+        self.meta['lat_list'].append(self.meta['lat2'])
+
+    ##
+    #  Records the grid in the metadata and, when plotting to a file, saves the
+    #  metadata and the plotted values next to it.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to export with.
+    #  @param datapoints The plotted values.
+    #  @param lons The longitudes of the plot.
+    #  @param lats The latitudes of the plot.
+    def exportdata(self, u, datapoints, lons, lats):
+        self.recordgrid(datapoints, lons, lats)
+        if self.filename:
+            u.export_metadata(self.meta,self.filename)
+            u.export_np_float_array(datapoints,self.filename)
+            self.exporttiles(u, ["vs", "vp", "density"])
+
+    ##
+    #  Saves every plotted property into one multi-band file, <outfile>_data.npz,
+    #  with the metadata in <outfile>_meta.json, including the grid and the
+    #  range of each property. The file can be given back as the datafile to
+    #  replot any of the properties without a new query.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to export with.
+    #  @param mproperties The properties to save.
+    def exportbands(self, u, mproperties):
+        self.meta['bands'] = mproperties
+        u.export_metadata(self.meta,self.filename)
+        u.export_bands(self.getbands(u, mproperties),self.filename)
+        self.exporttiles(u, mproperties)
+
+    ##
+    #  Returns the given properties of the grid, by name.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to work out poisson with.
+    #  @param mproperties The properties to return.
+    def getbands(self, u, mproperties):
+        bands = {}
+        for mproperty in mproperties :
+            if mproperty == "poisson" :
+                bands[mproperty] = u.poissonArray(self.materialproperties.getColumn("vs"), self.materialproperties.getColumn("vp"))
+            else :
+                bands[mproperty] = self.materialproperties.getColumn(mproperty)
+        return bands
+
+    ##
+    #  Saves properties into the tile store <outfile>_data.tiles, if a tile
+    #  size is set. Giving the store back as the datafile replots the whole
+    #  region, or any part of it on the same grid, reading only the tiles
+    #  under that part.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to export with.
+    #  @param mproperties The properties to save.
+    def exporttiles(self, u, mproperties):
+        if u.tile_size == None :
+            return
+        bands = self.getbands(u, mproperties)
+        for name in bands :
+            bands[name] = np.asarray(bands[name]).reshape(self.num_y, self.num_x)
+        u.export_tiles(bands, self.filename, {"lon0" : self.upperleftpoint.longitude, \
+                                              "lat0" : self.bottomrightpoint.latitude, \
+                                              "spacing" : self.spacing})
+
+    ##
+    #  Returns the properties to plot from meta['data_type'], one of vs, vp,
+    #  density and poisson, a comma separated list of them, or all.
+    def getproperties(self):
+        if 'data_type' not in self.meta :
+            return ["vs"]
+        if self.meta['data_type'] == "all" :
+            return list(PLOT_PROPERTIES)
+        return self.meta['data_type'].split(",")
 
     ## 
-    #  Plots the horizontal slice either to an image or a file name.
+    #  Plots the horizontal slice either to an image or a file name. When
+    #  several properties are asked for, they all come from one query and
+    #  the property name is added to each file name, e.g. image_vp.png.
     # 
+    @pycvm_timed
     def plot(self, horizontal_label = None):
 
         if self.upperleftpoint.description == None:
@@ -202,20 +325,7 @@ class HorizontalSlice:
         else:
             location_text = self.upperleftpoint.description + " "
 
-        if 'data_type' in self.meta :
-           mproperty = self.meta['data_type']
-        else:
-           mproperty = "vs"
-
-        scale_gate = None
-        if 'color' in self.meta :
-           color_scale = self.meta['color']
-
-        if 'gate' in self.meta :
-           scale_gate = float(self.meta['gate'])
-        
-        if color_scale == "b" and scale_gate is None:
-           scale_gate=2.5
+        mproperties = self.getproperties()
 
         # Gets the better CVM description if it exists.
         try:
@@ -229,18 +339,119 @@ class HorizontalSlice:
             title = "%s%s Horizontal Slice at %.0fm" % (location_text, cvmdesc, self.upperleftpoint.depth)
             self.meta['title'] = title
 
-        self.getplotvals(mproperty)
+        if self.datafile != None and len(mproperties) > 1 and \
+           not (self.datafile.endswith(".npz") or self.datafile.endswith(".tiles")) :
+            print("ERROR: %s holds one property, plotting %s needs a _data.npz or _data.tiles file." % \
+                  (self.datafile, ",".join(mproperties)))
+            exit(1)
+
+        self.getplotvals(mproperties[0])
+
+        databands = getattr(self, 'databands', None)
+        if databands != None :
+            missing = [mproperty for mproperty in mproperties if mproperty not in databands]
+            if len(missing) > 0 :
+                print("ERROR: %s does not hold %s." % (self.datafile, ",".join(missing)))
+                exit(1)
+
+        if len(mproperties) == 1 :
+            self.plotproperty(mproperties[0], title, horizontal_label)
+            return
+
+        filename = self.filename
+        for mproperty in mproperties :
+            if filename :
+                k = filename.rfind(".")
+                if k == -1 :
+                    k = len(filename)
+                self.filename = filename[:k] + "_" + mproperty + filename[k:]
+            self.plotproperty(mproperty, title + " (" + mproperty + ")", horizontal_label, False)
+            plt.close('all')
+        self.filename = filename
+
+        if self.datafile == None and self.filename :
+            self.exportbands(UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta), mproperties)
+
+    ##
+    #  Returns the values of one property as plotted, from the retrieved grid:
+    #  cells without data are NaN, and velocities and densities are scaled to
+    #  km/s and g/cm^3. Poisson is not scaled and gets a color scale over its
+    #  own range.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to work out poisson with.
+    #  @param mproperty The property to plot.
+    #  @param color_scale The color scale asked for.
+    #  @return The values, the scaled values and the color scale to use.
+    def getdatapoints(self, u, mproperty, color_scale):
+        nancnt=0
+        zerocnt=0
+        negcnt=0
+        if (self.datafile != None) :
+            datapoints = np.array(self.materialproperties.getColumn(mproperty), dtype=np.float32)
+        elif mproperty != "poisson":
+            datapoints = np.array(self.materialproperties.getColumn(mproperty), dtype=np.float32)
+            nodata = (datapoints == -1)
+            if color_scale != "sd" and color_scale != "sd_r":
+## KEEP 0 as 0
+                zerocnt = int(np.count_nonzero(datapoints == 0))
+                negcnt = int(np.count_nonzero(datapoints < 0))
+            nancnt = int(np.count_nonzero(nodata))
+            datapoints[nodata] = np.nan
+        else :
+            datapoints = u.poissonArray(self.materialproperties.getColumn("vs"), self.materialproperties.getColumn("vp"))
+
+#        print(" total number of nancnt is "+str(nancnt))
+#        print(" total number of zerocnt is "+str(zerocnt))
+#        print(" total number of negcnt is "+str(negcnt))
+
+        myInt=1000
+        if mproperty == "poisson": ## no need to reduce.. should also be using sd or dd
+           myInt=1
+           if color_scale == "s" :
+               color_scale = "sd"
+           elif color_scale == "d" :
+               color_scale = "dd"
+
+        newdatapoints=datapoints/myInt 
+
+        self.max_val=np.nanmax(datapoints)
+        self.min_val=np.nanmin(datapoints)
+        self.mean_val=np.mean(datapoints)
+
+        ## The number of cells without data, with a value of 0 and below 0.
+        self.counts = (nancnt, zerocnt, negcnt)
+        return datapoints, newdatapoints, color_scale
+
+    ##
+    #  Plots one property of the retrieved values.
+    #
+    #  @param mproperty The property to plot.
+    #  @param title The title of the plot.
+    #  @param horizontal_label The label of the color bar. Optional.
+    #  @param export If true, the plotted values are saved with the plot. Optional.
+    @pycvm_timed
+    def plotproperty(self, mproperty, title, horizontal_label = None, export = True):
+
+        scale_gate = None
+        if 'color' in self.meta :
+           color_scale = self.meta['color']
+
+        if 'gate' in self.meta :
+           scale_gate = float(self.meta['gate'])
+        
+        if color_scale == "b" and scale_gate is None:
+           scale_gate=2.5
 
         # Call the plot object.
         p = Plot(title, "", "", None, 10, 10)
 
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
-        m = basemap.Basemap(projection='cyl', llcrnrlat=self.bottomrightpoint.latitude, \
-                            urcrnrlat=self.upperleftpoint.latitude, \
-                            llcrnrlon=self.upperleftpoint.longitude, \
-                            urcrnrlon=self.bottomrightpoint.longitude, \
-                            resolution='f', anchor='C')
+        m = pycvm_basemap(self.meta, projection='cyl', llcrnrlat=self.bottomrightpoint.latitude, \
+                          urcrnrlat=self.upperleftpoint.latitude, \
+                          llcrnrlon=self.upperleftpoint.longitude, \
+                          urcrnrlon=self.bottomrightpoint.longitude, \
+                          resolution='f', anchor='C')
         
         lat_ticks = np.arange(self.bottomrightpoint.latitude, self.upperleftpoint.latitude + 0.1, self.plot_height / 2)
         lon_ticks = np.arange(self.upperleftpoint.longitude, self.bottomrightpoint.longitude + 0.1, self.plot_width / 2)
@@ -256,62 +467,11 @@ class HorizontalSlice:
         lats = np.linspace(self.bottomrightpoint.latitude, self.upperleftpoint.latitude - self.spacing, self.num_y-1)
     
         # Get the properties.
-        datapoints = np.arange(self.num_x * self.num_y,dtype=np.float32).reshape(self.num_y, self.num_x)
-
-        nancnt=0
-        zerocnt=0
-        negcnt=0
-##        print("total cnt is %d"%(self.num_x * self.num_y))
-        for i in range(0, self.num_y):
-            for j in range(0, self.num_x):
-                if (self.datafile != None) :
-                    datapoints[i][j] = self.materialproperties[i][j].getProperty(mproperty)
-                elif mproperty != "poisson":
-                    if color_scale == "sd" or color_scale == "sd_r":
-                        datapoints[i][j] = self.materialproperties[i][j].getProperty(mproperty)
-                        if(datapoints[i][j] == -1 ) :
-                            datapoints[i][j]=np.nan
-                            nancnt=nancnt+1
-##to have blank background
-##                        if (datapoints[i][j] == 0) :
-##                            datapoints[i][j]=np.nan
-##                            zerocnt=zerocnt+1
-##
-                    else:
-                        datapoints[i][j] = self.materialproperties[i][j].getProperty(mproperty)
-                        if (datapoints[i][j] == 0) :
-# KEEP 0 as 0                           datapoints[i][j]=np.nan
-                           zerocnt=zerocnt+1
-                        if (datapoints[i][j] < 0) :
-                           negcnt=negcnt+1
-                        if(datapoints[i][j] == -1 ) :
-                           datapoints[i][j]=np.nan
-                           nancnt=nancnt+1
-                else :
-                    datapoints[i][j] = u.poisson(self.materialproperties[i][j].vs, self.materialproperties[i][j].vp) 
-
-#        print(" total number of nancnt is "+str(nancnt))
-#        print(" total number of zerocnt is "+str(zerocnt))
-#        print(" total number of negcnt is "+str(negcnt))
-
-        myInt=1000
-        if mproperty == "poisson": ## no need to reduce.. should also be using sd or dd
-           myInt=1
-           if color_scale == "s" :
-               color_scale = "sd"
-           elif color_scale == "d" :
-               color_scale = "dd"
-
-        newdatapoints=datapoints/myInt 
-
+        datapoints, newdatapoints, color_scale = self.getdatapoints(u, mproperty, color_scale)
         newmax_val=np.nanmax(newdatapoints)
         newmin_val=np.nanmin(newdatapoints)
         newmean_val=np.mean(newdatapoints)
 
-        self.max_val=np.nanmax(datapoints)
-        self.min_val=np.nanmin(datapoints)
-        self.mean_val=np.mean(datapoints)
-
         if self.scalemin != None and self.scalemax != None:
             BOUNDS= u.makebounds(float(self.scalemin), float(self.scalemax), 5)
             TICKS = u.maketicks(float(self.scalemin), float(self.scalemax), 5)
@@ -375,27 +535,16 @@ class HorizontalSlice:
 ##            colormap = pycvm_cmapDiscretize(basemap.cm.GMT_globe, len(BOUNDS) - 1)
              
 
-        if( self.datafile == None ):
-          self.meta['num_x'] = self.num_x
-          self.meta['num_y'] = self.num_y
-          self.meta['datapoints'] = datapoints.size
-          self.meta['max'] = np.asscalar(self.max_val)
-          self.meta['min'] = np.asscalar(self.min_val)
-          self.meta['mean'] = np.asscalar(self.mean_val)
-          ### lons and lats are off by one from earlier composition for drawing within edges, 
-          ### so need to add in the last lon2 and lat2
-          self.meta['lon_list']=lons.tolist()
-          self.meta['lon_list'].append(self.meta['lon2'])
-          self.meta['lat_list']=lats.tolist()
-          self.meta['lat_list'].append(self.meta['lat2'])
-          if self.filename:
-              u.export_metadata(self.meta,self.filename)
-              u.export_np_float_array(datapoints,self.filename)
-                    
+        if( self.datafile == None and export ):
+          self.exportdata(u, datapoints, lons, lats)
+        elif( self.datafile == None ):
+          self.recordgrid(datapoints, lons, lats, mproperty)
+
 
         ## reduce the datapoints before passing in..
 
-        t = m.transform_scalar(newdatapoints, lons, lats, len(lons), len(lats))
+        with pycvm_span("transform"):
+            t = m.transform_scalar(newdatapoints, lons, lats, len(lons), len(lats))
         img = m.imshow(t, cmap=colormap, norm=norm)
 
        
@@ -423,7 +572,8 @@ class HorizontalSlice:
             cbar.set_label("Poisson(Vs,Vp)")
             
         if self.filename:
-            plt.savefig(self.filename)
+            with pycvm_span("savefig"):
+                plt.savefig(self.filename)
 ## MEI, TODO p.savehtml("show.html")
         else:
             plt.show()
@@ -10,8 +10,8 @@
 #
 #  Imports
 from horizontal_slice import HorizontalSlice
-from common import Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Point, PointArray, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt, pycvm_timed
 
 ##
 #  @class MapGridHorizontalSlice
@@ -36,6 +36,7 @@ class MapGridHorizontalSlice(HorizontalSlice):
         #  Initializes the base class which is a horizontal slice.
         HorizontalSlice.__init__(self, upperleftpoint, bottomrightpoint, meta)
     
+    @pycvm_timed
     def getplotvals(self):
 
         ## The plot width - needs to be stored as property for the plot function to work.
@@ -54,17 +55,13 @@ class MapGridHorizontalSlice(HorizontalSlice):
            self.num_y = int(math.ceil(self.plot_height / self.spacing)) + 1
         
         ## The 2D array of retrieved material properties
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
         #  Generate a list of points to pass to UCVM.
-        ucvmpoints = []
-        for y in range(0, self.num_y):
-            for x in range(0, self.num_x):
-                ucvmpoints.append(Point(self.upperleftpoint.longitude + x * self.spacing, \
-                                        self.bottomrightpoint.latitude + y * self.spacing, \
-                                        self.upperleftpoint.depth))
+        ucvmpoints = PointArray.grid(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                     self.spacing, self.num_x, self.num_y, self.upperleftpoint.depth)
 
         self.ucvm_query_results = u.map_grid(ucvmpoints, self.cvm)
  
@@ -0,0 +1,216 @@
+##
+#  @file volume_slice.py
+#  @brief Gets horizontal slices at many depths in one query and plots any of them.
+#  @version
+#
+#  Queries a (depth, lat, lon) block of material properties in one batched
+#  pass, keeps it as a 3D grid saved with a single metadata sidecar, and
+#  plots horizontal slices at every depth, or a subset, from that grid.
+
+#  Imports
+from horizontal_slice import HorizontalSlice
+from common import Point, PointArray, MaterialGrid, UCVM, pycvm_load_npy, np, plt, pycvm_timed
+
+##
+#  @class VolumeSlice
+#  @brief Gets a stack of @link horizontal_slice.HorizontalSlice horizontal slices @endlink
+#         over the same region at several depths.
+#
+#  The whole volume is queried once, instead of once per depth, and each depth
+#  is plotted from it like a horizontal slice. The map background is made once
+#  for the region and shared by all the depths.
+class VolumeSlice(HorizontalSlice):
+
+    ##
+    #  Initializes the volume. The depths are taken from the depths parameter,
+    #  meta['depths'] ("0,500,1000"), or the sidecar of meta['datafile'].
+    #
+    #  @param upperleftpoint The @link common.Point upper-left point @endlink of the region.
+    #  @param bottomrightpoint The @link common.Point bottom-right point @endlink of the region.
+    #  @param depths The depths in meters, as a list. Optional.
+    #  @param meta The metadata to hold configuration values
+    #
+    def __init__(self, upperleftpoint, bottomrightpoint, depths = None, meta={}):
+
+        HorizontalSlice.__init__(self, upperleftpoint, bottomrightpoint, meta)
+
+        if depths == None and 'depths' in self.meta:
+            depths = str(self.meta['depths']).split(",")
+        if depths == None and self.datafile != None:
+            depths = UCVM(install_dir=self.installdir, config_file=self.configfile, \
+                          meta=self.meta).import_data_meta(self.datafile).get('depths')
+        if depths == None or len(depths) == 0:
+            raise ValueError("A volume slice needs at least one depth.")
+
+        ## The depths of the slices in meters.
+        self.depths = [float(depth) for depth in depths]
+
+    ##
+    #  Retrieves the values for the whole volume and stores them in the class,
+    #  from the datafile if one is given or from one UCVM query otherwise.
+    @pycvm_timed
+    def getplotvals(self, mproperty="vs"):
+
+        self.getgridsize()
+
+        ## The number of depths.
+        self.num_z = len(self.depths)
+
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, z_range=self.z_range, floors=self.floors, meta=self.meta)
+
+        if self.datafile != None and self.datafile.endswith(".tiles"):
+            print("\nUsing --> "+self.datafile)
+            store = u.import_tiles(self.datafile)
+            saved = [float(depth) for depth in store.attrs().get('depths', [])]
+            missing = [depth for depth in self.depths if depth not in saved]
+            if len(missing) > 0:
+                print("ERROR: %s does not hold the depths %s." % (self.datafile, missing))
+                exit(1)
+            rows, cols = store.window(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                      self.spacing, self.num_x, self.num_y)
+            data = store.read(rows, cols)["volume"]
+            print("Read %d of the tiles" % store.tiles_read)
+            self.volume = MaterialGrid(data=data[[saved.index(depth) for depth in self.depths]])
+            return
+
+        if self.datafile != None:
+            print("\nUsing --> "+self.datafile)
+            data = pycvm_load_npy(self.datafile)
+            if data.shape != (self.num_z, self.num_y, self.num_x):
+                print("ERROR: %s does not hold a %d x %d x %d volume." % (self.datafile, self.num_z, self.num_y, self.num_x))
+                exit(1)
+            ## The 3D (depth, y, x) grid of retrieved material properties.
+            self.volume = MaterialGrid(data=data)
+            return
+
+        grid = PointArray.grid(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                               self.spacing, self.num_x, self.num_y)
+        ucvmpoints = PointArray(np.tile(grid.longitude, self.num_z), np.tile(grid.latitude, self.num_z), \
+                                np.repeat(self.depths, len(grid)))
+        self.volume = MaterialGrid((self.num_z, self.num_y, self.num_x))
+        self.volume.setProperties(u.query_columns(ucvmpoints, self.cvm))
+
+        if self.filename:
+            self.export(u)
+
+    ##
+    #  Saves the volume as one NumPy file, <outfile>_data.bin, with the
+    #  region, grid size and depths in <outfile>_meta.json. If a tile size is
+    #  set, the volume is also saved to <outfile>_data.tiles, from which a
+    #  replot reads only the tiles of its region and depths.
+    #
+    #  @param u The @link common.UCVM UCVM @endlink object to export with.
+    def export(self, u):
+        meta = dict(self.meta)
+        meta['num_x'] = self.num_x
+        meta['num_y'] = self.num_y
+        meta['num_z'] = self.num_z
+        meta['depths'] = self.depths
+        u.export_metadata(meta, self.filename)
+        u.export_np_float_array(self.volume.data, self.filename)
+        if u.tile_size != None:
+            u.export_tiles({"volume" : self.volume.data}, self.filename, \
+                           {"lon0" : self.upperleftpoint.longitude, "lat0" : self.bottomrightpoint.latitude, \
+                            "spacing" : self.spacing, "depths" : self.depths})
+
+    ##
+    #  Returns the horizontal slice at one depth of the volume.
+    #
+    #  @param index The index of the depth in self.depths.
+    #  @param meta The metadata of the slice, e.g. its own outfile and colors. Optional.
+    #  @return A @link horizontal_slice.HorizontalSlice HorizontalSlice @endlink reading from the volume.
+    def slice(self, index, meta = None):
+        return VolumeDepthSlice(self, index, meta)
+
+    ##
+    #  Plots the horizontal slice at each of the given depths. With an outfile
+    #  of image.png, the depth d is saved to image_<d>m.png.
+    #
+    #  @param depths The depths to plot, all of them if not given. Optional.
+    @pycvm_timed
+    def plot(self, depths = None):
+
+        try:
+            self.volume
+        except AttributeError:
+            self.getplotvals()
+
+        if depths == None:
+            depths = self.depths
+        for depth in depths:
+            if float(depth) not in self.depths:
+                print("ERROR: depth %s is not in the volume." % depth)
+                exit(1)
+            self.slice(self.depths.index(float(depth))).plot()
+            plt.close('all')
+
+##
+#  @class VolumeDepthSlice
+#  @brief The @link horizontal_slice.HorizontalSlice horizontal slice @endlink at one
+#         depth of a @link VolumeSlice VolumeSlice @endlink.
+class VolumeDepthSlice(HorizontalSlice):
+
+    ##
+    #  Initializes the slice from the volume.
+    #
+    #  @param volume The @link VolumeSlice VolumeSlice @endlink, with its values retrieved.
+    #  @param index The index of the depth in volume.depths.
+    #  @param meta The metadata of this slice, made from the volume's if not given. Optional.
+    def __init__(self, volume, index, meta = None):
+
+        ## True when the slice has its own metadata, it then saves its values
+        ## like a horizontal slice does.
+        self.standalone = meta != None
+
+        depth = volume.depths[index]
+        if meta == None:
+            meta = dict(volume.meta)
+            meta.pop('title', None)
+            if volume.title != None:
+                meta['title'] = "%s at %.0fm" % (volume.title, depth)
+            if volume.filename != None:
+                k = volume.filename.rfind(".")
+                if k == -1:
+                    k = len(volume.filename)
+                meta['outfile'] = "%s_%.0fm%s" % (volume.filename[:k], depth, volume.filename[k:])
+        else:
+            meta = dict(meta)
+        meta.pop('datafile', None)
+
+        HorizontalSlice.__init__(self, \
+            Point(volume.upperleftpoint.longitude, volume.upperleftpoint.latitude, depth, \
+                  description = volume.upperleftpoint.description), \
+            Point(volume.bottomrightpoint.longitude, volume.bottomrightpoint.latitude, depth), meta)
+
+        ## The volume this slice is taken from.
+        self.volume = volume
+        ## The index of the depth in the volume.
+        self.index = index
+
+    ##
+    #  Takes the values of this depth from the volume.
+    @pycvm_timed
+    def getplotvals(self, mproperty="vs"):
+        self.getgridsize()
+        self.materialproperties = self.volume.volume[self.index]
+
+    ##
+    #  The volume is saved as a whole by @link VolumeSlice::export VolumeSlice.export @endlink,
+    #  so only the metadata is recorded here unless the slice is standalone.
+    def exportdata(self, u, datapoints, lons, lats):
+        if self.standalone:
+            HorizontalSlice.exportdata(self, u, datapoints, lons, lats)
+            return
+        filename = self.filename
+        self.filename = None
+        HorizontalSlice.exportdata(self, u, datapoints, lons, lats)
+        self.filename = filename
+
+    ##
+    #  The volume already holds every property, so nothing is saved per depth
+    #  unless the slice is standalone.
+    def exportbands(self, u, mproperties):
+        if self.standalone:
+            HorizontalSlice.exportbands(self, u, mproperties)
+            return
+        self.meta['bands'] = mproperties
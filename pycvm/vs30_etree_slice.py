@@ -10,8 +10,8 @@
 
 #  Imports
 from horizontal_slice import HorizontalSlice
-from common import Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Point, PointArray, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt, pycvm_timed
 
 ##
 #  @class Vs30EtreeSlice
@@ -35,6 +35,7 @@ class Vs30EtreeSlice(HorizontalSlice):
     
     ##
     #  Retrieves the values for this Vs30 slice and stores them in the class.
+    @pycvm_timed
     def getplotvals(self, property="vs") :
         
         #  How many y and x values will we need?
@@ -55,9 +56,9 @@ class Vs30EtreeSlice(HorizontalSlice):
            self.num_y = int(math.ceil(self.plot_height / self.spacing)) + 1
         
         ## The 2D array of retrieved Vs30 values.
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
         ###MEI
         if (self.datafile != None) :
@@ -66,27 +67,15 @@ class Vs30EtreeSlice(HorizontalSlice):
             data2d = u.import_np_float_array(self.datafile, self.num_x, self.num_y)
             ## flatten them
             data1d = data2d.reshape([1, self.num_x * self.num_y])
-            ## turn first one into a list
-            data=data1d[0].tolist()
+            ## take the first row, still backed by the file
+            data=data1d[0]
         else:
             #  Generate a list of points to pass to UCVM.
-            ucvmpoints = []
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):
-                    ucvmpoints.append(Point(self.upperleftpoint.longitude + x * self.spacing, \
-                                            self.bottomrightpoint.latitude + y * self.spacing, \
-                                            self.upperleftpoint.depth))
+            ucvmpoints = PointArray.grid(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                         self.spacing, self.num_x, self.num_y, self.upperleftpoint.depth)
             data = u.vs30_etree(ucvmpoints, self.cvm)
         
-        i = 0
-        j = 0
-        
-        for matprop in data:
-            self.materialproperties[i][j].vs = matprop
-            j = j + 1
-            if j >= self.num_x:
-                j = 0
-                i = i + 1
+        self.materialproperties.setColumn("vs", data)
 
     ##
     #  Plots the Vs30 data as a horizontal slice. This code is very similar to the
@@ -95,6 +84,7 @@ class Vs30EtreeSlice(HorizontalSlice):
     #  @param filename The location to which the plot should be saved. Optional.
     #  @param title The title of the plot to use. Optional.
     #  @param color_scale The color scale to use for the plot. Optional.
+    @pycvm_timed
     def plot(self) :
  
         if self.upperleftpoint.description == None:
@@ -9,9 +9,11 @@
 #  @link horizontal_slice.HorizontalSlice HorizontalSlice @endlink.
 
 #  Imports
+import os
+
 from horizontal_slice import HorizontalSlice
-from common import Point, MaterialProperties, UCVM, UCVM_CVMS, \
-                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt
+from common import Point, PointArray, MaterialProperties, MaterialGrid, UCVM, UCVM_CVMS, \
+                   math, pycvm_cmapDiscretize, cm, mcolors, basemap, np, plt, pycvm_timed
 
 ##
 #  @class Vs30Slice
@@ -30,11 +32,32 @@ class Vs30Slice(HorizontalSlice):
     #  
     def __init__(self, upperleftpoint, bottomrightpoint, meta={}):
 
+        ## How Vs30 is found: "query" runs vs30_query, "columns" integrates the
+        ## travel time through the queried top 30m, see UCVM.vs30_columns.
+        if 'vs30_engine' in meta :
+            self.engine = meta['vs30_engine']
+        else:
+            self.engine = os.environ.get('UCVM_VS30_ENGINE', 'query')
+        if self.engine not in ("query", "columns") :
+            print("ERROR: Vs30 engine must be query or columns.")
+            exit(1)
+
+        ## The thickness of the sampled layers, in meters, for the columns engine.
+        self.interval = 1.0
+        if 'interval' in meta :
+            self.interval = float(meta['interval'])
+
+        if self.engine == "columns" :
+            print("WARNING: the columns Vs30 engine queries %d levels under every point, it is much" \
+                  % max(1, int(round(30.0 / self.interval))))
+            print("         slower than vs30_query unless the columns are already in the column store.")
+
         #  Initializes the base class which is a horizontal slice.
         HorizontalSlice.__init__(self, upperleftpoint, bottomrightpoint, meta)
     
     ##
     #  Retrieves the values for this Vs30 slice and stores them in the class.
+    @pycvm_timed
     def getplotvals(self, mproperty="vs"):
         
         #  How many y and x values will we need?
@@ -55,9 +78,9 @@ class Vs30Slice(HorizontalSlice):
            self.num_y = int(math.ceil(self.plot_height / self.spacing)) + 1
         
         ## The 2D array of retrieved Vs30 values.
-        self.materialproperties = [[MaterialProperties(-1, -1, -1) for x in range(self.num_x)] for x in range(self.num_y)] 
+        self.materialproperties = MaterialGrid((self.num_y, self.num_x)) 
         
-        u = UCVM(install_dir=self.installdir, config_file=self.configfile)
+        u = UCVM(install_dir=self.installdir, config_file=self.configfile, meta=self.meta)
 
         ###MEI
         if (self.datafile != None) :
@@ -66,27 +89,18 @@ class Vs30Slice(HorizontalSlice):
             data2d = u.import_np_float_array(self.datafile, self.num_x, self.num_y)
             ## flatten them
             data1d = data2d.reshape([1, self.num_x * self.num_y])
-            ## turn first one into a list
-            data=data1d[0].tolist()
+            ## take the first row, still backed by the file
+            data=data1d[0]
         else:
             #  Generate a list of points to pass to UCVM.
-            ucvmpoints = []
-            for y in range(0, self.num_y):
-                for x in range(0, self.num_x):
-                    ucvmpoints.append(Point(self.upperleftpoint.longitude + x * self.spacing, \
-                                            self.bottomrightpoint.latitude + y * self.spacing, \
-                                            self.upperleftpoint.depth))
-            data = u.vs30(ucvmpoints, self.cvm)
-        
-        i = 0
-        j = 0
+            ucvmpoints = PointArray.grid(self.upperleftpoint.longitude, self.bottomrightpoint.latitude, \
+                                         self.spacing, self.num_x, self.num_y, self.upperleftpoint.depth)
+            if self.engine == "columns" :
+                data = u.vs30_columns(ucvmpoints, self.cvm, self.interval)
+            else:
+                data = u.vs30(ucvmpoints, self.cvm)
         
-        for matprop in data:
-            self.materialproperties[i][j].vs = matprop
-            j = j + 1
-            if j >= self.num_x:
-                j = 0
-                i = i + 1
+        self.materialproperties.setColumn("vs", data)
 
     ##
     #  Plots the Vs30 data as a horizontal slice. This code is very similar to the
@@ -95,6 +109,7 @@ class Vs30Slice(HorizontalSlice):
     #  @param filename The location to which the plot should be saved. Optional.
     #  @param title The title of the plot to use. Optional.
     #  @param color_scale The color scale to use for the plot. Optional.
+    @pycvm_timed
     def plot(self):
  
         if self.upperleftpoint.description == None:
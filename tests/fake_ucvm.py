@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# A deterministic stand-in for a UCVM install, so pycvm can be measured
+# without one. make_fake_install() lays out an install directory whose
+# utilities/run_ucvm_query.sh, bin/vs30_query and bin/basin_query run this
+# file, which answers from a smooth synthetic model:
+#
+#   surface elevation  200 sin(3 lon) cos(3 lat)
+#   vs                 250 + 25 sqrt(depth) (1 + 0.2 sin(7 lon) cos(5 lat)), at most 4500
+#   vp                 1.73 vs + 200
+#   density            1700 + 0.2 vp
+#
+# vs30_query gives the travel-time average of vs over the top 30m and
+# basin_query the depth at which vs reaches the -v threshold.
+#
+# FAKE_UCVM_STARTUP (seconds before the first answer) and
+# FAKE_UCVM_LATENCY (seconds per point) slow the programs down like a
+# real model does. Input is answered as it arrives, so the programs also
+# work as persistent query workers.
+#
+#   python tests/fake_ucvm.py query|vs30|basin [ucvm_query arguments]
+#
+
+import os
+import sys
+import time
+
+import numpy as np
+
+## The largest vs of the model.
+MAX_VS = 4500.0
+
+## The ucvm_query result line: lon lat z surf vs30 crust vp vs rho gtl vp vs rho cmb vp vs rho.
+QUERY_LINE = "%.4f %.4f %.3f %.3f %.3f fake %.3f %.3f %.3f none 0.000 0.000 0.000 crust %.3f %.3f %.3f\n"
+
+def surface(lon, lat):
+    return 200.0 * np.sin(3.0 * lon) * np.cos(3.0 * lat)
+
+def lateral(lon, lat):
+    return 25.0 * (1.0 + 0.2 * np.sin(7.0 * lon) * np.cos(5.0 * lat))
+
+def model(lon, lat, depth):
+    vs = np.minimum(250.0 + lateral(lon, lat) * np.sqrt(np.maximum(depth, 0.0)), MAX_VS)
+    vp = 1.73 * vs + 200.0
+    return vp, vs, 1700.0 + 0.2 * vp
+
+## 30 / integral of dz / vs(z) over the top 30m, in closed form.
+def vs30(lon, lat):
+    a = lateral(lon, lat)
+    r = np.sqrt(30.0)
+    time30 = 2.0 / a * (r - 250.0 / a * np.log(1.0 + a * r / 250.0))
+    return 30.0 / time30
+
+def basin(lon, lat, threshold):
+    return np.where(threshold > 250.0, ((threshold - 250.0) / lateral(lon, lat)) ** 2, 0.0)
+
+def answer(program, args, points):
+    lon = points[:, 0]
+    lat = points[:, 1]
+    if program == "vs30":
+        values = np.column_stack((lon, lat, vs30(lon, lat)))
+        return ("%.4f %.4f %.3f\n" * len(values)) % tuple(values.ravel().tolist())
+    if program == "basin":
+        threshold = float(args[args.index("-v") + 1]) if "-v" in args else 1000.0
+        values = np.column_stack((lon, lat, basin(lon, lat, threshold)))
+        return ("%.4f %.4f %.3f\n" * len(values)) % tuple(values.ravel().tolist())
+
+    z = points[:, 2]
+    surf = surface(lon, lat)
+    depth = z
+    if "-c" in args and args[args.index("-c") + 1] == "ge":
+        depth = surf - z
+    vp, vs, rho = model(lon, lat, depth)
+    values = np.column_stack((lon, lat, z, surf, vs30(lon, lat), vp, vs, rho, vp, vs, rho))
+    return (QUERY_LINE * len(values)) % tuple(values.ravel().tolist())
+
+def main():
+    program = sys.argv[1]
+    args = sys.argv[2:]
+    latency = float(os.environ.get("FAKE_UCVM_LATENCY", "0"))
+    time.sleep(float(os.environ.get("FAKE_UCVM_STARTUP", "0")))
+
+    stdout = sys.stdout
+    if program == "query":
+        stdout.write("Using Geo Depth coordinates as default mode.\n")
+        stdout.flush()
+
+    ncolumns = 2 if program in ("vs30", "basin") else 3
+    pending = b""
+    while True:
+        data = os.read(0, 1 << 20)
+        if not data:
+            break
+        pending = pending + data
+        k = pending.rfind(b"\n")
+        if k == -1:
+            continue
+        lines = pending[:k].decode().split("\n")
+        pending = pending[k + 1:]
+
+        lines = [line for line in lines if line.strip() != ""]
+        if len(lines) == 0:
+            continue
+        points = np.loadtxt(lines, usecols=range(ncolumns), ndmin=2)
+        if ncolumns == 2:
+            points = np.column_stack((points, np.zeros(len(points))))
+        if latency > 0:
+            time.sleep(latency * len(points))
+        stdout.write(answer(program, args, points))
+        stdout.flush()
+
+##
+#  Lays out a fake UCVM install with one model.
+#
+#  @param directory The install directory to make.
+#  @param model The name of the fake model.
+#  @param latency The default seconds per point.
+#  @param startup The default seconds before the first answer.
+#  @return The install directory.
+def make_fake_install(directory, model = "cvmfake", latency = 0.0, startup = 0.0):
+    for name in ["bin", "conf", "lib", "utilities", "model/ucvm", "model/" + model]:
+        path = os.path.join(directory, name)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+    with open(os.path.join(directory, "conf", "ucvm.conf"), "w") as fh:
+        fh.write("ucvm_interface=map_etree\n")
+
+    fake = os.path.abspath(__file__)
+    if fake.endswith(".pyc"):
+        fake = fake[:-1]
+    for path, program in [("utilities/run_ucvm_query.sh", "query"), \
+                          ("bin/vs30_query", "vs30"), \
+                          ("bin/basin_query", "basin")]:
+        script = os.path.join(directory, path)
+        with open(script, "w") as fh:
+            fh.write("#!/bin/sh\n")
+            fh.write(": ${FAKE_UCVM_LATENCY:=%r} ${FAKE_UCVM_STARTUP:=%r}\n" % (latency, startup))
+            fh.write("export FAKE_UCVM_LATENCY FAKE_UCVM_STARTUP\n")
+            fh.write("exec '%s' '%s' %s \"$@\"\n" % (sys.executable, fake, program))
+        os.chmod(script, 0o755)
+    return directory
+
+if __name__ == "__main__":
+    main()
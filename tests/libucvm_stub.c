@@ -0,0 +1,74 @@
+/*
+ * A stand-in for libucvm used by test_ucvm_library.py. It has the same
+ * entry points and data layout as the real library and answers every
+ * point with values computed from its coordinates.
+ *
+ *   cc -shared -fPIC -o libucvm.so libucvm_stub.c
+ */
+#include <stdarg.h>
+
+typedef struct ucvm_point_t {
+  double coord[3];
+} ucvm_point_t;
+
+typedef struct ucvm_prop_t {
+  int source;
+  double vp;
+  double vs;
+  double rho;
+} ucvm_prop_t;
+
+typedef struct ucvm_data_t {
+  double surf;
+  double vs30;
+  double depth;
+  int domain;
+  double shift_cr;
+  double shift_gtl;
+  ucvm_prop_t crust;
+  ucvm_prop_t gtl;
+  ucvm_prop_t cmb;
+} ucvm_data_t;
+
+static int initialized = 0;
+static int query_mode = 0;
+
+int ucvm_init(const char *config) {
+  initialized = 1;
+  return 0;
+}
+
+int ucvm_add_model_list(const char *list) {
+  return initialized ? 0 : 1;
+}
+
+int ucvm_setparam(int param, ...) {
+  va_list ap;
+  va_start(ap, param);
+  if (param == 0) {
+    query_mode = va_arg(ap, int);
+  }
+  va_end(ap);
+  return 0;
+}
+
+int ucvm_query(int n, ucvm_point_t *pnt, ucvm_data_t *data) {
+  int i;
+  if (!initialized) {
+    return 1;
+  }
+  for (i = 0; i < n; i++) {
+    data[i].surf = pnt[i].coord[0];
+    data[i].vs30 = pnt[i].coord[1];
+    data[i].depth = pnt[i].coord[2];
+    data[i].cmb.vs = 1000.0 + pnt[i].coord[2] + 10000.0 * query_mode;
+    data[i].cmb.vp = 1.7 * data[i].cmb.vs;
+    data[i].cmb.rho = 2000.0;
+  }
+  return 0;
+}
+
+int ucvm_finalize() {
+  initialized = 0;
+  return 0;
+}
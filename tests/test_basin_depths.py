@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import unittest
+
+# test the one pass basin depths against basin_query of the fake UCVM install
+
+from ucvm_testcase import FakeInstallTestCase
+
+import numpy as np
+from common import PointArray
+from fake_ucvm import MAX_VS
+
+class TestBasinDepths(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.points = PointArray.grid(-118.0, 34.0, 0.05, 4, 3)
+
+    def test_against_basin_query(self):
+        u = self.ucvm()
+        for threshold in [1000.0, 2500.0]:
+            expected = u.basin_depth(self.points, "cvmfake", threshold)
+            depths = u.basin_depths(self.points, "cvmfake", [threshold], batch=128)[:, 0]
+            ## the first 20m level at or below the depth basin_query finds
+            self.assertTrue(np.all(depths >= expected - 0.01))
+            self.assertTrue(np.all(depths < expected + 20.0))
+
+    def test_threshold_not_reached(self):
+        u = self.ucvm()
+        depths = u.basin_depths(self.points, "cvmfake", [1000.0, MAX_VS + 500.0], max_depth=3000.0, batch=64)
+        self.assertEqual(depths.shape, (len(self.points), 2))
+        expected = u.basin_depth(self.points, "cvmfake", 1000.0)
+        self.assertTrue(np.all(np.abs(depths[:, 0] - expected) < 20.0))
+        np.testing.assert_array_equal(depths[:, 1], -1)
+
+    def test_finished_columns_stop(self):
+        u = self.ucvm()
+        queried = []
+        query_profiles = u.query_profiles
+        def counting(longitude, latitude, start, spacing, count, cvm, elevation = None):
+            queried.append(len(longitude))
+            return query_profiles(longitude, latitude, start, spacing, count, cvm, elevation)
+        u.query_profiles = counting
+
+        ## Z1.0 of the fake model is between 600 and 1450m, each batch is 200m
+        depths = u.basin_depths(self.points, "cvmfake", [1000.0], max_depth=3000.0, batch=10)
+        self.assertTrue(np.all(depths > 0))
+        self.assertEqual(queried[0], len(self.points))
+        self.assertTrue(len(queried) < 10)
+        self.assertTrue(queried[-1] < len(self.points))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+# test the column store that profiles and cross sections share
+
+from ucvm_testcase import FakeInstallTestCase
+
+import numpy as np
+from common import ColumnStore
+
+class TestColumnStore(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.cache_dir = os.path.join(self.install_dir, "cache")
+        os.makedirs(self.cache_dir)
+        self.positions = np.array([[1, 2], [3, 4], [-5, 6], [7, -8]])
+        ## column i, level l, property p holds 100 i + 10 l + p
+        self.values = (100.0 * np.arange(4)[:, None, None] + 10.0 * np.arange(10)[None, :, None] + \
+                       np.arange(3)[None, None, :]).astype(np.float32)
+
+    def lookup(self, store, positions, level, count):
+        values = np.zeros((len(positions), count, 3), dtype=np.float32)
+        missing = store.lookup(positions, level, values)
+        return values, missing
+
+    def test_lookup(self):
+        store = ColumnStore()
+        store.add(self.positions, 0, self.values)
+        values, missing = self.lookup(store, self.positions[[2, 0]], 3, 4)
+        self.assertFalse(missing.any())
+        np.testing.assert_array_equal(values, self.values[[2, 0], 3:7])
+
+        values, missing = self.lookup(store, np.array([[1, 2], [2, 1]]), 0, 10)
+        self.assertEqual(missing.tolist(), [False, True])
+        values, missing = self.lookup(store, self.positions, 5, 10)
+        self.assertTrue(missing.all())
+
+    def test_lookup_across_blocks(self):
+        store = ColumnStore()
+        store.add(self.positions, 0, self.values[:, :5])
+        store.add(self.positions[::-1], 5, self.values[::-1, 5:])
+        values, missing = self.lookup(store, self.positions, 2, 6)
+        self.assertFalse(missing.any())
+        np.testing.assert_array_equal(values, self.values[:, 2:8])
+
+    def test_save_and_reload(self):
+        store = ColumnStore(self.cache_dir, "columns_test")
+        store.add(self.positions, 4, self.values)
+        names = os.listdir(self.cache_dir)
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names[0].startswith("columns_test_") and names[0].endswith(".npz"))
+
+        store = ColumnStore(self.cache_dir, "columns_test")
+        self.assertTrue(store.blocks[0]["values"] is None)
+        values, missing = self.lookup(store, self.positions, 4, 10)
+        self.assertFalse(missing.any())
+        np.testing.assert_array_equal(values, self.values)
+        self.assertEqual(len(ColumnStore(self.cache_dir, "columns_other").blocks), 0)
+
+    def test_memory_bound(self):
+        store = ColumnStore(self.cache_dir, "columns_test", self.values.nbytes)
+        for i in range(3):
+            store.add(self.positions + 10 * i, 0, self.values + i)
+            self.assertTrue(store.held <= self.values.nbytes)
+
+        ## values dropped from memory are read back from their file
+        values, missing = self.lookup(store, self.positions, 0, 10)
+        self.assertFalse(missing.any())
+        np.testing.assert_array_equal(values, self.values)
+        self.assertTrue(store.held <= self.values.nbytes)
+
+    def test_prune(self):
+        store = ColumnStore(self.cache_dir, "columns_test")
+        store.add(self.positions, 0, self.values)
+        os.remove(os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0]))
+        store.prune()
+        self.assertEqual(store.blocks, [])
+        self.assertEqual(store.held, 0)
+
+    def test_profiles_reuse_columns(self):
+        lons = np.array([-118.0, -117.9, -117.8])
+        lats = np.array([34.0, 34.1, 34.2])
+        u = self.ucvm(no_cache="0", cache_dir=self.cache_dir)
+        vs = u.query_profiles(lons, lats, 0.0, 100.0, 8, "cvmfake").getColumn("vs")
+
+        ## the columns are now held, no query program is needed for them
+        os.remove(os.path.join(self.install_dir, "utilities", "run_ucvm_query.sh"))
+        u = self.ucvm(no_cache="0", cache_dir=self.cache_dir)
+        grid = u.query_profiles(lons[1:] + 1e-6, lats[1:], 200.0, 100.0, 4, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), vs.reshape(8, 3)[2:6, 1:].ravel())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+# test parsing the output of the UCVM query programs
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pycvm')))
+
+import numpy as np
+from common import UCVMQueryError, pycvm_parse_output
+
+OUTPUT = ["Using Geo Depth coordinates as default mode.",
+          "-118.0000 34.0000 100.000 12.000 600.000 crust 0.000 0.000 0.000 none 0.000 0.000 0.000 crust 1700.000 1000.000 2000.000",
+          "",
+          "WARNING: slow performance",
+          "-117.9900 34.0000 100.000 13.000 610.000 crust 0.000 0.000 0.000 none 0.000 0.000 0.000 crust 1710.000 1010.000 2010.000",
+          "  .5 +2.5 1e2 14.000 620.000 crust 0.000 0.000 0.000 none 0.000 0.000 0.000 crust 1720.000 1020.000 2020.000"]
+
+class TestParseOutput(unittest.TestCase):
+
+    def test_parse(self):
+        values = pycvm_parse_output(OUTPUT, (0, 1, 15))
+        np.testing.assert_allclose(values, [[-118.0, 34.0, 1000.0], [-117.99, 34.0, 1010.0], [0.5, 2.5, 1020.0]])
+
+        values = pycvm_parse_output(OUTPUT, (16,))
+        self.assertEqual(values.shape, (3, 1))
+        np.testing.assert_allclose(values[:, 0], [2000.0, 2010.0, 2020.0])
+
+    def test_no_results(self):
+        self.assertEqual(pycvm_parse_output(OUTPUT[:1], (14, 15, 16)).shape, (0, 3))
+        self.assertEqual(pycvm_parse_output([], (0,)).shape, (0, 1))
+
+    def test_malformed_lines(self):
+        lines = OUTPUT + ["-117.9800 34.0000 100.000 nan?", "-117.9700 34.0000 100.000 15.000 bad"]
+        values = pycvm_parse_output(lines, (0, 4))
+        np.testing.assert_allclose(values, [[-118.0, 600.0], [-117.99, 610.0], [0.5, 620.0]])
+        with self.assertRaises(UCVMQueryError):
+            pycvm_parse_output(lines, (0, 4), True)
+        np.testing.assert_allclose(pycvm_parse_output(lines, (0, 1), True)[:, 0], \
+                                   [-118.0, -117.99, 0.5, -117.98, -117.97])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import os
+import json
+import unittest
+
+# test grouping the jobs of a plot manifest and sharing their queries
+
+from ucvm_testcase import FakeInstallTestCase
+
+import batch
+from batch import PlotBatch, pycvm_run_group
+from volume_slice import VolumeSlice
+
+REGION = {"lat1": 34.0, "lon1": -118.0, "lat2": 34.1, "lon2": -117.85, "spacing": 0.05}
+
+## Records the volumes queried and the slices plotted instead of plotting them.
+class RecordingVolume(VolumeSlice):
+
+    volumes = []
+
+    def getplotvals(self, mproperty="vs"):
+        RecordingVolume.volumes.append(self)
+        self.plotted = []
+        VolumeSlice.getplotvals(self, mproperty)
+
+    def slice(self, index, meta = None):
+        volume = self
+        class Plotted:
+            def plot(self):
+                volume.plotted.append((volume.depths[index], meta['outfile'], volume.volume[index].getColumn("vs")))
+        return Plotted()
+
+class TestPlotBatch(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.defaults = dict(REGION, installdir=self.install_dir, cvm="cvmfake", no_cache="1")
+
+    def test_jobs(self):
+        plots = PlotBatch([{"plot": "horizontal_slice", "depth": 500}, \
+                           {"plot": "vs30_map", "name": "vs30", "cvm": "cvmother"}], self.defaults)
+        self.assertEqual([job['name'] for job in plots.jobs], ["horizontal_slice-1", "vs30"])
+        self.assertEqual([job['outfile'] for job in plots.jobs], ["horizontal_slice-1.png", "vs30.png"])
+        self.assertEqual(plots.jobs[0]['depth'], "500")
+        self.assertEqual(plots.jobs[0]['spacing'], "0.05")
+        self.assertEqual(plots.jobs[1]['cvm'], "cvmother")
+        with self.assertRaises(ValueError):
+            PlotBatch([{"plot": "no_such_plot"}])
+
+    def test_load(self):
+        manifest = os.path.join(self.install_dir, "plots.json")
+        with open(manifest, "w") as fh:
+            json.dump({"defaults": {"cvm": "cvmfake", "spacing": 0.01}, \
+                       "jobs": [{"plot": "elevation_map"}]}, fh)
+        plots = PlotBatch.load(manifest, {"spacing": 0.1, "lat1": 34.0})
+        self.assertEqual(plots.jobs[0]['spacing'], "0.01")
+        self.assertEqual(plots.jobs[0]['lat1'], "34.0")
+
+        with open(manifest, "w") as fh:
+            json.dump([{"plot": "elevation_map", "cvm": "cvmfake"}], fh)
+        self.assertEqual(PlotBatch.load(manifest).jobs[0]['cvm'], "cvmfake")
+
+    def test_groups(self):
+        plots = PlotBatch([{"plot": "horizontal_slice", "depth": 0, "name": "a"}, \
+                           {"plot": "vs30_map", "cvm": "cvmother", "name": "b"}, \
+                           {"plot": "z10_map", "name": "c"}, \
+                           {"plot": "horizontal_slice", "depth": 0, "spacing": 0.01, "name": "d"}, \
+                           {"plot": "vs30_map", "cvm": "cvmother", "name": "e"}], self.defaults)
+        self.assertEqual([[job['name'] for job in group] for group in plots.groups()], \
+                         [["a", "c"], ["b", "e"], ["d"]])
+
+    def test_shared_query(self):
+        plots = PlotBatch([{"plot": "horizontal_slice", "depth": 500, "data_type": "vs", "name": "a"}, \
+                           {"plot": "horizontal_slice", "depth": 0, "data_type": "vp", "name": "b"}, \
+                           {"plot": "horizontal_slice", "depth": 500, "data_type": "vp", "name": "c"}, \
+                           {"plot": "horizontal_slice", "depth": 500, "vsfloor": "600", "vpfloor": "0", \
+                            "densityfloor": "0", "name": "d"}], self.defaults)
+        self.assertEqual(len(plots.groups()), 1)
+
+        RecordingVolume.volumes = []
+        batch.VolumeSlice = RecordingVolume
+        try:
+            report = pycvm_run_group(plots.groups()[0])
+        finally:
+            batch.VolumeSlice = VolumeSlice
+
+        ## one query for a, b and c, and one for d with its floors
+        self.assertEqual(len(RecordingVolume.volumes), 2)
+        self.assertEqual(sorted([volume.depths for volume in RecordingVolume.volumes]), [[0.0, 500.0], [500.0]])
+        self.assertEqual([entry['status'] for entry in report], ["ok"] * 6)
+        self.assertEqual(len([entry for entry in report if entry['name'].startswith("query cvmfake")]), 2)
+
+        plotted = dict((outfile, (depth, vs)) for volume in RecordingVolume.volumes \
+                       for depth, outfile, vs in volume.plotted)
+        self.assertEqual(sorted(plotted.keys()), ["a.png", "b.png", "c.png", "d.png"])
+        self.assertEqual(plotted["b.png"][0], 0.0)
+        self.assertTrue((plotted["a.png"][1] == plotted["c.png"][1]).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import os
+import time
+import unittest
+
+# test the on-disk query cache and its use by UCVM queries
+
+from ucvm_testcase import FakeInstallTestCase
+
+import numpy as np
+from common import PointArray, QueryCache
+
+class TestQueryCache(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.cache_dir = os.path.join(self.install_dir, "cache")
+        self.points = PointArray.grid(-118.0, 34.0, 0.01, 4, 3, 100.0)
+
+    ## Sets the modification time of a cached result, so the order of use does not hang on the clock.
+    def age(self, cache, key, seconds):
+        stamp = time.time() - seconds
+        os.utime(os.path.join(cache.directory, key + ".npz"), (stamp, stamp))
+
+    def test_key(self):
+        cache = QueryCache(self.cache_dir, 1 << 20)
+        lons = np.arange(4.0)
+        key = cache.key(["ucvm_query", "-m", "cvmfake"], lons, None)
+        self.assertEqual(key, cache.key(["ucvm_query", "-m", "cvmfake"], lons.copy(), None))
+        self.assertNotEqual(key, cache.key(["ucvm_query", "-m", "cvmother"], lons, None))
+        self.assertNotEqual(key, cache.key(["ucvm_query", "-m", "cvmfake"], lons + 1e-6, None))
+        self.assertNotEqual(key, cache.key(["ucvm_query", "-m", "cvmfake"], lons, lons))
+
+    def test_put_get(self):
+        cache = QueryCache(self.cache_dir, 1 << 20)
+        values = np.arange(12.0).reshape(4, 3)
+        self.assertTrue(cache.get("missing") is None)
+        cache.put("a", values)
+        np.testing.assert_array_equal(cache.get("a"), values)
+
+    def test_evict_least_recently_used(self):
+        cache = QueryCache(self.cache_dir, 1 << 20)
+        values = np.random.RandomState(0).random_sample((1000, 3))
+        for name, seconds in [("a", 30), ("b", 20), ("c", 10)]:
+            cache.put(name, values)
+            self.age(cache, name, seconds)
+        size = os.path.getsize(os.path.join(self.cache_dir, "a.npz"))
+
+        ## reading a marks it as the most recently used
+        cache.get("a")
+        cache.max_bytes = 2 * size
+        cache.evict()
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["a.npz", "c.npz"])
+
+    def test_query_uses_cache(self):
+        vs = self.ucvm(no_cache="0", cache_dir=self.cache_dir).query_columns(self.points, "cvmfake").getColumn("vs")
+        names = os.listdir(self.cache_dir)
+        self.assertEqual(len(names), 1)
+
+        ## a cached answer is returned without running the query program
+        os.remove(os.path.join(self.install_dir, "utilities", "run_ucvm_query.sh"))
+        grid = self.ucvm(no_cache="0", cache_dir=self.cache_dir).query_columns(self.points, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), vs)
+        self.assertEqual(os.listdir(self.cache_dir), names)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+# test resuming checkpointed queries against the fake UCVM install
+
+from ucvm_testcase import FakeInstallTestCase, FAKE_UCVM
+
+import numpy as np
+from common import PointArray, QueryCheckpoint, pycvm_query_key
+
+## Answers the second run with the first 10 points only, then fails.
+DYING_QUERY = """#!/bin/sh
+n=$(cat '%(runs)s' 2>/dev/null || echo 0); n=$((n+1)); echo $n > '%(runs)s'
+if [ $n -eq 2 ]; then head -n 10 | '%(python)s' '%(fake)s' query "$@"; exit 3; fi
+exec '%(python)s' '%(fake)s' query "$@"
+"""
+
+class TestQueryCheckpoint(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.checkpoint_dir = os.path.join(self.install_dir, "checkpoints")
+        ## 3 blocks of 2 rows of 10 points
+        self.points = PointArray.grid(-118.0, 34.0, 0.01, 10, 6, 100.0)
+
+    def checkpointed(self):
+        return self.ucvm(checkpoint=self.checkpoint_dir, checkpoint_block="20")
+
+    def checkpoint(self, u):
+        command = u.query_command("cvmfake", "gd")
+        key = pycvm_query_key(command, u.get_config_signature(), (14, 15, 16), \
+                              self.points.longitude, self.points.latitude, self.points.depth)
+        return QueryCheckpoint(self.checkpoint_dir, key, len(self.points), 20)
+
+    def test_checkpoint_query(self):
+        expected = self.ucvm().query_columns(self.points, "cvmfake").getColumn("vs")
+        grid = self.checkpointed().query_columns(self.points, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), expected)
+        self.assertEqual(os.listdir(self.checkpoint_dir), [])
+
+    def test_resume(self):
+        expected = self.ucvm().query_columns(self.points, "cvmfake").getColumn("vs")
+        u = self.checkpointed()
+        checkpoint = self.checkpoint(u)
+        self.assertEqual(checkpoint.done(), set())
+        checkpoint.save(1, np.full((20, 3), -1.0))
+
+        vs = u.query_columns(self.points, "cvmfake").getColumn("vs")
+        np.testing.assert_allclose(vs[20:40], -1.0)
+        np.testing.assert_allclose(vs[:20], expected[:20])
+        np.testing.assert_allclose(vs[40:], expected[40:])
+        self.assertFalse(os.path.isdir(checkpoint.directory))
+
+    def test_other_split_starts_over(self):
+        checkpoint = self.checkpoint(self.checkpointed())
+        checkpoint.done()
+        checkpoint.save(0, np.zeros((20, 3)))
+        self.assertEqual(checkpoint.done(), set([0]))
+        other = QueryCheckpoint(self.checkpoint_dir, os.path.basename(checkpoint.directory), len(self.points), 30)
+        self.assertEqual(other.done(), set())
+
+    def test_truncated_block(self):
+        self.replace_query(DYING_QUERY % {"runs" : os.path.join(self.install_dir, "runs"), \
+                                          "python" : sys.executable, "fake" : FAKE_UCVM})
+        u = self.checkpointed()
+        checkpoint = self.checkpoint(u)
+        with self.assertRaises(SystemExit):
+            u.query_columns(self.points, "cvmfake")
+        self.assertEqual(checkpoint.done(), set([0]))
+
+        expected = self.ucvm().query_columns(self.points, "cvmfake").getColumn("vs")
+        grid = self.checkpointed().query_columns(self.points, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), expected)
+        self.assertFalse(os.path.isdir(checkpoint.directory))
+
+if __name__ == '__main__':
+    unittest.main()
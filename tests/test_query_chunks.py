@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import time
+import unittest
+
+# test splitting queries across concurrent query programs
+
+from ucvm_testcase import FakeInstallTestCase
+
+import numpy as np
+from common import PointArray, UCVMQueryError
+
+class TestQueryChunks(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.points = PointArray.grid(-118.0, 34.0, 0.01, 5, 4, 100.0)
+
+    def chunked(self, workers, chunk_size = None):
+        if chunk_size == None:
+            return self.ucvm(workers=str(workers))
+        return self.ucvm(workers=str(workers), chunk_size=str(chunk_size))
+
+    def test_chunk_bounds(self):
+        self.assertEqual(self.chunked(1).chunk_bounds(10), [(0, 10)])
+        self.assertEqual(self.chunked(3).chunk_bounds(10), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(self.chunked(1, 4).chunk_bounds(10), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(self.chunked(4, 20).chunk_bounds(10), [(0, 10)])
+        self.assertEqual(self.chunked(2, 5).chunk_count(20), 4)
+
+    def test_map_chunks_order(self):
+        def run(start, stop, slot):
+            ## the first chunks finish last
+            time.sleep(0.05 * (20 - start) / 4)
+            return (start, stop, slot)
+        results = self.chunked(3, 4).map_chunks(20, run)
+        self.assertEqual([(start, stop) for start, stop, slot in results], \
+                         [(0, 4), (4, 8), (8, 12), (12, 16), (16, 20)])
+        self.assertEqual([slot for start, stop, slot in results], [0, 1, 2, 0, 1])
+
+    def test_map_chunks_error(self):
+        def run(start, stop, slot):
+            if start == 8:
+                raise UCVMQueryError("no such model")
+            return start
+        with self.assertRaises(SystemExit):
+            self.chunked(3, 4).map_chunks(20, run)
+        with self.assertRaises(SystemExit):
+            self.chunked(1).map_chunks(20, lambda start, stop, slot: run(8, stop, slot))
+
+    def test_chunked_query(self):
+        expected = self.chunked(1).query_columns(self.points, "cvmfake").getColumn("vs")
+        grid = self.chunked(3, 6).query_columns(self.points, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), expected)
+
+    def test_chunked_query_error(self):
+        self.replace_query("#!/bin/sh\ncat > /dev/null\necho 'Using Geo Depth coordinates as default mode.'\n" \
+                           "echo 'Model cvmfake not found'\necho 'Model cvmfake not found'\n")
+        with self.assertRaises(SystemExit):
+            self.chunked(3, 6).query_columns(self.points, "cvmfake")
+
+if __name__ == '__main__':
+    unittest.main()
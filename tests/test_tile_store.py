@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# test writing plotted values to a tile store and reading part of it back
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pycvm')))
+
+import numpy as np
+from common import TileStore
+
+class TestTileStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), "image_data.tiles")
+        self.vs = np.arange(7 * 10, dtype=np.float32).reshape(7, 10)
+        self.volume = np.arange(2 * 7 * 10, dtype=np.float64).reshape(2, 7, 10)
+        self.attrs = {"lon0": -118.0, "lat0": 34.0, "spacing": 0.01}
+        TileStore(self.directory).write({"vs": self.vs, "volume": self.volume}, 4, self.attrs)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def test_read_all(self):
+        store = TileStore(self.directory)
+        self.assertEqual(store.shape(), (7, 10))
+        self.assertEqual(store.attrs(), self.attrs)
+        bands = store.read()
+        np.testing.assert_array_equal(bands["vs"], self.vs)
+        np.testing.assert_array_equal(bands["volume"], self.volume)
+        self.assertEqual(bands["vs"].dtype, np.float32)
+        self.assertEqual(store.tiles_read, 6)
+
+    def test_read_part(self):
+        store = TileStore(self.directory)
+        bands = store.read((1, 3), (2, 6))
+        np.testing.assert_array_equal(bands["vs"], self.vs[1:3, 2:6])
+        np.testing.assert_array_equal(bands["volume"], self.volume[:, 1:3, 2:6])
+        self.assertEqual(store.tiles_read, 2)
+
+        bands = store.read((5, 6), (9, 10))
+        np.testing.assert_array_equal(bands["vs"], self.vs[5:6, 9:10])
+        self.assertEqual(store.tiles_read, 3)
+
+    def test_window(self):
+        store = TileStore(self.directory)
+        rows, cols = store.window(-117.97, 34.02, 0.01, 4, 3)
+        self.assertEqual((rows, cols), ((2, 5), (3, 7)))
+        np.testing.assert_array_equal(store.read(rows, cols)["vs"], self.vs[2:5, 3:7])
+        with self.assertRaises(SystemExit):
+            store.window(-117.965, 34.02, 0.01, 4, 3)
+        with self.assertRaises(SystemExit):
+            store.window(-117.97, 34.02, 0.01, 8, 3)
+
+    def test_rewrite(self):
+        TileStore(self.directory).write({"vs": self.vs[:3, :3]}, 2)
+        store = TileStore(self.directory)
+        self.assertEqual(store.shape(), (3, 3))
+        self.assertEqual(sorted(store.read().keys()), ["vs"])
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.startswith("tile_")]), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from subprocess import call
+
+# test the in-process libucvm backend against a stub library
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pycvm')))
+
+import numpy as np
+from common import UCVM, PointArray
+
+STUB_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libucvm_stub.c")
+
+FAKE_QUERY = """#!%s
+import sys
+for line in sys.stdin:
+    p = line.split()
+    vs = 500.0 + float(p[2])
+    print("%%s %%s %%s 0 0 crust 0 0 0 none 0 0 0 crust %%.3f %%.3f 1900.0" %% (p[0], p[1], p[2], 1.5 * vs, vs))
+""" % sys.executable
+
+class TestUCVMLibrary(unittest.TestCase):
+
+    def setUp(self):
+        self.install_dir = tempfile.mkdtemp()
+        for name in ["bin", "conf", "lib", "model/ucvm", "model/cvmfake", "utilities"]:
+            os.makedirs(os.path.join(self.install_dir, name))
+        open(os.path.join(self.install_dir, "conf", "ucvm.conf"), "w").close()
+
+        query = os.path.join(self.install_dir, "utilities", "run_ucvm_query.sh")
+        with open(query, "w") as fh:
+            fh.write(FAKE_QUERY)
+        os.chmod(query, 0o755)
+
+        self.library = os.path.join(self.install_dir, "lib", "libucvm.so")
+        try:
+            built = call(["cc", "-shared", "-fPIC", "-o", self.library, STUB_SOURCE]) == 0
+        except OSError:
+            built = False
+        if not built:
+            shutil.rmtree(self.install_dir)
+            self.skipTest("no C compiler to build the stub libucvm")
+
+        self.points = PointArray.grid(-118.0, 34.0, 0.01, 4, 3, 100.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.install_dir)
+
+    def ucvm(self, backend, library = None):
+        meta = {"no_cache": "1", "backend": backend}
+        if library != None:
+            meta["library"] = library
+        return UCVM(self.install_dir, meta=meta)
+
+    def test_library_query(self):
+        grid = self.ucvm("library").query_columns(self.points, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), 1100.0)
+        np.testing.assert_allclose(grid.getColumn("vp"), 1870.0)
+        np.testing.assert_allclose(grid.getColumn("density"), 2000.0)
+
+    def test_library_elevation_mode(self):
+        points = PointArray.grid(-118.0, 34.0, 0.01, 2, 2, elevation=50.0)
+        grid = self.ucvm("library").query_columns(points, "cvmfake", elevation=1)
+        np.testing.assert_allclose(grid.getColumn("vs"), 11050.0)
+
+    def test_library_etree_columns(self):
+        u = self.ucvm("library")
+        np.testing.assert_allclose(u.elevation_etree(self.points, "cvmfake"), self.points.longitude)
+        np.testing.assert_allclose(u.vs30_etree(self.points, "cvmfake"), self.points.latitude)
+
+    def test_fallback_to_subprocess(self):
+        u = self.ucvm("auto", os.path.join(self.install_dir, "lib", "missing.so"))
+        grid = u.query_columns(self.points, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), 600.0)
+
+    def test_subprocess_backend(self):
+        grid = self.ucvm("subprocess").query_columns(self.points, "cvmfake")
+        np.testing.assert_allclose(grid.getColumn("vs"), 600.0)
+
+if __name__ == '__main__':
+    unittest.main()
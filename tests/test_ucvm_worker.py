@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import unittest
+
+# test the persistent query workers against the fake UCVM install
+
+from ucvm_testcase import FakeInstallTestCase
+
+import numpy as np
+from common import PointArray, UCVMWorker, UCVMWorkerPool, UCVMQueryError, pycvm_parse_output
+
+## Like the stock ucvm_query, only answers once it has read a full batch of points.
+BUFFERING_QUERY = """#!%s
+import sys
+batch = []
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    batch.append(line.split())
+    if len(batch) == %d:
+        for p in batch:
+            sys.stdout.write("%%s %%s %%s 0 0 crust 0 0 0 none 0 0 0 crust 1.0 %%s 1.0\\n" %% (p[0], p[1], p[2], p[2]))
+        sys.stdout.flush()
+        batch = []
+"""
+
+class TestUCVMWorker(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.query = os.path.join(self.install_dir, "utilities", "run_ucvm_query.sh")
+        self.points = PointArray.grid(-118.0, 34.0, 0.01, 4, 3, 100.0)
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.close()
+        FakeInstallTestCase.tearDown(self)
+
+    def worker(self, command, flush_size = 0, timeout = None):
+        worker = UCVMWorker(command, flush_size, timeout)
+        self.workers.append(worker)
+        return worker
+
+    def buffering_query(self, batch):
+        path = os.path.join(self.install_dir, "utilities", "buffering_query")
+        with open(path, "w") as fh:
+            fh.write(BUFFERING_QUERY % (sys.executable, batch))
+        os.chmod(path, 0o755)
+        return path
+
+    def test_batches(self):
+        worker = self.worker([self.query])
+        for depth in [0.0, 100.0, 500.0]:
+            points = PointArray.grid(-118.0, 34.0, 0.01, 5, 4, depth)
+            output = worker.run(points.toText(), len(points))
+            values = pycvm_parse_output(output, (0, 1, 2))
+            self.assertEqual(len(values), len(points))
+            np.testing.assert_allclose(values[:, 0], points.longitude, atol=1e-4)
+            np.testing.assert_allclose(values[:, 2], depth)
+        self.assertTrue(worker.alive())
+
+    def test_padding(self):
+        worker = self.worker([self.buffering_query(5)], 5, 10)
+        for npoints in [7, 5, 3]:
+            points = self.points[:npoints]
+            output = worker.run(points.toText(), npoints)
+            self.assertEqual(len(output), npoints)
+            np.testing.assert_allclose(pycvm_parse_output(output, (0,))[:, 0], points.longitude, atol=1e-4)
+
+    def test_timeout(self):
+        worker = self.worker([self.buffering_query(5)], 0, 1)
+        with self.assertRaises(UCVMQueryError):
+            worker.run(self.points[:3].toText(), 3)
+        self.assertFalse(worker.alive())
+
+    def test_error_line(self):
+        worker = self.worker(["sh", "-c", "echo 'ERROR: no such model'; cat"])
+        with self.assertRaises(UCVMQueryError):
+            worker.run(self.points.toText(), len(self.points))
+
+    def test_pool(self):
+        pool = UCVMWorkerPool()
+        try:
+            worker = pool.get([self.query])
+            self.assertTrue(pool.get([self.query]) is worker)
+            self.assertFalse(pool.get([self.query], slot=1) is worker)
+            worker.close()
+            self.assertFalse(pool.get([self.query]) is worker)
+        finally:
+            pool.shutdown()
+
+    def test_persistent_query(self):
+        expected = self.ucvm().query_columns(self.points, "cvmfake").getColumn("vs")
+        u = self.ucvm(persistent="1", persistent_batch="0", workers="2", chunk_size="5")
+        for i in range(2):
+            np.testing.assert_allclose(u.query_columns(self.points, "cvmfake").getColumn("vs"), expected)
+
+if __name__ == '__main__':
+    unittest.main()
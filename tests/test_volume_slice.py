@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+# test querying a volume once and slicing it by depth
+
+from ucvm_testcase import FakeInstallTestCase
+
+import numpy as np
+from common import Point, PointArray
+from volume_slice import VolumeSlice
+
+class TestVolumeSlice(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.outfile = os.path.join(self.install_dir, "volume.png")
+        self.depths = [0.0, 500.0, 1000.0]
+
+    def volume(self, levels = None, **meta):
+        settings = {"installdir": self.install_dir, "cvm": "cvmfake", "spacing": "0.05", \
+                    "no_cache": "1", "backend": "subprocess"}
+        settings.update(meta)
+        return VolumeSlice(Point(-118.0, 34.1, 0), Point(-117.85, 34.0, 0), levels, settings)
+
+    def expected(self, volume, depth):
+        points = PointArray.grid(-118.0, 34.0, 0.05, volume.num_x, volume.num_y, depth)
+        return self.ucvm().query_columns(points, "cvmfake").getColumn("vs").reshape(volume.num_y, volume.num_x)
+
+    def test_query(self):
+        volume = self.volume(self.depths)
+        volume.getplotvals()
+        self.assertEqual(volume.volume.getColumn("vs").shape, (3, volume.num_y, volume.num_x))
+        for index, depth in enumerate(self.depths):
+            np.testing.assert_allclose(volume.volume.getColumn("vs")[index], self.expected(volume, depth))
+
+    def test_slice(self):
+        volume = self.volume(self.depths, outfile=self.outfile, title="Fake")
+        volume.getplotvals()
+        depth_slice = volume.slice(1)
+        self.assertEqual(depth_slice.filename, os.path.join(self.install_dir, "volume_500m.png"))
+        self.assertEqual(depth_slice.title, "Fake at 500m")
+        self.assertEqual(depth_slice.upperleftpoint.depth, 500.0)
+        depth_slice.getplotvals()
+        np.testing.assert_allclose(depth_slice.materialproperties.getColumn("vs"), self.expected(volume, 500.0))
+
+        own = volume.slice(2, {"outfile": "other.png", "datafile": "ignored.bin"})
+        self.assertEqual(own.filename, "other.png")
+        self.assertEqual(own.datafile, None)
+
+    def test_depths_from_meta(self):
+        self.assertEqual(self.volume(depths="0,250").depths, [0.0, 250.0])
+        with self.assertRaises(ValueError):
+            self.volume()
+
+    def test_datafile(self):
+        volume = self.volume(self.depths, outfile=self.outfile)
+        volume.getplotvals()
+        datafile = os.path.join(self.install_dir, "volume_data.bin")
+        self.assertTrue(os.path.isfile(datafile))
+
+        replot = self.volume(datafile=datafile)
+        self.assertEqual(replot.depths, self.depths)
+        replot.getplotvals()
+        np.testing.assert_allclose(replot.volume.getColumn("vs"), volume.volume.getColumn("vs"))
+
+    def test_tiles(self):
+        volume = self.volume(self.depths, outfile=self.outfile, tile_size="2")
+        volume.getplotvals()
+        tiles = os.path.join(self.install_dir, "volume_data.tiles")
+
+        ## the east half of the region at two of the depths
+        replot = VolumeSlice(Point(-117.9, 34.1, 0), Point(-117.85, 34.0, 0), [1000.0, 0.0], \
+                             {"installdir": self.install_dir, "cvm": "cvmfake", "spacing": "0.05", \
+                              "no_cache": "1", "datafile": tiles})
+        replot.getplotvals()
+        vs = volume.volume.getColumn("vs")
+        np.testing.assert_allclose(replot.volume.getColumn("vs"), vs[[2, 0]][:, :, 2:])
+
+if __name__ == '__main__':
+    unittest.main()
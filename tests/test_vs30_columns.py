@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import sys
+import unittest
+
+# test the column Vs30 engine against vs30_query of the fake UCVM install
+
+from ucvm_testcase import FakeInstallTestCase, FAKE_UCVM
+
+import numpy as np
+from common import PointArray
+
+## Puts water under the first column of points and no data under the second.
+MASKED_QUERY = """#!/bin/sh
+'%s' '%s' query "$@" | awk '$1 == "-118.0000" { $16 = 0 } $1 == "-117.9500" { $16 = -1 } { print }'
+"""
+
+class TestVs30Columns(FakeInstallTestCase):
+
+    def setUp(self):
+        FakeInstallTestCase.setUp(self)
+        self.points = PointArray.grid(-118.0, 34.0, 0.05, 4, 3)
+
+    def test_against_vs30_query(self):
+        u = self.ucvm()
+        expected = u.vs30(self.points, "cvmfake")
+        np.testing.assert_allclose(u.vs30_columns(self.points, "cvmfake"), expected, atol=0.15)
+        np.testing.assert_allclose(u.vs30_columns(self.points, "cvmfake", 5.0), expected, rtol=0.01)
+
+    def test_single_point(self):
+        u = self.ucvm()
+        value = u.vs30_columns(self.points[:1], "cvmfake")
+        self.assertAlmostEqual(float(value), float(u.vs30(self.points[:1], "cvmfake")), delta=0.15)
+
+    def test_water_and_no_data(self):
+        expected = self.ucvm().vs30(self.points, "cvmfake")
+        self.replace_query(MASKED_QUERY % (sys.executable, FAKE_UCVM))
+        floats = self.ucvm().vs30_columns(self.points, "cvmfake")
+        water = np.abs(self.points.longitude + 118.0) < 1e-6
+        nodata = np.abs(self.points.longitude + 117.95) < 1e-6
+        np.testing.assert_array_equal(floats[water], 0)
+        np.testing.assert_array_equal(floats[nodata], -1)
+        rest = ~(water | nodata)
+        np.testing.assert_allclose(floats[rest], expected[rest], atol=0.15)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+#
+# The base of the unit tests that query the fake UCVM install of
+# fake_ucvm.py. Importing it puts pycvm on the path.
+#
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'pycvm')))
+
+from common import UCVM
+from fake_ucvm import make_fake_install
+
+## The fake_ucvm.py program, for query scripts that wrap it.
+FAKE_UCVM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_ucvm.py")
+
+class FakeInstallTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.install_dir = make_fake_install(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.install_dir)
+
+    ## Returns a UCVM of the fake install, by default without the query cache.
+    def ucvm(self, **meta):
+        settings = {"no_cache": "1", "backend": "subprocess"}
+        settings.update(meta)
+        return UCVM(self.install_dir, meta=settings)
+
+    ## Replaces utilities/run_ucvm_query.sh of the fake install with a shell script.
+    def replace_query(self, script):
+        query = os.path.join(self.install_dir, "utilities", "run_ucvm_query.sh")
+        with open(query, "w") as fh:
+            fh.write(script)
+        os.chmod(query, 0o755)
+        return query
@@ -6,7 +6,7 @@
 #  @author SCEC
 #  @version 19.4.0
 #
-from pycvm import MapGridHorizontalSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import MapGridHorizontalSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -23,6 +23,7 @@ def usage():
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM isntall directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
@@ -33,7 +34,7 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
                          "o,outfile":"outfile", \
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
-                         "n,configfile,o":"configfile" })
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 meta = {}
 
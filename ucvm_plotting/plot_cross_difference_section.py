@@ -14,7 +14,7 @@
 #    -f a_cross_section_data.bin,another_cross_section_data.bin
 #
 
-from pycvm import CrossDifferenceSection, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import CrossDifferenceSection, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 import json
 
@@ -42,6 +42,7 @@ def usage():
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM isntall directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,origin":"lat1,lon1", \
@@ -62,7 +63,7 @@ ret_val = get_user_opts({"b,origin":"lat1,lon1", \
              "t,title,o":"title", \
              "H,help,o":"", \
              "i,installdir,o":"installdir", \
-             "n,configfile,o":"configfile" })
+             "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 meta = {}
 
@@ -8,7 +8,7 @@
 #
 #  Plots a cross section given a set of command-line parameters.
 
-from pycvm import CrossSection, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import CrossSection, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 import json
 
@@ -30,12 +30,13 @@ def usage():
     print("\t-g, --gate: optional gate value for bi-color scale gate")
     print("\t-b, --origin: origin latitude, longitude from which to start plot (e.g. 34,-118)")
     print("\t-u, --destination: destination latitude, longitude to end plot (e.g. 35,-117)")
-    print("\t-f, --datafile: optional input filename")
+    print("\t-f, --datafile: optional input filename, a _data.tiles store (see -G) for any depths inside it")
     print("\t-o, --outfile: optional png output filename")
     print("\t-t, --title: optional plot title")
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM isntall directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,origin":"lat1,lon1", \
@@ -56,7 +57,7 @@ ret_val = get_user_opts({"b,origin":"lat1,lon1", \
              "t,title,o":"title", \
              "H,help,o":"", \
              "i,installdir,o":"installdir", \
-             "n,configfile,o":"configfile" })
+             "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 meta = {}
 
@@ -8,7 +8,7 @@
 #
 #  Plots a depth profile given a set of command-line parameters.
 
-from pycvm import DepthProfile, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import DepthProfile, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage statement.
@@ -33,6 +33,7 @@ def usage():
     print("\t-i, --installdir: optional UCVM install directory")
     print("\t-n, --configfile: optional UCVM configfile")
     print("\t-C, --comment: optional comment for this profile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"s,startingpoint":"lat1,lon1", \
@@ -51,7 +52,7 @@ ret_val = get_user_opts({"s,startingpoint":"lat1,lon1", \
              "H,help,o":"", \
              "i,installdir,o":"installdir", \
              "n,configfile,o":"configfile", \
-             "C,comment,o":"comment" })
+             "C,comment,o":"comment" }, QUERY_OPTS)
 
 meta = {}
 
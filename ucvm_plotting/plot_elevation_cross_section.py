@@ -8,7 +8,7 @@
 #
 #  Plots a cross section given a set of command-line parameters.
 
-from pycvm import ElevationCrossSection, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import ElevationCrossSection, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 import json
 
@@ -35,6 +35,7 @@ def usage():
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM isntall directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,origin":"lat1,lon1", \
@@ -54,7 +55,7 @@ ret_val = get_user_opts({"b,origin":"lat1,lon1", \
              "t,title,o":"title", \
              "H,help,o":"", \
              "i,installdir,o":"installdir", \
-             "n,configfile,o":"configfile" })
+             "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 meta = {}
 
@@ -8,7 +8,7 @@
 #
 #  Plots a elevation horizontal slice given a set of command-line parameters.
 
-from pycvm import ElevationHorizontalSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import ElevationHorizontalSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -32,6 +32,7 @@ def usage():
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM isntall directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
@@ -49,7 +50,7 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
                          "t,title,o":"title", \
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
-                         "n,configfile,o":"configfile" })
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 
 meta = {}
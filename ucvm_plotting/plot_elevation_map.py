@@ -8,7 +8,7 @@
 #
 #  Plots a Elevation slice given a set of command-line parameters.
 
-from pycvm import ElevationSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import ElevationSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -27,6 +27,7 @@ def usage():
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM install directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 meta = {}
@@ -41,7 +42,7 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
                          "t,title,o":"title", \
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
-                         "n,configfile,o":"configfile" })
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 if ret_val == "bad":
     usage()
@@ -13,7 +13,7 @@
 #   -f a_horizontal_slice_data.bin,another_horizontal_slice_data.bin
 #
 
-from pycvm import HorizontalDifferenceSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import HorizontalDifferenceSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -36,6 +36,7 @@ def usage():
     print("\t-i, --installdir: optional UCVM install directory")
     print("\t-n, --configfile: optional UCVM configfile")
     print("\t-D, --debug: optional run in debug mode")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,bottomleft":"lat1,lon1",\
@@ -52,7 +53,7 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1",\
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
                          "n,configfile,o":"configfile", \
-                         "D,debug,o":"debug"})
+                         "D,debug,o":"debug"}, QUERY_OPTS)
 
 meta={}
 
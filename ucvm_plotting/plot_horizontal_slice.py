@@ -8,7 +8,7 @@
 #
 #  Plots a horizontal slice given a set of command-line parameters.
 
-from pycvm import HorizontalSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import HorizontalSlice, VolumeSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -19,20 +19,24 @@ def usage():
     print("\t-b, --bottomleft: bottom-left latitude, longitude (e.g. 34,-118)")
     print("\t-u, --upperright: upper-right latitude, longitude (e.g. 35,-117)")
     print("\t-s, --spacing: grid spacing in degrees (typically 0.01)")
-    print("\t-e, --depth: depth for horizontal slice in meters (e.g. 1000)")
+    print("\t-e, --depth: depth for horizontal slice in meters (e.g. 1000), or a list of depths")
+    print("\t             queried together and plotted one per file (e.g. 0,500,1000)")
     print("\t-d, --datatype: either 'vs', 'vp', 'density', or 'poisson', without quotation marks")
+    print("\t                or a list of them (e.g. vs,vp) or 'all', plotted from one query")
     print("\t-c, --cvm: one of the installed velocity models")
     print("\t-z, --zrange: optional Z-range for elygtl:ely (e.g. -z 0,350)")
     print("\t-L, --floors: optional vs/vp/density floors for taper (e.g. -L 500,1700,1700)")
     print("\t-a, --scale: color scale, either 's' for smooth, 'd' for discretized or 'b' for bi-color scale, without quotes")
     print("\t-A, --scalebounds: max and min of the color scale")
     print("\t-g, --gate: optional gate value for bi-color scale gate")
-    print("\t-f, --datafile: optional binary input data filename")
+    print("\t-f, --datafile: optional binary input data filename, a _data.npz file holds every property")
+    print("\t                a _data.tiles store (see -G) can be replotted for any region inside it")
     print("\t-o, --outfile: optional png output filename")
     print("\t-t, --title: optional plot title")
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM isntall directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
@@ -51,7 +55,7 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
                          "t,title,o":"title", \
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
-                         "n,configfile,o":"configfile" })
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 
 meta = {}
@@ -187,6 +191,10 @@ print("")
 print("Retrieving data. Please wait...")
  
 ###################################################################################
-# Generate the horizontal slice.
-h = HorizontalSlice(Point(lon1, lat2, depth), Point(lon2, lat1, depth), meta)
+# Generate the horizontal slice, or the slices at each depth from one query.
+depths = str(depth).split(",")
+if len(depths) > 1:
+    h = VolumeSlice(Point(lon1, lat2, float(depths[0])), Point(lon2, lat1, float(depths[0])), depths, meta)
+else:
+    h = HorizontalSlice(Point(lon1, lat2, depth), Point(lon2, lat1, depth), meta)
 h.plot()
@@ -19,7 +19,7 @@
 #    -b 31.5348,-125.7804 -u 42.5153,-113.5259 -t "vs30 etree, cca"
 #
 
-from pycvm import Vs30EtreeSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import Vs30EtreeSlice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -39,6 +39,7 @@ def usage():
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM install directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 ret_val = get_user_opts({"b,bottomleft":"lat1,lon1",\
@@ -52,7 +53,7 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1",\
                          "t,title,o":"title", \
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
-                         "n,configfile,o":"configfile" })
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 meta={}
 
@@ -11,7 +11,7 @@
 #  vs30_query call in UCVM
 #
 
-from pycvm import Vs30Slice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import Vs30Slice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -24,6 +24,10 @@ def usage():
     print("\t-s, --spacing: grid spacing in degrees (typically 0.01)")
     print("\t-c, --cvm: one of the installed community velocity models")
     print("\t-a, --scale: color scale, either 's' for smooth or 'd' for discretized, without quotes")
+    print("\t-e, --engine: optional Vs30 engine, query (vs30_query, default) or columns (travel time")
+    print("\t              through the top 30m of the queried columns, much slower, it queries")
+    print("\t              30m / interval levels under every point)")
+    print("\t-z, --interval: optional layer thickness, in meters, for the columns engine (default 1)")
     print("\t-f, --datafile: optional binary input data filename")
     print("\t-o, --outfile: optional png output filename")
     print("\t-t, --title: optional plot title")
@@ -31,6 +35,7 @@ def usage():
     print("\t-i, --installdir: optional UCVM isntall directory")
     print("\t-n, --configfile: optional UCVM configfile")
 
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 meta = {}
@@ -40,12 +45,14 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
                          "s,spacing":"spacing", \
                          "c,cvm":"cvm", \
                          "a,scale": "color", \
+                         "e,engine,o":"vs30_engine", \
+                         "z,interval,o":"interval", \
                          "f,datafile,o":"datafile", \
                          "o,outfile,o":"outfile", \
                          "t,title,o":"title", \
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
-                         "n,configfile,o":"configfile" })
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 if ret_val == "bad":
     usage()
@@ -8,7 +8,7 @@
 #
 #  Plots a Z2.5 slice given a set of command-line parameters.
 
-from pycvm import Z25Slice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts
+from pycvm import Z25Slice, UCVM, VERSION, UCVM_CVMS, Point, ask_number, ask_path, ask_file, get_user_opts, QUERY_OPTS, query_usage
 import getopt, sys, os
 
 ## Prints usage of this utility.
@@ -19,10 +19,13 @@ def usage():
     print("\t-b, --bottomleft: bottom-left latitude, longitude (e.g. 34,-118)")
     print("\t-u, --upperright: upper-right latitude, longitude (e.g. 35,-117)")
     print("\t-s, --spacing: grid spacing in degrees (typically 0.01)")
-    print("\t-z, --interval: Z-interval, in meters, for Z%.1f to be queried (lower value means more precision)")
+    print("\t-z, --interval: optional Z-interval, in meters, of the columns scanned with -v")
+    print("\t                (default 20, lower value means more precision)")
     print("\t-c, --cvm: one of the installed CVMs")
     print("\t-a, --scale: color scale, either 's' for smooth or 'd' for discretized, without quotes")
-    print("\t-f, --datafile: optional binary input data filename")
+    print("\t-v, --thresholds: optional comma separated Vs values, e.g. 1000,2500, whose depths are found")
+    print("\t                  in the same pass and plotted to <outfile>_z1.0.png, <outfile>_z2.5.png, ...")
+    print("\t-f, --datafile: optional binary input data filename, or the _data.npz of a -v run")
     print("\t-x, --x: optional x steps matching the datafile")
     print("\t-y, --y: optional y steps matching the datafile")
     print("\t-o, --outfile: optional png output filename")
@@ -30,6 +33,7 @@ def usage():
     print("\t-H, --help: optional display usage information")
     print("\t-i, --installdir: optional UCVM install directory")
     print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
     print("UCVM %s\n" % VERSION)
 
 
@@ -39,6 +43,8 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
                          "u,upperright":"lat2,lon2", \
                          "s,spacing":"spacing", \
                          "c,cvm":"cvm", \
+                         "z,interval,o":"interval", \
+                         "v,thresholds,o":"vs_thresholds", \
                          "f,datafile,o":"datafile", \
                          "o,outfile,o":"outfile", \
                          "x,nx,o":"nx", \
@@ -47,7 +53,7 @@ ret_val = get_user_opts({"b,bottomleft":"lat1,lon1", \
                          "t,title,o":"title", \
                          "H,help,o":"", \
                          "i,installdir,o":"installdir", \
-                         "n,configfile,o":"configfile" })
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
 
 
 if ret_val == "bad":
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+##
+#  @file ucvm_plot_batch.py
+#  @brief Runs a manifest of plot jobs.
+#
+#  Runs the plot jobs of a JSON or YAML manifest in one go, see
+#  @link batch.PlotBatch PlotBatch @endlink, instead of one plot_*.py
+#  command at a time.
+
+import matplotlib
+matplotlib.use("Agg")
+
+from pycvm import PlotBatch, BATCH_PLOTS, VERSION, get_user_opts, QUERY_OPTS, query_usage
+import json, sys
+
+## Prints usage of this utility.
+def usage():
+    print("Runs the plot jobs of a JSON or YAML manifest. Jobs over the same CVM and region")
+    print("share their queries and map backgrounds, and are run in a pool of processes.")
+    print("\nValid arguments:")
+    print("\t-m, --manifest: the manifest file, .json, .yaml or .yml")
+    print("\t-p, --processes: optional number of processes, default one per group up to the CPU count")
+    print("\t-r, --report: optional JSON file to save the status and time of every job to")
+    print("\t-i, --installdir: optional UCVM isntall directory")
+    print("\t-n, --configfile: optional UCVM configfile")
+    query_usage()
+    print("\nPlot types: " + ", ".join(sorted(BATCH_PLOTS)))
+    print("UCVM %s\n" % VERSION)
+
+ret_val = get_user_opts({"m,manifest":"manifest", \
+                         "p,processes,o":"processes", \
+                         "r,report,o":"report", \
+                         "H,help,o":"", \
+                         "i,installdir,o":"installdir", \
+                         "n,configfile,o":"configfile" }, QUERY_OPTS)
+
+if ret_val == "bad" or len(ret_val) == 0:
+    usage()
+    exit(1)
+elif ret_val == "help":
+    usage()
+    exit(0)
+
+## the remaining options are given to every job
+defaults = dict(ret_val)
+manifest = defaults.pop('manifest')
+processes = defaults.pop('processes', None)
+reportfile = defaults.pop('report', None)
+
+batch = PlotBatch.load(manifest, defaults)
+print("Running %d jobs in %d groups" % (len(batch.jobs), len(batch.groups())))
+
+report = batch.run(processes)
+
+failed = 0
+total = 0.0
+print("")
+for entry in report:
+    print("%-40s %-7s %8.2fs %s" % (entry['name'], entry['status'], entry['seconds'], entry['message']))
+    total = total + entry['seconds']
+    if entry['status'] != "ok":
+        failed = failed + 1
+print("%d entries, %d failed, %.2fs in total" % (len(report), failed, total))
+
+if reportfile:
+    fh = open(reportfile, 'w')
+    json.dump(report, fh, indent=2)
+    fh.close()
+
+if failed > 0:
+    exit(1)
@@ -16,7 +16,6 @@
 import os
 import sys
 import json
-import pdb
 
 if len (sys.argv) != 3:
   print("Input format: % extract_latlon.py meta_file data_file")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+# Binary front end for run_ucvm_query.sh, for UCVM installs whose query
+# program only speaks text. Experimental: it re-parses the text output in
+# an extra process and is slower than the text transport. It stands in for
+# a native binary query program, given with UCVM_BINARY_QUERY, until one exists.
+#
+#   ucvm_query_binary.py run_ucvm_query.sh -f ucvm.conf -m cvmsi -c gd < points.bin
+#
+# stdin holds one little-endian float64 (lon, lat, z) triple per point.
+# The points are passed on as text to the query program given on the
+# command line, and its answer is written to stdout as one record of 14
+# little-endian float64 per point, the numeric columns of ucvm_query:
+#
+#   lon lat z surf vs30 crust_vp crust_vs crust_rho gtl_vp gtl_vs gtl_rho
+#   cmb_vp cmb_vs cmb_rho
+#
+
+import sys
+from subprocess import Popen, PIPE, STDOUT
+
+import numpy as np
+
+## ucvm_query output columns that make up a binary record
+RECORD_COLUMNS = (0, 1, 2, 3, 4, 6, 7, 8, 10, 11, 12, 14, 15, 16)
+
+if len(sys.argv) < 2:
+    print("Input format: % ucvm_query_binary.py query_program [query arguments] < points.bin")
+    sys.exit(1)
+
+stdin = getattr(sys.stdin, "buffer", sys.stdin)
+stdout = getattr(sys.stdout, "buffer", sys.stdout)
+
+points = np.frombuffer(stdin.read(), dtype="<f8")
+if points.size % 3 != 0:
+    sys.stderr.write("ERROR: input is not a list of lon, lat, z triples.\n")
+    sys.exit(1)
+points = points.reshape(-1, 3)
+
+text_points = ("%.5f %.5f %.5f\n" * len(points)) % tuple(points.ravel().tolist())
+
+proc = Popen(sys.argv[1:], stdout=PIPE, stdin=PIPE, stderr=STDOUT, universal_newlines=True)
+output = proc.communicate(input=text_points)[0]
+
+data = [line for line in output.split("\n") if line.lstrip()[:1] in "-+.0123456789" and line.strip() != ""]
+if len(data) != len(points):
+    sys.stderr.write("ERROR: expected %d result lines, got %d.\n" % (len(points), len(data)))
+    for line in output.split("\n")[:5]:
+        sys.stderr.write(line + "\n")
+    sys.exit(1)
+
+if len(data) == 0:
+    records = np.zeros((0, len(RECORD_COLUMNS)))
+else:
+    records = np.loadtxt(data, usecols=RECORD_COLUMNS, ndmin=2)
+stdout.write(records.astype("<f8").tobytes())
+stdout.flush()